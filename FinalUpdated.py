@@ -5,10 +5,568 @@
 
 
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from datetime import datetime
-import csv
-import json
+from tkinter import ttk, messagebox, filedialog, font as tkfont
+from datetime import date, datetime, timedelta
+import bisect
+import sqlite3
+import threading
+import time
+
+from antibody_panel import PanelSelection, PanelService, SearchIndex
+from antibody_panel.channels import sensitivity_tier
+from antibody_panel.core import (DuplicateName, InvalidValue, PanelError, UnknownPanel,
+                                 parse_samples)
+from antibody_panel.designer import design_panel
+from antibody_panel.diagnostics import Diagnostics, enabled_from_env
+from antibody_panel.forecast import runs_out_text
+from antibody_panel.importer import ImportFormatError, plan_import
+from antibody_panel.lots import EXPIRY_WARNING_DAYS, days_from
+from antibody_panel.search import metal_mass
+from antibody_panel.server import start_from_env
+from antibody_panel.spillover import SpilloverChecker
+from antibody_panel.store import (ANTIBODY, HISTORY, SAVED_PANEL, InsufficientStock, PanelStore,
+                                  VersionConflict)
+
+
+# Inventory table columns mapped to the antibody fields they edit
+EDITABLE_COLUMNS = ('antigen', 'metal', 'clone', 'concentration', 'stockVolume',
+                    'volumePerTest', 'dateConjugated', 'notes')
+NUMERIC_FIELDS = {'concentration', 'stockVolume', 'volumePerTest'}
+
+EXPORT_FILETYPES = [('CSV files', '*.csv'), ('JSON lines (full records)', '*.ndjson')]
+
+# Delay before a search box re-queries, so typing a word triggers one refresh
+SEARCH_DEBOUNCE_MS = 150
+
+# How often to look for commits made by other stations sharing the database
+STORE_POLL_MS = 1000
+
+# History tab shows one page of execution cards at a time
+HISTORY_PAGE_SIZE = 12
+HISTORY_COLUMNS = 3
+HISTORY_ORDERS = {'Name (A-Z)': 'name', 'Newest first': 'newest'}
+ALL_USERS = 'All users'
+
+# Views redrawn through invalidate(): (view, render method, attribute holding
+# its notebook tab or None when always on screen), in redraw order
+RENDER_VIEWS = (
+    ('alerts', 'update_alerts', None),
+    ('antibodies', 'refresh_antibody_list', 'build_frame'),
+    ('summary', 'update_summary', 'build_frame'),
+    ('saved', 'refresh_saved_panels_tab', 'saved_panels_frame'),
+    ('inventory', 'refresh_inventory_tab', 'inventory_frame'),
+    ('history', 'refresh_history_tab', 'history_frame'),
+)
+
+# Notebook tabs: (text, frame attribute, background, builder). Only the frames
+# exist up front; each builder runs the first time its tab is selected
+TABS = (
+    ('Build Panel', 'build_frame', '#F9FAFB', 'create_build_panel_tab'),
+    ('Saved Panels', 'saved_panels_frame', '#F9FAFB', 'create_saved_panels_tab'),
+    ('Manage Inventory', 'inventory_frame', 'white', 'create_inventory_tab'),
+    ('History', 'history_frame', '#F9FAFB', 'create_history_tab'),
+    ('Add Antibody', 'add_antibody_frame', 'black', 'create_add_antibody_tab'),
+)
+
+# How often the login screen checks whether the background load has finished
+LOAD_POLL_MS = 50
+
+# Diagnostics (ANTIBODY_PANEL_DIAGNOSTICS=1, Ctrl+Shift+D shows the tab): methods
+# timed, frames whose widgets are counted, and sampling intervals
+DIAGNOSTIC_PREFIXES = ('refresh_', 'update_', 'export_')
+DIAGNOSTIC_METHODS = ('execute_panel', 'undo_panel', 'flush_views')
+DIAGNOSTIC_FRAMES = (
+    ('Antibody list', 'antibody_canvas'),
+    ('Summary', 'summary_frame'),
+    ('Saved panels', 'saved_panels_list_frame'),
+    ('Inventory', 'inventory_table_frame'),
+    ('History', 'history_frame'),
+)
+LAG_SAMPLE_MS = 100
+DIAGNOSTICS_POLL_MS = 1000
+
+
+class FontCache:
+    """Named fonts of one Tk root, created on first use and shared by every widget.
+
+    ``fonts(14, 'bold')`` stands in for ``('Arial', 14, 'bold')``: Tk parses a
+    font tuple each time a widget is configured with it, a Font only once.
+    """
+
+    def __init__(self, root, family='Arial'):
+        self.root = root
+        self.family = family
+        self._fonts = {}
+
+    def __call__(self, size, *style):
+        key = (size,) + style
+        font = self._fonts.get(key)
+        if font is None:
+            font = self._fonts[key] = tkfont.Font(
+                self.root, family=self.family, size=size,
+                weight='bold' if 'bold' in style else 'normal',
+                slant='italic' if 'italic' in style else 'roman')
+        return font
+
+
+class VirtualCardGrid:
+    """Canvas-backed card grid that only materialises cards for visible rows.
+
+    Rows are either ``('header', spec)`` with a dict of label options or
+    ``('cards', items)`` holding up to ``columns`` items. A fixed pool of card
+    objects (created through ``make_card``) is re-bound to whichever items
+    scroll into the viewport, so the widget count is bounded by the viewport
+    size rather than by the number of items.
+    """
+
+    def __init__(self, canvas, scrollbar, make_card, columns=3, overscan=1, pad=10):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.make_card = make_card
+        self.columns = columns
+        self.overscan = overscan
+        self.pad = pad
+
+        self.rows = []
+        self._offsets = []          # top y of every row
+        self._height = 0
+        self._card_height = None
+        self._col_width = 0
+
+        self._slots = {}            # (row, col) -> card currently shown there
+        self._free = []             # hidden cards ready for reuse
+        self._card_items = {}       # card -> canvas window item
+        self._headers = {}          # row -> (label, canvas item)
+        self._free_headers = []
+
+        canvas.configure(yscrollcommand=self._on_yscroll)
+        canvas.bind('<Configure>', lambda e: self.relayout(), add='+')
+
+    # ---------------- Public API ----------------
+
+    def set_rows(self, rows):
+        """Replace the grid contents and re-bind the visible cards"""
+        self.rows = rows
+        self._release_all()
+        self.relayout()
+
+    def refresh(self):
+        """Re-bind visible cards after their items changed in place"""
+        for card in self._slots.values():
+            card.bind(card.item)
+
+    def visible_cards(self):
+        return list(self._slots.values())
+
+    # ---------------- Layout ----------------
+
+    def _measure_card_height(self):
+        if self._card_height is None:
+            probe = self.make_card(self.canvas)
+            probe.bind(None)
+            probe.widget.update_idletasks()
+            self._card_height = probe.widget.winfo_reqheight()
+            self._free.append(probe)
+            self._card_items[probe] = self.canvas.create_window(
+                0, 0, window=probe.widget, anchor='nw', state='hidden')
+        return self._card_height
+
+    def _header_height(self, spec):
+        top, bottom = spec.get('pady', (0, 0))
+        return 30 + top + bottom
+
+    def relayout(self):
+        width = max(self.canvas.winfo_width(), self.canvas.winfo_reqwidth())
+        self._col_width = max(width // self.columns - 2 * self.pad, 50)
+        card_row = self._measure_card_height() + 2 * self.pad
+
+        self._offsets = []
+        y = 0
+        for kind, payload in self.rows:
+            self._offsets.append(y)
+            y += self._header_height(payload) if kind == 'header' else card_row
+        self._height = y
+
+        self.canvas.configure(scrollregion=(0, 0, width, self._height))
+        for card, item in self._card_items.items():
+            self.canvas.itemconfigure(item, width=self._col_width,
+                                      height=self._card_height)
+        self._release_all()
+        self._render()
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._render()
+
+    def _visible_rows(self):
+        if not self.rows:
+            return range(0)
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(bisect.bisect_right(self._offsets, top) - 1 - self.overscan, 0)
+        last = min(bisect.bisect_right(self._offsets, bottom) + self.overscan, len(self.rows))
+        return range(first, last)
+
+    # ---------------- Rendering ----------------
+
+    def _render(self):
+        visible = self._visible_rows()
+
+        # Return cards and headers that scrolled out of view to their pools
+        for slot in [s for s in self._slots if s[0] not in visible]:
+            card = self._slots.pop(slot)
+            self.canvas.itemconfigure(self._card_items[card], state='hidden')
+            self._free.append(card)
+        for row in [r for r in self._headers if r not in visible]:
+            label, item = self._headers.pop(row)
+            self.canvas.itemconfigure(item, state='hidden')
+            self._free_headers.append((label, item))
+
+        for row in visible:
+            kind, payload = self.rows[row]
+            y = self._offsets[row]
+            if kind == 'header':
+                if row not in self._headers:
+                    self._place_header(row, payload, y)
+                continue
+            for col, item in enumerate(payload):
+                if (row, col) not in self._slots:
+                    self._place_card(row, col, item, y)
+
+    def _place_card(self, row, col, item, y):
+        if self._free:
+            card = self._free.pop()
+        else:
+            card = self.make_card(self.canvas)
+            self._card_items[card] = self.canvas.create_window(
+                0, 0, window=card.widget, anchor='nw',
+                width=self._col_width, height=self._card_height)
+        canvas_item = self._card_items[card]
+        x = col * (self._col_width + 2 * self.pad) + self.pad
+        self.canvas.coords(canvas_item, x, y + self.pad)
+        self.canvas.itemconfigure(canvas_item, state='normal')
+        card.bind(item)
+        self._slots[(row, col)] = card
+
+    def _place_header(self, row, spec, y):
+        if self._free_headers:
+            label, item = self._free_headers.pop()
+        else:
+            label = tk.Label(self.canvas, bg=self.canvas['bg'])
+            item = self.canvas.create_window(0, 0, window=label, anchor='n')
+        label.configure(text=spec['text'], font=spec['font'], fg=spec['fg'])
+        x = self.columns * (self._col_width + 2 * self.pad) // 2
+        self.canvas.coords(item, x, y + spec.get('pady', (0, 0))[0])
+        self.canvas.itemconfigure(item, state='normal')
+        self._headers[row] = (label, item)
+
+    def _release_all(self):
+        for card in self._slots.values():
+            self.canvas.itemconfigure(self._card_items[card], state='hidden')
+            self._free.append(card)
+        self._slots.clear()
+        for label, item in self._headers.values():
+            self.canvas.itemconfigure(item, state='hidden')
+            self._free_headers.append((label, item))
+        self._headers.clear()
+
+
+class AntibodyCard:
+    """Reusable Build Panel card; ``bind`` points it at another antibody"""
+
+    DETAIL_ROWS = 3
+
+    def __init__(self, parent, fonts, get_state, on_toggle):
+        self.item = None
+        self.get_state = get_state
+        self.on_toggle = on_toggle
+        self.painted = None         # (selected, low stock) the colours show
+
+        self.widget = tk.Frame(parent, highlightthickness=3, padx=15, pady=10)
+        self.var = tk.BooleanVar()
+        self.check = tk.Checkbutton(self.widget, variable=self.var, command=self._toggle)
+        self.check.pack(side='right')
+
+        # --- Header ---
+        self.header_frame = tk.Frame(self.widget)
+        self.header_frame.pack(fill='x')
+        self.title = tk.Label(self.header_frame, font=fonts(18, 'bold'), fg='white')
+        self.title.pack(side='left')
+        self.badge = tk.Label(self.header_frame, text="LOW STOCK", bg='red', fg='white',
+                              font=fonts(12, 'bold'), padx=5, pady=2)
+
+        # --- Details ---
+        self.details_frame = tk.Frame(self.widget)
+        self.details_frame.pack(fill='x', pady=(5, 0))
+        self.details = []
+        for i in range(self.DETAIL_ROWS * 2 - 1):
+            label = tk.Label(self.details_frame, font=fonts(9), fg='white')
+            label.grid(row=i//2, column=i%2, sticky='w', padx=(0,20))
+            self.details.append(label)
+
+        # --- Notes ---
+        self.notes = tk.Label(self.widget, font=fonts(9, 'italic'), fg='white',
+                              anchor='w', justify='left')
+        self.notes.pack(anchor='w', fill='x', pady=(5,0))
+
+    def _toggle(self):
+        if self.item is not None:
+            self.on_toggle(self.item, self.var.get())
+
+    def bind(self, antibody):
+        self.item = antibody
+        if antibody is None:
+            # Probe binding used to measure the tallest card layout
+            antibody = {'antigen': 'X', 'metal': 'X', 'clone': '', 'concentration': 0,
+                        'stockVolume': 0.0, 'volumePerTest': 0, 'dateConjugated': '',
+                        'notes': 'X'}
+            selected, low_stock = False, True
+        else:
+            selected, low_stock = self.get_state(antibody)
+        self.paint(selected, low_stock)
+
+        self.title.configure(text=f"{antibody['antigen']} - {antibody['metal']}")
+        details = [
+            f"Clone: {antibody['clone']}",
+            f"Concentration: {antibody['concentration']} mg/mL",
+            f"Stock: {antibody['stockVolume']:.1f} µL",
+            f"Vol/Test: {antibody['volumePerTest']} µL",
+            f"Date: {antibody['dateConjugated']}"
+        ]
+        for label, text in zip(self.details, details):
+            label.configure(text=text)
+        self.notes.configure(text=antibody['notes'])
+
+    def paint(self, selected, low_stock):
+        """Show the selected / low-stock state; only colours and the badge change"""
+        self.var.set(selected)
+        if self.painted == (selected, low_stock):
+            return
+        self.painted = (selected, low_stock)
+
+        bg = '#DDD6FE' if selected else 'black'
+        self.widget.configure(bg=bg, highlightbackground='red' if low_stock else '#D1D5DB')
+        for widget in (self.check, self.header_frame, self.title, self.details_frame,
+                       self.notes, *self.details):
+            widget.configure(bg=bg)
+        if low_stock:
+            self.badge.pack(side='left', padx=10)
+        else:
+            self.badge.pack_forget()
+
+
+class SavedPanelCard:
+    """Reusable Saved Panels card; ``bind`` points it at another saved panel"""
+
+    SUMMARY_LINES = 3
+
+    def __init__(self, parent, fonts, get_labels, on_load, on_delete):
+        self.item = None
+        self.get_labels = get_labels
+
+        self.widget = tk.Frame(parent, bg='white', highlightbackground='#D1D5DB',
+                               highlightthickness=2, padx=15, pady=10)
+
+        # ----- Header -----
+        header_frame = tk.Frame(self.widget, bg='white')
+        header_frame.pack(fill='x')
+        self.title = tk.Label(header_frame, font=fonts(14, 'bold'), bg='white', fg='black')
+        self.title.pack(side='left')
+        self.created = tk.Label(header_frame, font=fonts(9), bg='white', fg='#666')
+        self.created.pack(side='left', padx=10)
+
+        # ----- Buttons -----
+        btn_frame = tk.Frame(header_frame, bg='white')
+        btn_frame.pack(side='right')
+        tk.Button(btn_frame, text="Load", command=lambda: on_load(self.item),
+                  bg='white', fg='black', font=fonts(10),
+                  padx=15, pady=5, cursor='hand2').pack(side='left', padx=2)
+        tk.Button(btn_frame, text="🗑", command=lambda: on_delete(self.item['id']),
+                  bg='white', fg='white', font=fonts(10),
+                  padx=8, pady=5, cursor='hand2').pack(side='left', padx=2)
+
+        # ----- Antibody details (fixed height so every card measures the same) -----
+        details_frame = tk.Frame(self.widget, bg='#222222', padx=10, pady=8)
+        details_frame.pack(fill='x', pady=(10, 0))
+        self.count = tk.Label(details_frame, font=fonts(10, 'bold'), bg='#222222', fg='white')
+        self.count.pack(anchor='w')
+        self.summary = tk.Label(details_frame, font=fonts(9), bg='#222222', fg='white',
+                                wraplength=300, justify='left', anchor='nw',
+                                height=self.SUMMARY_LINES)
+        self.summary.pack(anchor='w', fill='x')
+
+    def bind(self, panel):
+        self.item = panel
+        if panel is None:
+            # Probe binding used to measure the card height
+            self.title.configure(text='X')
+            self.created.configure(text='X')
+            self.count.configure(text='X')
+            self.summary.configure(text='X')
+            return
+
+        self.title.configure(text=panel['name'])
+        created = datetime.fromisoformat(panel['createdAt']).strftime('%d-%m-%Y')
+        self.created.configure(text=f"Created by {panel['createdBy']} • {created}")
+        count, text = self.get_labels(panel)
+        self.count.configure(text=f"Antibodies ({count}):")
+        self.summary.configure(text=text)
+
+
+class HistoryCard:
+    """Reusable History card; ``bind`` points it at another execution"""
+
+    def __init__(self, parent, fonts, on_undo, on_delete):
+        self.entry = None
+        self.fonts = fonts
+        self.widget = tk.Frame(parent, bg='white', width=300, height=180, padx=12, pady=10,
+                               highlightbackground='#D1D5DB', highlightthickness=1)
+
+        ## TITLE ROW
+        top = tk.Frame(self.widget, bg='white')
+        top.pack(fill='x')
+        self.title = tk.Label(top, font=fonts(18, 'bold'), bg='white', fg='#111')
+        self.title.pack(side='left')
+        self.when = tk.Label(top, font=fonts(9), bg='white', fg='#666')
+        self.when.pack(side='left', padx=8)
+
+        # ↩ Undo + Delete
+        btns = tk.Frame(top, bg='white')
+        btns.pack(side='right')
+        tk.Button(btns, text="↩ Undo", command=lambda: on_undo(self.entry),
+                  bg='white', fg='black', font=fonts(9, 'bold'), width=6).pack(side='left', padx=3)
+        tk.Button(btns, text="🗑", command=lambda: on_delete(self.entry),
+                  bg='white', fg='black', font=fonts(9, 'bold'), width=4).pack(side='left', padx=3)
+
+        # --- ANTIBODY GRID (2-col), cells grow with the largest panel shown ---
+        self.body = tk.Frame(self.widget, bg='white')
+        self.body.pack(fill='x', pady=(5,0))
+        self.cells = []     # (frame, name label, volume label)
+
+        # Total Volume
+        self.total = tk.Label(self.widget, font=self.fonts(10, 'bold'), bg='white', fg='#0A74DA')
+        self.total.pack(pady=(8,0))
+
+    def _cell(self, i):
+        while len(self.cells) <= i:
+            r, c = divmod(len(self.cells), 2)
+            cell = tk.Frame(self.body, bg='#F4F6F8', padx=5, pady=2)
+            cell.grid(row=r, column=c, sticky='ew', padx=4, pady=3)
+            name = tk.Label(cell, font=self.fonts(9), bg='#F4F6F8', fg='black')
+            name.pack(side='left')
+            volume = tk.Label(cell, font=self.fonts(9, 'bold'), bg='#F4F6F8', fg='#0A74DA')
+            volume.pack(side='right')
+            self.cells.append((cell, name, volume))
+        return self.cells[i]
+
+    def bind(self, entry):
+        self.entry = entry
+        self.title.configure(text=entry['panelName'])
+        timestamp = datetime.fromisoformat(entry['timestamp'])
+        when = timestamp.strftime("%d %b %Y • %H:%M")
+        if entry.get('batchId'):
+            when += " • batch"
+        self.when.configure(text=when)
+
+        for i, ab in enumerate(entry['antibodies']):
+            cell, name, volume = self._cell(i)
+            name.configure(text=f"{ab['antigen']} ({ab['metal']})")
+            volume.configure(text=f"{ab['volumeUsed']:.2f} µL")
+            cell.grid()
+        for cell, _, _ in self.cells[len(entry['antibodies']):]:
+            cell.grid_remove()
+
+        total = sum(a['volumeUsed'] for a in entry['antibodies'])
+        self.total.configure(text=f"Total: {total:.2f} µL")
+
+
+class PanelSummary:
+    """Build Panel summary whose widgets persist; rows are kept by antibody id.
+
+    ``show`` only touches what changed: a toggle adds, hides or moves one
+    row, and labels are reconfigured only when their text or colour differs.
+    """
+
+    def __init__(self, parent, fonts, buttons):
+        self.parent = parent
+        self.fonts = fonts
+        self.title = tk.Label(parent, font=fonts(14, 'bold'), bg='black', fg='white')
+        self.rows = {}              # antibody id -> (frame, name label, volume label)
+        self._free = []             # hidden rows ready for reuse
+        self.warnings = []          # pooled warning labels
+        self._options = {}          # label -> options last configured
+        self._placed = {}           # widget -> grid row, while gridded
+
+        self.buttons = tk.Frame(parent, bg='black')
+        for text, command in buttons:
+            tk.Button(self.buttons, text=text, command=command,
+                      bg='white', fg='black', font=fonts(11, 'bold'),
+                      padx=20, pady=8, cursor='hand2').pack(side='left', padx=5)
+
+    def _set(self, label, **options):
+        if self._options.get(label) != options:
+            label.configure(**options)
+            self._options[label] = options
+
+    def _place(self, widget, row, **grid):
+        if self._placed.get(widget) != row:
+            widget.grid(row=row, column=0, columnspan=2, **grid)
+            self._placed[widget] = row
+
+    def _hide(self, widget):
+        if self._placed.pop(widget, None) is not None:
+            widget.grid_remove()
+
+    def _row(self):
+        if self._free:
+            return self._free.pop()
+        frame = tk.Frame(self.parent, bg='white', padx=10, pady=5)
+        name = tk.Label(frame, font=self.fonts(14), bg='white', fg='black')
+        name.pack(side='left')
+        volume = tk.Label(frame, font=self.fonts(14, 'bold'), bg='white', fg='#4F46E5')
+        volume.pack(side='right')
+        return frame, name, volume
+
+    def show(self, items, warnings):
+        """Show [(antibody, volume µL)] in selection order, then the warnings"""
+        shown = {ab['id'] for ab, _ in items}
+        for ab_id in [i for i in self.rows if i not in shown]:
+            row = self.rows.pop(ab_id)
+            self._hide(row[0])
+            self._free.append(row)
+        if not items:
+            for widget in (self.title, self.buttons, *self.warnings):
+                self._hide(widget)
+            return
+
+        self._set(self.title, text=f"Panel Summary ({len(items)} antibodies selected)")
+        self._place(self.title, 0, sticky='w', padx=15, pady=10)
+
+        for i, (ab, volume) in enumerate(items, start=1):
+            row = self.rows.get(ab['id'])
+            if row is None:
+                row = self.rows[ab['id']] = self._row()
+            frame, name, volume_label = row
+            self._set(name, text=f"{ab['antigen']} - {ab['metal']}")
+            self._set(volume_label, text=f"{volume:.2f} µL will be used")
+            self._place(frame, i, sticky='ew', padx=15, pady=2)
+
+        # Channel conflicts and spillover between the selected conjugates
+        while len(self.warnings) < len(warnings):
+            self.warnings.append(tk.Label(self.parent, bg='black', wraplength=320,
+                                          justify='left', anchor='w'))
+        i = len(items)
+        for label, warning in zip(self.warnings, warnings):
+            i += 1
+            conflict = warning.kind == 'conflict'
+            self._set(label, text=f"⚠ {warning.message}",
+                      font=self.fonts(11, 'bold') if conflict else self.fonts(11),
+                      fg='red' if conflict else 'orange')
+            self._place(label, i, sticky='w', padx=15, pady=1)
+        for label in self.warnings[len(warnings):]:
+            self._hide(label)
+
+        self._place(self.buttons, i + 1, sticky='ew', padx=15, pady=10)
 
 
 class AntibodyPanelManager:
@@ -16,62 +574,152 @@ class AntibodyPanelManager:
         self.root = root
         self.root.title("Antibody Panel Manager")
         self.root.geometry("1200x800")
+        self.fonts = FontCache(root)
         
-        # Data storage
-        self.current_user = ""
-        self.inventory = [
-            {
-                'id': 1,
-                'antigen': 'CD3',
-                'clone': 'UCHT1',
-                'metal': '170Er',
-                'concentration': 0.5,
-                'antibodyPerTest': 1.0,
-                'volumePerTest': 2.0,
-                'stockVolume': 500.0,
-                'notes': 'Core marker',
-                'dateConjugated': '2024-10-15',
-                'alertThreshold': 50.0
-            },
-            {
-                'id': 2,
-                'antigen': 'CD4',
-                'clone': 'RPA-T4',
-                'metal': '145Nd',
-                'concentration': 0.5,
-                'antibodyPerTest': 1.0,
-                'volumePerTest': 2.0,
-                'stockVolume': 450.0,
-                'notes': 'T-helper cells',
-                'dateConjugated': '2024-10-12',
-                'alertThreshold': 50.0
-            },
-            {
-                'id': 3,
-                'antigen': 'CD8',
-                'clone': 'SK1',
-                'metal': '146Nd',
-                'concentration': 0.5,
-                'antibodyPerTest': 1.0,
-                'volumePerTest': 2.0,
-                'stockVolume': 35.0,
-                'notes': 'Cytotoxic T cells',
-                'dateConjugated': '2024-09-20',
-                'alertThreshold': 50.0
-            }
-        ]
+        # Data and panel rules live in the GUI-free core; this class only presents them.
+        # They load on a worker thread while the login screen is up (see load_data)
+        self.service = None
+        self.api_server = None
+        self._loaded = None
+        self._loader = threading.Thread(target=self.load_data, name='panel-load', daemon=True)
+        self._loader.start()
         
-        self.panel_history = []
-        self.saved_panels = []
-        self.selected_panel = []
         self.cell_count = 4.0
         self.panel_name = ""
         self.search_term = ""
-        self._refresh_pending = False
-        self.antibody_cards = {}
+        self._refresh_pending = False   # a flush_views() is queued with after_idle
+        self._dirty = set()             # views waiting to be redrawn
+        self._debounce_jobs = {}
+        self._unbuilt_tabs = {}         # notebook tab id -> builder not yet run
         
+        # Timing hooks shadow the methods on this instance only when switched on,
+        # so a normal session calls them directly
+        self.diagnostics = Diagnostics() if enabled_from_env() else None
+        if self.diagnostics is not None:
+            names = [name for name in dir(type(self)) if name.startswith(DIAGNOSTIC_PREFIXES)]
+            self.diagnostics.instrument(self, names + list(DIAGNOSTIC_METHODS))
+        
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
         self.show_login()
     
+    def load_data(self):
+        """Worker thread: open the database and build every index. Touches no widgets"""
+        try:
+            service = PanelService(PanelStore(check_same_thread=False))
+            # Warm the lazy parts so the first tab shown does no loading of its own
+            service.engine, service.forecast, service.saved_panels, service.panel_history
+            self._loaded = (service, SearchIndex(service.inventory))
+        except Exception as exc:
+            self._loaded = exc
+
+    def attach_data(self):
+        """Take over what load_data built, once the worker has finished"""
+        if isinstance(self._loaded, Exception):
+            messagebox.showerror("Could Not Load Data",
+                                 f"The panel database could not be opened:\n{self._loaded}")
+            self.root.destroy()
+            return False
+        self.service, self.search_index = self._loaded
+        self.service.on_journal_error = self.show_journal_error
+        self.inventory = self.service.inventory
+        self.alerts = self.service.alerts
+        self.inventory.subscribe(self.on_inventory_change)
+        
+        # Optional JSON API for LIMS / instrument PCs (ANTIBODY_PANEL_API=[host:]port);
+        # it runs on its own thread and reaches the GUI through the shared database
+        try:
+            self.api_server = start_from_env(self.service.store.path)
+        except (OSError, ValueError) as exc:
+            self.api_server = None
+            messagebox.showwarning("API Not Started", f"The panel API could not start:\n{exc}")
+        
+        self.selection = PanelSelection(self.inventory)
+        self.spillover = SpilloverChecker(self.search_index.mass)
+        return True
+
+    @property
+    def saved_panels(self):
+        return self.service.saved_panels
+    
+    @property
+    def panel_history(self):
+        return self.service.panel_history
+    
+    def on_inventory_change(self, event, antibody, changes):
+        """Keep derived indexes in step with the inventory model"""
+        if event == 'add':
+            self.search_index.add(antibody)
+        elif event == 'add_many':
+            self.search_index.add_many(antibody)
+        elif event == 'remove':
+            self.search_index.remove(antibody['id'])
+        elif set(changes) & set(self.search_index.fields):
+            self.search_index.update(antibody)
+
+        if event == 'remove' and hasattr(self, 'inventory_tree'):
+            self.remove_inventory_row(antibody['id'])
+
+        # The service drops cached saved panel summaries naming this antibody
+        if (event != 'update' or 'antigen' in changes or 'metal' in changes) and \
+                hasattr(self, 'saved_panels_grid'):
+            self.invalidate('saved')
+    
+    def debounce(self, key, callback, delay=SEARCH_DEBOUNCE_MS):
+        """Run callback once input has been quiet for ``delay`` ms"""
+        job = self._debounce_jobs.pop(key, None)
+        if job is not None:
+            self.root.after_cancel(job)
+    
+        def run():
+            self._debounce_jobs.pop(key, None)
+            callback()
+    
+        self._debounce_jobs[key] = self.root.after(delay, run)
+    
+    def invalidate(self, *views):
+        """Mark views dirty; each is redrawn once, when Tk is next idle"""
+        self._dirty.update(views)
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.root.after_idle(self.flush_views)
+
+    def flush_views(self):
+        """Redraw dirty views that are on screen; hidden tabs wait until selected"""
+        self._refresh_pending = False
+        current = self.notebook.select()
+        for view, render, tab in RENDER_VIEWS:
+            if view not in self._dirty:
+                continue
+            if tab is not None and str(getattr(self, tab)) != current:
+                continue
+            self._dirty.discard(view)
+            getattr(self, render)()
+
+    def on_tab_changed(self, event=None):
+        """Build the selected tab on first visit, then redraw anything it has pending"""
+        current = self.notebook.select()
+        builder = self._unbuilt_tabs.pop(current, None)
+        if builder is not None:
+            getattr(self, builder)()
+            # A freshly built tab already shows current data
+            self._dirty.difference_update(view for view, _, tab in RENDER_VIEWS
+                                          if tab and str(getattr(self, tab)) == current)
+        if self._dirty:
+            self.flush_views()
+
+    def on_close(self):
+        """Close the database before the window goes away"""
+        if self.api_server is not None:
+            self.api_server.stop()
+        if self.service is None:
+            # Closed at the login screen: let the loader finish so its store can be closed
+            self._loader.join()
+            if isinstance(self._loaded, tuple):
+                self._loaded[0].close()
+        else:
+            self.service.close()
+        self.root.destroy()
+    
     def show_login(self):
         """Show login screen"""
         login_frame = tk.Frame(self.root, bg='black')
@@ -90,14 +738,27 @@ class AntibodyPanelManager:
         name_entry.pack(pady=20, ipady=5)
         name_entry.focus()
         
-        def on_submit():
-            name = name_entry.get().strip()
-            if name:
-                self.current_user = name
+        status = tk.Label(center_frame, text="", font=('Arial', 12), bg='black', fg='#999')
+        
+        def enter(name):
+            # Wait for the background load if the user was quicker than the database
+            if self._loader.is_alive():
+                self.root.after(LOAD_POLL_MS, enter, name)
+                return
+            if self.attach_data():
+                self.service.user = name
                 login_frame.destroy()
                 self.create_main_interface()
-            else:
+        
+        def on_submit():
+            name = name_entry.get().strip()
+            if not name:
                 messagebox.showwarning("Name Required", "Please enter your name")
+            elif not status.winfo_manager():     # not already waiting to enter
+                if self._loader.is_alive():
+                    status.config(text="Loading inventory…")
+                status.pack(pady=(10, 0))
+                enter(name)
         
         name_entry.bind('<Return>', lambda e: on_submit())
         
@@ -114,7 +775,7 @@ class AntibodyPanelManager:
         tk.Label(header, text="Antibody Panel Manager", 
                 font=('Arial', 30, 'bold'), bg='black').pack(side='left', padx=20)
         
-        tk.Label(header, text=f"Logged in as: {self.current_user}", 
+        tk.Label(header, text=f"Logged in as: {self.service.user}", 
                 font=('Arial', 20), bg='black').pack(side='left')
         
         # Alert indicator
@@ -125,28 +786,43 @@ class AntibodyPanelManager:
         # Notebook (tabs)
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+        self.root.after(STORE_POLL_MS, self.poll_store)
         
-        # Create tabs
-        self.create_build_panel_tab()
-        self.create_saved_panels_tab()
-        self.create_inventory_tab()
-        self.create_history_tab()
-        self.create_add_antibody_tab()
+        # Create tab frames; their contents are built on first selection
+        for text, attr, bg, builder in TABS:
+            frame = tk.Frame(self.notebook, bg=bg)
+            self.notebook.add(frame, text=text)
+            setattr(self, attr, frame)
+            self._unbuilt_tabs[str(frame)] = builder
+        if self.diagnostics is not None:
+            self.diagnostics_frame = tk.Frame(self.notebook, bg='#F9FAFB')
+            self.notebook.add(self.diagnostics_frame, text='Diagnostics', state='hidden')
+            self._unbuilt_tabs[str(self.diagnostics_frame)] = 'create_diagnostics_tab'
+            self.root.bind('<Control-Shift-D>', lambda e: self.toggle_diagnostics_tab())
+            self.sample_loop_lag()
+            self.root.after(DIAGNOSTICS_POLL_MS, self.poll_diagnostics)
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.on_tab_changed()
     
     def update_alerts(self):
         """Update low stock alerts"""
-        low_stock = [ab for ab in self.inventory 
-                    if ab['stockVolume'] <= ab['alertThreshold']]
-        if low_stock:
-            self.alert_label.config(text=f"⚠ {len(low_stock)} Low Stock Alert(s)")
+        low_count = self.alerts.count()
+        if low_count:
+            # Name the most depleted antibody from the top of the severity heap
+            (ab_id, level), = self.alerts.most_severe(1)
+            worst = self.inventory.get(ab_id)['antigen']
+            status = f"at {level:.0%}" if level > 0 else "empty"
+            days = self.service.forecast.days_left(ab_id)
+            if days is not None and level > 0:
+                status += f", runs out in {runs_out_text(days)}" if days >= 1 else ", runs out today"
+            self.alert_label.config(text=f"⚠ {low_count} Low Stock Alert(s) — {worst} {status}")
             self.alert_label.pack(side='right', padx=20)
         else:
             self.alert_label.pack_forget()
     
     def create_build_panel_tab(self):
         """Create build panel tab with 3-column antibody grid and right-side summary"""
-        frame = tk.Frame(self.notebook, bg='#F9FAFB')
-        self.notebook.add(frame, text='Build Panel')
+        frame = self.build_frame
 
         # ---------------- Top section: Panel info ----------------
         top_frame = tk.Frame(frame, bg='black', padx=20, pady=15)
@@ -161,6 +837,7 @@ class AntibodyPanelManager:
         tk.Label(top_frame, text="Cell Count (millions):", bg='black', font=('Arial', 14, 'bold')).grid(row=0, column=2, sticky='w', padx=(20,0))
         self.cell_count_var = tk.DoubleVar(value=4.0)
         tk.Entry(top_frame, textvariable=self.cell_count_var, font=('Arial', 14), bg='white', fg='black', width=15).grid(row=0, column=3, padx=10, ipady=6)
+        self.cell_count_var.trace('w', lambda *args: self.on_cell_count_change())
 
         tk.Label(top_frame, text="Standard: 1x strength for 4M cells", font=('Arial', 14), bg='black', fg='white').grid(row=1, column=0, columnspan=4, sticky='w', pady=(5,0))
 
@@ -170,11 +847,12 @@ class AntibodyPanelManager:
     
         tk.Label(search_frame, text="🔍", bg='black', font=('Arial', 14)).pack(side='left', padx=(0,5))
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', lambda *args: self.refresh_antibody_list())
+        self.search_var.trace('w', lambda *args: self.debounce('antibody_search', self.refresh_antibody_list))
         tk.Entry(search_frame, textvariable=self.search_var, font=('Arial', 14), bg='white', fg='black', width=50).pack(side='left')
         tk.Label(search_frame, text="Search by antigen, metal, or clone", font=('Arial', 14), bg='black', fg='white').pack(side='left', padx=10)
+        tk.Button(search_frame, text="🧪 Design Panel", command=self.open_panel_designer,
+                  bg='white', fg='black', font=('Arial', 12), padx=10, cursor='hand2').pack(side='right')
 
-         # ---------------- Main horizontal frame ----------------
         # ---------------- Main horizontal frame ----------------
         main_frame = tk.Frame(frame, bg='#F9FAFB')
         main_frame.pack(fill='both', expand=True, padx=10, pady=10)
@@ -200,21 +878,13 @@ class AntibodyPanelManager:
         scrollbar = ttk.Scrollbar(scroll_container, orient='vertical', command=canvas.yview)
         scrollbar.pack(side='right', fill='y')
         
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Frame holding antibody cards
-        self.antibody_list_frame = tk.Frame(canvas, bg='#F9FAFB')
-        canvas.create_window((0, 0), window=self.antibody_list_frame, anchor='nw')
-        
-        # Update scroll region dynamically
-        self.antibody_list_frame.bind(
-            '<Configure>',
-            lambda e: canvas.configure(scrollregion=canvas.bbox('all'))
-        )
-        
-        # Configure 3-column grid inside antibody list
-        for c in range(3):
-            self.antibody_list_frame.grid_columnconfigure(c, weight=1)
+        # Virtualized 3-column card grid: only visible rows get card widgets
+        self.antibody_canvas = canvas
+        self.antibody_grid = VirtualCardGrid(
+            canvas, scrollbar,
+            make_card=lambda parent: AntibodyCard(parent, self.fonts, self.antibody_card_state,
+                                                  self.toggle_antibody),
+            columns=3)
         
         # ---------------- Adjust canvas width so scrollbar is left of summary ----------------
         def resize_canvas(event):
@@ -231,6 +901,11 @@ class AntibodyPanelManager:
             width=250  # fixed width
         )
         self.summary_frame.grid(row=0, column=1, sticky='ns', padx=(30,0))  # move slightly left from panel edge
+        self.summary = PanelSummary(self.summary_frame, self.fonts, (
+            ("💾 Save Panel", self.save_panel),
+            ("✓ Execute Panel", self.execute_panel),
+            ("🧪 Execute Batch…", self.open_batch_dialog),
+        ))
         
         # Initial load
         self.refresh_antibody_list()
@@ -239,291 +914,147 @@ class AntibodyPanelManager:
         
     def refresh_antibody_list(self):
         """Refresh antibody grid + separate Extracellular vs Intracellular"""
-    
-        # Clear previous cards safely
-        for ab_id, frame in list(self.antibody_cards.items()):
-            frame.destroy()
-            del self.antibody_cards[ab_id]
-    
-        search = self.search_var.get().lower()
-    
-        # Filter + sort results
-        import re
-        def metal_number(ab):
-            m = re.match(r"(\d+)", ab['metal'])
-            return int(m.group(1)) if m else 0
-    
-        filtered = [ab for ab in self.inventory if
-                    search in ab['antigen'].lower() or
-                    search in ab['metal'].lower() or
-                    search in ab['clone'].lower()]
-        filtered.sort(key=lambda x: (x['antigen'].lower(), metal_number(x)))
+        # Filtered and sorted by (antigen, mass) through the shared index
+        filtered = self.search_index.search(self.search_var.get())
     
         # Separate Extracellular vs Intracellular
         extracellular = [ab for ab in filtered if ab.get("stainType", "Extracellular") == "Extracellular"]
         intracellular = [ab for ab in filtered if ab.get("stainType", "Extracellular") == "Intracellular"]
     
-        columns = 3
-        row_ptr = 0
+        columns = self.antibody_grid.columns
+        rows = []
     
         # ░░ Extracellular Section ░░
         if extracellular:
-            tk.Label(self.antibody_list_frame,
-                     text="Extracellular Antibodies",
-                     font=('Arial', 16, 'bold'),
-                     bg='#F9FAFB', fg='black').grid(row=row_ptr, column=0,
-                                                     columnspan=columns, pady=(0, 10))
-            row_ptr += 1
-    
-            for i, ab in enumerate(extracellular):
-                r = row_ptr + (i // columns)
-                c = i % columns
-                self.create_antibody_card(ab, row=r, col=c)
-    
-            row_ptr += (len(extracellular) + columns - 1) // columns  # ceil division
+            rows.append(('header', {'text': "Extracellular Antibodies",
+                                    'font': self.fonts(16, 'bold'),
+                                    'fg': 'black', 'pady': (0, 10)}))
+            for i in range(0, len(extracellular), columns):
+                rows.append(('cards', extracellular[i:i + columns]))
     
         # ░░ Intracellular Section ░░
         if intracellular:
-            tk.Label(self.antibody_list_frame,
-                     text="Intracellular Antibodies (0.2x)",
-                     font=('Arial', 16, 'bold'),
-                     bg='#F9FAFB', fg='firebrick').grid(row=row_ptr, column=0,
-                                                        columnspan=columns, pady=(20, 5))
-            row_ptr += 1
-    
-            for i, ab in enumerate(intracellular):
-                r = row_ptr + (i // columns)
-                c = i % columns
-                self.create_antibody_card(ab, row=r, col=c)
-
-
-    def create_antibody_card(self, antibody, row=0, col=0):
-        """Create or update an antibody card in the 3-column grid"""
-        card_id = antibody['id']
-
-        # If card already exists, just update it
-        if card_id in self.antibody_cards:
-            self.update_antibody_card(antibody)
+            rows.append(('header', {'text': "Intracellular Antibodies (0.2x)",
+                                    'font': self.fonts(16, 'bold'),
+                                    'fg': 'firebrick', 'pady': (20, 5)}))
+            for i in range(0, len(intracellular), columns):
+                rows.append(('cards', intracellular[i:i + columns]))
+    
+        self.antibody_grid.set_rows(rows)
+
+    def antibody_card_state(self, antibody):
+        """(selected, low stock) flags used when a pooled card is bound"""
+        is_selected = antibody['id'] in self.selection
+        is_low_stock = self.alerts.is_low(antibody['id'])
+        return is_selected, is_low_stock
+
+    def on_cell_count_change(self):
+        """Summary volumes follow the cell count; half-typed numbers are ignored"""
+        try:
+            self.cell_count_var.get()
+        except tk.TclError:
             return
-
-        # Create card frame
-        frame = tk.Frame(self.antibody_list_frame, highlightthickness=3, padx=15, pady=10)
-        frame.grid(row=row, column=col, padx=10, pady=10, sticky='n')  # Grid placement
-
-        # Store for later updates
-        self.antibody_cards[card_id] = frame
-
-        # Build inner card UI
-        self.update_antibody_card(antibody)
+        self.invalidate('summary')
 
     def update_antibody_card(self, antibody):
-        """Update card UI instead of rebuilding full list"""
-        frame = self.antibody_cards.get(antibody["id"])
-        if frame is None:
-            return  # safety fallback
-
-        # Determine state
-        is_selected = any(s['id'] == antibody['id'] for s in self.selected_panel)
-        is_low_stock = antibody['stockVolume'] <= antibody['alertThreshold']
-
-        # Update frame appearance
-        frame.configure(
-            bg='#DDD6FE' if is_selected else 'black',
-            highlightbackground='red' if is_low_stock else '#D1D5DB',
-            highlightthickness=3
-        )
-
-        # ---- Clear and rebuild card interior (but not the whole widget) ----
-        for widget in frame.winfo_children():
-            widget.destroy()
-
-        # --- Checkbox toggle ---
-        var = tk.BooleanVar(value=is_selected)
+        """Repaint the card showing this antibody, if it is on screen"""
+        for card in self.antibody_grid.visible_cards():
+            if card.item is not None and card.item['id'] == antibody['id']:
+                card.paint(*self.antibody_card_state(antibody))
 
-        def toggle():
-            if var.get():
-                if not any(s['id'] == antibody['id'] for s in self.selected_panel):
-                    self.selected_panel.append(antibody)
-            else:
-                self.selected_panel = [s for s in self.selected_panel if s['id'] != antibody['id']]
-
-            # 🔥 Only update this one card + summary
-            self.update_antibody_card(antibody)
-            self.update_summary()
-
-        chk = tk.Checkbutton(frame, variable=var, command=toggle, bg=frame['bg'])
-        chk.pack(side='right')
-
-        # --- Header ---
-        header_frame = tk.Frame(frame, bg=frame['bg'])
-        header_frame.pack(fill='x')
+    def toggle_antibody(self, antibody, selected):
+        """Checkbox handler shared by every pooled card"""
+        self.selection.set(antibody['id'], selected)
 
-        tk.Label(header_frame,
-                 text=f"{antibody['antigen']} - {antibody['metal']}",
-                 font=('Arial', 18, 'bold'), bg=frame['bg'], fg='white').pack(side='left')
-
-        if is_low_stock:
-            tk.Label(header_frame, text="LOW STOCK", bg='red', fg='white',
-                     font=('Arial', 12, 'bold'), padx=5, pady=2).pack(side='left', padx=10)
-
-        # --- Details ---
-        details_frame = tk.Frame(frame, bg=frame['bg'])
-        details_frame.pack(fill='x', pady=(5, 0))
-
-        details = [
-            f"Clone: {antibody['clone']}",
-            f"Concentration: {antibody['concentration']} mg/mL",
-            f"Stock: {antibody['stockVolume']:.1f} µL",
-            f"Vol/Test: {antibody['volumePerTest']} µL",
-            f"Date: {antibody['dateConjugated']}"
-        ]
-
-        for i, detail in enumerate(details):
-            tk.Label(details_frame, text=detail, font=('Arial', 9),
-                     bg=frame['bg'], fg='white').grid(row=i//2, column=i%2, sticky='w', padx=(0,20))
-
-        # --- Notes (if present) ---
-        if antibody['notes']:
-            tk.Label(frame, text=antibody['notes'], font=('Arial', 9, 'italic'),
-                     bg=frame['bg'], fg='white').pack(anchor='w', pady=(5,0))
+        # 🔥 Only update this one card + summary
+        self.update_antibody_card(antibody)
+        self.invalidate('summary')
 
     def update_summary(self):
-        """Update panel summary"""
-        # Clear previous summary widgets
-        for widget in self.summary_frame.winfo_children():
-            widget.destroy()
-
-        if not self.selected_panel:
+        """Update panel summary; its rows persist, so a toggle touches one row"""
+        # Counts follow the selection incrementally; a toggle moves one mass row
+        self.spillover.sync(self.selection.ids())
+        if not self.selection:
+            self.summary.show([], [])
             return
 
-        # Title
-        tk.Label(self.summary_frame, 
-                 text=f"Panel Summary ({len(self.selected_panel)} antibodies selected)",
-                 font=('Arial', 14, 'bold'), bg='black', fg='white'
-                ).grid(row=0, column=0, columnspan=2, sticky='w', padx=15, pady=10)
-
-        # List selected antibodies
-        for i, ab in enumerate(self.selected_panel, start=1):
-            volume = self.calculate_volume(ab)
-            item_frame = tk.Frame(self.summary_frame, bg='white', padx=10, pady=5)
-            item_frame.grid(row=i, column=0, columnspan=2, sticky='ew', padx=15, pady=2)
-
-            tk.Label(item_frame, text=f"{ab['antigen']} - {ab['metal']}", 
-                     font=('Arial', 14), bg='white', fg='black').pack(side='left')
-            tk.Label(item_frame, text=f"{volume:.2f} µL will be used",
-                     font=('Arial', 14, 'bold'), bg='white', fg='#4F46E5').pack(side='right')
-
-        # Buttons
-        button_frame = tk.Frame(self.summary_frame, bg='black')
-        button_frame.grid(row=i+1, column=0, columnspan=2, sticky='ew', padx=15, pady=10)
-
-        tk.Button(button_frame, text="💾 Save Panel", command=self.save_panel,
-                  bg='white', fg='black', font=('Arial', 11, 'bold'),
-                  padx=20, pady=8, cursor='hand2').pack(side='left', padx=5)
-
-        tk.Button(button_frame, text="✓ Execute Panel", command=self.execute_panel,
-                  bg='white', fg='black', font=('Arial', 11, 'bold'),
-                  padx=20, pady=8, cursor='hand2').pack(side='left', padx=5)
-        
-    def calculate_volume(self, antibody):
-        """Volume scales with cell count — intracellular uses 0.2x volume"""
-        base = antibody['volumePerTest']
-        ratio = self.cell_count_var.get()/4.0
-    
-        if antibody.get("stainType","Extracellular")=="Intracellular":
-            base *= 0.2     # 🔥 automatic intracellular scaling
-    
-        return base * ratio
+        # Required volumes for the whole selection in one vectorized pass
+        selected = list(self.selection)
+        required = self.service.engine.required([ab['id'] for ab in selected],
+                                        self.cell_count_var.get()).tolist()
+
+        def label(ab_id):
+            ab = self.inventory.get(ab_id)
+            return f"{ab['antigen']} ({ab['metal']})"
+
+        self.summary.show(list(zip(selected, required)), self.spillover.warnings(label))
+
+    def poll_store(self):
+        """Pick up commits from other stations, then look again shortly"""
+        self.sync_from_store()
+        self.root.after(STORE_POLL_MS, self.poll_store)
+
+    def sync_from_store(self):
+        """Reload the rows other stations changed and mark the affected views"""
+        touched = self.service.sync()
+        if ANTIBODY in touched:
+            self.invalidate('antibodies', 'summary', 'alerts', 'inventory')
+        if HISTORY in touched:
+            self.invalidate('history')
+        if SAVED_PANEL in touched:
+            self.invalidate('saved')
+
+    def show_shortfalls(self, heading, shortfalls):
+        msg = heading + "\n\n"
+        for ab_id, available, required in shortfalls:
+            ab = self.inventory.get(ab_id) or {'antigen': '?', 'metal': '?'}
+            msg += (f"• {ab['antigen']} ({ab['metal']}) → Need {required:.2f}µL, "
+                    f"Only {available:.2f}µL available\n")
+        messagebox.showerror("Execution Blocked", msg)
+
+    def show_store_error(self, exc):
+        messagebox.showerror("Database Error",
+                             f"🚫 The database could not be updated; nothing was changed.\n\n{exc}")
+
+    def show_journal_error(self, action, exc):
+        messagebox.showwarning("Journal Not Written",
+                               f"⚠ The change was saved, but the audit journal could not be "
+                               f"written ({action}):\n\n{exc}")
+
+    def show_panel_error(self, exc):
+        if isinstance(exc, DuplicateName):
+            messagebox.showerror("Duplicate Name", f"🚫 {exc}")
+        else:
+            messagebox.showwarning("Missing Information", f"⚠ {exc}")
 
-        
     def save_panel(self):
         """Save current panel configuration with name validation"""
-        from tkinter import messagebox
-        from datetime import datetime
-        
-        # Must have selected antibodies
-        if not self.selected_panel:
-            messagebox.showwarning("No Selection", 
-                                   "⚠ Please select at least one antibody before saving.")
-            return
-    
-        entered_name = self.panel_name_var.get().strip()
-    
-        # 🔴 No name entered
-        if not entered_name:
-            messagebox.showwarning("Missing Panel Name",
-                                   "⚠ You must enter a panel name before saving.")
-            return
-    
-        # 🔴 Check duplicate name in saved_panels
-        existing_names = [p['name'].lower() for p in self.saved_panels]
-        if entered_name.lower() in existing_names:
-            messagebox.showerror("Duplicate Name",
-                                 f"🚫 A panel named '{entered_name}' already exists.\n"
-                                 "Please choose a different name.")
+        try:
+            panel = self.service.save_panel(self.panel_name_var.get(), self.selection.ids())
+        except PanelError as exc:
+            self.show_panel_error(exc)
             return
-    
-        # Passed validation → save panel
-        panel = {
-            'id': int(datetime.now().timestamp() * 1000),
-            'name': entered_name,
-            'antibodyIds': [ab['id'] for ab in self.selected_panel],
-            'createdBy': self.current_user,
-            'createdAt': datetime.now().isoformat()
-        }
-    
-        self.saved_panels.append(panel)
-        self.refresh_saved_panels_tab()
+        self.invalidate('saved')
     
         messagebox.showinfo("Success",
-                            f"💾 Panel \"{entered_name}\" has been saved successfully!")
+                            f"💾 Panel \"{panel['name']}\" has been saved successfully!")
 
     def execute_panel(self):
         """Execute panel ONLY if sufficient antibody volume exists and unique in executed panels"""
-    
-        if not self.selected_panel:
-            messagebox.showwarning("No Selection",
-                                   "Please select at least one antibody.")
-            return
-    
-        # --- PANEL NAME VALIDATION ---
-        entered_name = self.panel_name_var.get().strip()
-    
-        if not entered_name:
-            messagebox.showwarning("Missing Panel Name",
-                                   "⚠ You must enter a panel name before executing.")
-            return
-    
-        # Check if name already exists in executed panels only
-        existing_names = [h['panelName'].lower() for h in self.panel_history]
-        if entered_name.lower() in existing_names:
-            messagebox.showerror("Duplicate Name",
-                                 f"🚫 A panel named '{entered_name}' has already been executed.\n"
-                                 "Please choose a different name before executing.")
+        try:
+            history_entry = self.service.prepare_execution(
+                self.panel_name_var.get(), self.selection.ids(), self.cell_count_var.get())
+        except PanelError as exc:
+            self.show_panel_error(exc)
             return
-    
-        # --- STOCK VALIDATION BEFORE EXECUTION ---
-        insufficient = []  # store failed antibodies
-    
-        for ab in self.selected_panel:
-            required = self.calculate_volume(ab)
-            available = ab["stockVolume"]
-    
-            if required > available:
-                insufficient.append((ab["antigen"], ab["metal"], required, available))
-    
-        if insufficient:
-            msg = "🚨 Not enough antibody for panel execution:\n\n"
-            for antigen, metal, req, avail in insufficient:
-                msg += f"• {antigen} ({metal}) → Need {req:.2f}µL, Only {avail:.2f}µL available\n"
-    
-            messagebox.showerror("Execution Blocked", msg)
+        except InsufficientStock as exc:
+            self.show_shortfalls("🚨 Not enough antibody for panel execution:", exc.shortfalls)
             return  # NO STOCK IS REMOVED
     
         # --- CONFIRMATION DIALOG ---
         confirm = messagebox.askyesno(
             "Confirm Panel Execution",
-            f"Are you sure you want to execute the panel '{entered_name}'?\n"
+            f"Are you sure you want to execute the panel '{history_entry['panelName']}'?\n"
             "This will reduce antibody stock volumes accordingly."
         )
     
@@ -531,46 +1062,154 @@ class AntibodyPanelManager:
             return  # User cancelled execution
     
         # --- EXECUTE PANEL ---
-        for item in self.inventory:
-            for selected in self.selected_panel:
-                if item['id'] == selected['id']:
-                    item['stockVolume'] -= self.calculate_volume(selected)
-    
-        # Record history
-        history_entry = {
-            'id': int(datetime.now().timestamp() * 1000),
-            'timestamp': datetime.now().isoformat(),
-            'user': self.current_user,
-            'panelName': entered_name,
-            'cellCount': self.cell_count_var.get(),
-            'antibodies': [{
-                'antigen': ab['antigen'],
-                'metal': ab['metal'],
-                'volumeUsed': self.calculate_volume(ab)
-            } for ab in self.selected_panel]
-        }
-        self.panel_history.insert(0, history_entry)
+        try:
+            # The store re-checks and decrements in one conditional update
+            self.service.record_execution(history_entry)
+        except InsufficientStock as exc:
+            self.sync_from_store()
+            self.show_shortfalls("🚨 Stock was used at another station in the meantime:",
+                                 exc.shortfalls)
+            return  # NO STOCK IS REMOVED
+        except sqlite3.Error as exc:
+            self.show_store_error(exc)
+            return
     
         # Reset UI
-        self.selected_panel = []
+        self.selection.clear()
         self.panel_name_var.set('')
         self.cell_count_var.set(4.0)
     
-        self.refresh_antibody_list()
-        self.update_summary()
-        self.update_alerts()
-        self.refresh_inventory_tab()
-        self.refresh_history_tab()
+        self.invalidate('antibodies', 'summary', 'alerts', 'inventory', 'history')
     
         messagebox.showinfo("Success", 
                             "Panel executed ✔ Stock volumes updated.")
-    
 
+    def open_batch_dialog(self):
+        """Run the selected panel on many samples (a plate) as one execution"""
+        ids = self.selection.ids()
+        if not ids:
+            messagebox.showwarning("Missing Information", "⚠ Please select at least one antibody.")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Execute Batch — {len(ids)} antibodies")
+        dialog.transient(self.root)
+
+        tk.Label(dialog, text="Samples: one \"name, cells (millions)\" per line, "
+                              "or paste two columns from a spreadsheet",
+                 font=('Arial', 11), anchor='w').pack(fill='x', padx=15, pady=(15, 5))
+
+        # Fill helper: numbered samples with the same cell count
+        fill = tk.Frame(dialog)
+        fill.pack(fill='x', padx=15)
+        prefix_var = tk.StringVar(value=self.panel_name_var.get().strip() or "Sample")
+        count_var = tk.IntVar(value=8)
+        cells_var = tk.DoubleVar(value=self.cell_count_var.get())
+        tk.Label(fill, text="Name prefix").pack(side='left')
+        tk.Entry(fill, textvariable=prefix_var, width=14).pack(side='left', padx=(3, 10))
+        tk.Label(fill, text="Samples").pack(side='left')
+        tk.Spinbox(fill, from_=1, to=384, textvariable=count_var, width=5).pack(side='left', padx=(3, 10))
+        tk.Label(fill, text="Cells (M)").pack(side='left')
+        tk.Entry(fill, textvariable=cells_var, width=7).pack(side='left', padx=(3, 10))
+
+        text = tk.Text(dialog, width=50, height=12, font=('Courier', 11))
+        text.pack(fill='both', expand=True, padx=15, pady=5)
+
+        # Totals per antibody against stock, before anything is drawn
+        columns = ('Antibody', 'Total (µL)', 'In Stock (µL)')
+        tree = ttk.Treeview(dialog, columns=columns, show='headings', height=min(len(ids), 8))
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=150)
+        tree.tag_configure('short', background='#FCA5A5')
+        tree.pack(fill='both', padx=15, pady=5)
+        status = tk.Label(dialog, font=('Arial', 11, 'bold'), anchor='w')
+        status.pack(fill='x', padx=15)
+
+        def samples():
+            return parse_samples(text.get('1.0', 'end').splitlines())
+
+        def preview():
+            if not dialog.winfo_exists():
+                return      # a debounced check outlived the dialog
+            tree.delete(*tree.get_children())
+            try:
+                batch = samples()
+            except InvalidValue as exc:
+                status.configure(text=f"⚠ {exc}", fg='red')
+                return
+            if not batch:
+                status.configure(text="No samples yet.", fg='#666')
+                return
+            check = self.service.engine.check_batch(ids, [cells for _, cells in batch])
+            for ab, total, available, short in zip(
+                    self.inventory.resolve(ids), check.total.tolist(),
+                    check.available.tolist(), check.shortfall.tolist()):
+                tree.insert('', 'end', tags=('short',) if short > 0 else (), values=(
+                    f"{ab['antigen']} ({ab['metal']})", f"{total:.2f}", f"{available:.2f}"))
+            if check.ok:
+                status.configure(text=f"✔ {len(batch)} samples fit in current stock", fg='green')
+            else:
+                status.configure(text=f"🚨 Not enough stock for {len(batch)} samples", fg='red')
+
+        def fill_samples():
+            try:
+                count, cells = count_var.get(), cells_var.get()
+            except tk.TclError:
+                messagebox.showerror("Invalid Input", "Please enter numbers for samples and cells",
+                                     parent=dialog)
+                return
+            prefix = prefix_var.get().strip() or "Sample"
+            width = len(str(count))
+            text.delete('1.0', 'end')
+            text.insert('1.0', "\n".join(f"{prefix}-{n:0{width}d}, {cells:g}"
+                                         for n in range(1, count + 1)))
+            preview()
+
+        def execute():
+            try:
+                batch = self.service.prepare_batch(ids, samples())
+            except PanelError as exc:
+                self.show_panel_error(exc)
+                return
+            except InsufficientStock as exc:
+                self.show_shortfalls("🚨 Not enough antibody for this batch:", exc.shortfalls)
+                return  # NO STOCK IS REMOVED
+            if not messagebox.askyesno(
+                    "Confirm Batch Execution",
+                    f"Execute the panel on {len(batch.entries)} samples?\n"
+                    "This will reduce antibody stock volumes accordingly.", parent=dialog):
+                return
+            try:
+                self.service.record_batch(batch)
+            except InsufficientStock as exc:
+                self.sync_from_store()
+                self.show_shortfalls("🚨 Stock was used at another station in the meantime:",
+                                     exc.shortfalls)
+                preview()
+                return  # NO STOCK IS REMOVED
+            except sqlite3.Error as exc:
+                self.show_store_error(exc)
+                return
+            dialog.destroy()
+            self.selection.clear()
+            self.panel_name_var.set('')
+            self.invalidate('antibodies', 'summary', 'alerts', 'inventory', 'history')
+            messagebox.showinfo("Success",
+                                f"Batch executed ✔ {len(batch.entries)} samples recorded.")
+
+        tk.Button(fill, text="Fill", command=fill_samples, padx=10).pack(side='left')
+        btns = tk.Frame(dialog)
+        btns.pack(fill='x', padx=15, pady=(5, 15))
+        tk.Button(btns, text="Check Stock", command=preview, padx=15).pack(side='left')
+        tk.Button(btns, text="✓ Execute Batch", command=execute,
+                  font=('Arial', 11, 'bold'), padx=15).pack(side='left', padx=10)
+        tk.Button(btns, text="Cancel", command=dialog.destroy, padx=15).pack(side='right')
+        text.bind('<KeyRelease>', lambda e: self.debounce('batch_preview', preview))
+
+        fill_samples()
 
     def create_saved_panels_tab(self):
-        self.saved_panels_frame = tk.Frame(self.notebook, bg='#F9FAFB')
-        self.notebook.add(self.saved_panels_frame, text='Saved Panels')
-    
         # *******************************
         # TOP BAR (STATIC — never destroyed)
         # *******************************
@@ -585,180 +1224,153 @@ class AntibodyPanelManager:
                          font=('Arial', 12), width=30)
         entry.pack(side='left', padx=8)
     
-        # Live update on typing
+        # Live update on typing, once the user pauses
         self.saved_search_var.trace_add(
-            "write", lambda *_: self.refresh_saved_panels_tab()
+            "write", lambda *_: self.debounce('saved_search', self.refresh_saved_panels_tab)
         )
     
         # *********************************
-        # LIST AREA (this part refreshes)
+        # LIST AREA (persistent; cards are pooled by the grid)
         # *********************************
         self.saved_panels_list_frame = tk.Frame(self.saved_panels_frame, bg="#F9FAFB")
         self.saved_panels_list_frame.pack(fill="both", expand=True)
     
-        self.refresh_saved_panels_tab()
-
-
-    def refresh_saved_panels_tab(self):
-        """Refresh saved panels display with alphabetical order + search + grid"""
-    
-        # CLEAR ONLY THE LISTING AREA — ***NOT THE SEARCH BAR***
-        for widget in self.saved_panels_list_frame.winfo_children():
-            widget.destroy()
-    
-        # ------------- If none exist -------------
-        if not self.saved_panels:
-            tk.Label(self.saved_panels_list_frame, text="No saved panels yet",
-                     font=('Arial',14), bg='#F9FAFB', fg='#999').pack(pady=20)
-            return
+        self.saved_panels_empty = tk.Label(self.saved_panels_list_frame,
+                                           font=('Arial',14), bg='#F9FAFB', fg='#999')
     
-        # ------------- Scrollable Canvas -------------
         canvas = tk.Canvas(self.saved_panels_list_frame, bg='#F9FAFB', highlightthickness=0)
         scrollbar = ttk.Scrollbar(self.saved_panels_list_frame, orient='vertical', command=canvas.yview)
-        content_frame = tk.Frame(canvas, bg='#F9FAFB')
-    
-        content_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        window_id = canvas.create_window((0,0), window=content_frame, anchor="nw")
-        canvas.bind("<Configure>", lambda e: canvas.itemconfig(window_id, width=e.width))
-    
         canvas.pack(side='left', fill='both', expand=True, padx=10, pady=10)
         scrollbar.pack(side='right', fill='y')
-        canvas.configure(yscrollcommand=scrollbar.set)
+        self.saved_panels_canvas = canvas
+        self.saved_panels_scrollbar = scrollbar
     
-        # ------------- Sort alphabetically -------------
-        sorted_panels = sorted(self.saved_panels, key=lambda p: p['name'].lower())
+        self.saved_panels_grid = VirtualCardGrid(
+            canvas, scrollbar,
+            make_card=lambda parent: SavedPanelCard(parent, self.fonts,
+                                                    lambda panel: self.saved_panels.labels(panel),
+                                                    self.load_panel, self.delete_saved_panel),
+            columns=3, pad=6)
     
-        # ------------- Apply search filter -------------
-        query = self.saved_search_var.get().lower()
-        filtered = [p for p in sorted_panels if query in p['name'].lower()]
+        self.refresh_saved_panels_tab()
+
+
+    def refresh_saved_panels_tab(self):
+        """Refresh saved panels: A-Z order, prefix search, cards built as they scroll in"""
+        query = self.saved_search_var.get()
+        filtered = self.saved_panels.search(query)
     
+        # ------------- Nothing to show -------------
         if not filtered:
-            tk.Label(self.saved_panels_list_frame, text="No panels match search",
-                     font=("Arial",13), bg="#F9FAFB", fg="#777").pack(pady=25)
-            return
+            self.saved_panels_canvas.pack_forget()
+            self.saved_panels_scrollbar.pack_forget()
+            self.saved_panels_empty.configure(
+                text="No saved panels yet" if not self.saved_panels else "No panels match search")
+            self.saved_panels_empty.pack(pady=20)
+        elif not self.saved_panels_canvas.winfo_manager():
+            self.saved_panels_empty.pack_forget()
+            self.saved_panels_canvas.pack(side='left', fill='both', expand=True, padx=10, pady=10)
+            self.saved_panels_scrollbar.pack(side='right', fill='y')
     
         # ------------- Grid render -------------
         NUM_COLS = 3
-        for idx, panel in enumerate(filtered):
-            row, col = divmod(idx, NUM_COLS)
-            self.create_saved_panel_card(content_frame, panel, row, col)
-
-    def create_saved_panel_card(self, parent, panel, row, col):
-        """Create a saved panel card (grid-compatible)"""
-    
-        frame = tk.Frame(
-            parent,
-            bg='white',
-            highlightbackground='#D1D5DB',
-            highlightthickness=2,
-            padx=15,
-            pady=10
-        )
-
-        # PLACE CARD IN GRID, NOT PACK
-        frame.grid(row=row, column=col, sticky="nsew", padx=6, pady=6)
-
-        # ----- Header -----
-        header_frame = tk.Frame(frame, bg='white')
-        header_frame.pack(fill='x')
-
-        tk.Label(
-            header_frame,
-            text=panel['name'],
-            font=('Arial', 14, 'bold'),
-            bg='white',
-            fg='black'
-        ).pack(side='left')
-
-        date = datetime.fromisoformat(panel['createdAt']).strftime('%d-%m-%Y')
-
-        tk.Label(
-            header_frame,
-            text=f"Created by {panel['createdBy']} • {date}",
-            font=('Arial', 9),
-            bg='white',
-            fg='#666'
-        ).pack(side='left', padx=10)
-
-        # ----- Buttons -----
-        btn_frame = tk.Frame(header_frame, bg='white')
-        btn_frame.pack(side='right')
-
-        tk.Button(
-            btn_frame,
-            text="Load",
-            command=lambda: self.load_panel(panel),
-            bg='white',
-            fg='black',
-            font=('Arial', 10),
-            padx=15,
-            pady=5,
-            cursor='hand2'
-        ).pack(side='left', padx=2)
-
-        tk.Button(
-            btn_frame,
-            text="🗑",
-            command=lambda: self.delete_saved_panel(panel['id']),
-            bg='white',
-            fg='white',
-            font=('Arial', 10),
-            padx=8,
-            pady=5,
-            cursor='hand2'
-        ).pack(side='left', padx=2)
-
-        # ----- Antibody details -----
-        panel_abs = [ab for ab in self.inventory if ab['id'] in panel['antibodyIds']]
-        ab_text = ', '.join([f"{ab['antigen']} - {ab['metal']}" for ab in panel_abs])
-
-        details_frame = tk.Frame(frame, bg='#222222', padx=10, pady=8)
-        details_frame.pack(fill='x', pady=(10, 0))
-
-        tk.Label(
-            details_frame,
-            text=f"Antibodies ({len(panel_abs)}):",
-            font=('Arial', 10, 'bold'),
-            bg='#222222',
-            fg='white'
-        ).pack(anchor='w')
-
-        tk.Label(
-            details_frame,
-            text=ab_text,
-            font=('Arial', 9),
-            bg='#222222',
-            fg='white',
-            wraplength=300,   # Adjust to your card width
-            justify='left'
-        ).pack(anchor='w')
+        rows = [('cards', filtered[i:i + NUM_COLS]) for i in range(0, len(filtered), NUM_COLS)]
+        self.saved_panels_canvas.yview_moveto(0)
+        self.saved_panels_grid.set_rows(rows)
+    
+    def open_panel_designer(self):
+        """Suggest one conjugate per target antigen on distinct mass channels"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Design Panel")
+        dialog.transient(self.root)
+
+        tk.Label(dialog, text="Target antigens (comma or newline separated):",
+                 font=('Arial', 12, 'bold')).pack(anchor='w', padx=15, pady=(15, 5))
+        antigens_text = tk.Text(dialog, height=5, width=70, font=('Arial', 11))
+        antigens_text.pack(fill='x', padx=15)
+
+        columns = ('Antigen', 'Metal', 'Clone', 'Stock', 'Tier')
+        tree = ttk.Treeview(dialog, columns=columns, show='headings', height=12)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=110)
+        tree.pack(fill='both', expand=True, padx=15, pady=10)
+
+        status = tk.Label(dialog, font=('Arial', 10), fg='#666', justify='left',
+                          anchor='w', wraplength=600)
+        status.pack(fill='x', padx=15)
+
+        result = {}
+
+        def run():
+            antigens = antigens_text.get('1.0', 'end').replace('\n', ',').split(',')
+            try:
+                cell_count = self.cell_count_var.get()
+            except tk.TclError:
+                cell_count = 4.0
+            design = result['design'] = design_panel(antigens, self.inventory, cell_count)
+
+            tree.delete(*tree.get_children())
+            for antigen, ab in design.assignments:
+                tree.insert('', 'end', values=(
+                    antigen, ab['metal'], ab['clone'], f"{ab['stockVolume']:.1f}",
+                    sensitivity_tier(metal_mass(ab['metal']))))
+
+            lines = [f"{len(design.assignments)} antigen(s) assigned at {cell_count:g}M cells."]
+            if design.unassigned:
+                lines.append("No usable conjugate: " + ', '.join(design.unassigned))
+            worst = sorted(design.spillover, key=lambda pair: -pair[2])
+            for source, target, fraction, reason in worst[:8]:
+                lines.append(f"⚠ {source['antigen']} ({source['metal']}) → "
+                             f"{target['antigen']} ({target['metal']}): {fraction:.0%} {reason}")
+            if len(worst) > 8:
+                lines.append(f"… and {len(worst) - 8} more spillover pair(s)")
+            status.configure(text='\n'.join(lines))
+            apply_btn.configure(state='normal' if design.assignments else 'disabled')
+
+        def apply():
+            design = result.get('design')
+            if design is None:
+                return
+            self.selection.replace([ab['id'] for _, ab in design.assignments])
+            self.invalidate('antibodies', 'summary')
+            dialog.destroy()
+
+        btns = tk.Frame(dialog)
+        btns.pack(fill='x', padx=15, pady=(5, 15))
+        tk.Button(btns, text="Design", command=run, padx=15).pack(side='left')
+        apply_btn = tk.Button(btns, text="Apply to Selection", command=apply,
+                              padx=15, state='disabled')
+        apply_btn.pack(side='left', padx=10)
+        tk.Button(btns, text="Close", command=dialog.destroy, padx=15).pack(side='right')
 
-    
     def load_panel(self, panel):
         """Load a saved panel"""
-        self.selected_panel = [ab for ab in self.inventory 
-                              if ab['id'] in panel['antibodyIds']]
+        self.selection.replace(panel['antibodyIds'])
         self.panel_name_var.set(panel['name'])
         self.notebook.select(0)  # Switch to Build Panel tab
-        self.refresh_antibody_list()
-        self.update_summary()
+        self.invalidate('antibodies', 'summary')
     
     def delete_saved_panel(self, panel_id):
         """Delete a saved panel"""
         if messagebox.askyesno("Confirm Delete",
                               "Are you sure you want to delete this saved panel?"):
-            self.saved_panels = [p for p in self.saved_panels if p['id'] != panel_id]
-            self.refresh_saved_panels_tab()
+            try:
+                self.service.delete_saved_panel(panel_id)
+            except PanelError as exc:
+                messagebox.showerror("Delete Failed", f"🚫 {exc}")
+            except sqlite3.Error as exc:
+                self.show_store_error(exc)
+                return
+            self.invalidate('saved')
 
 
     def create_inventory_tab(self):
         """Create inventory management tab"""
-        self.inventory_frame = tk.Frame(self.notebook, bg='white')
-        self.notebook.add(self.inventory_frame, text='Manage Inventory')
-
         # Search and filter variables
         self.inventory_search_var = tk.StringVar()
         self.show_low_stock_only = tk.BooleanVar(value=False)
+        self.show_expiring_only = tk.BooleanVar(value=False)
 
         # Header
         header = tk.Frame(self.inventory_frame, bg='white')
@@ -771,6 +1383,10 @@ class AntibodyPanelManager:
                   bg='white', fg='black', font=('Arial', 10, 'bold'),
                   padx=15, pady=5, cursor='hand2').pack(side='right')
 
+        tk.Button(header, text="📤 Import CSV", command=self.import_inventory,
+                  bg='white', fg='black', font=('Arial', 10, 'bold'),
+                  padx=15, pady=5, cursor='hand2').pack(side='right', padx=(0, 5))
+
         # Search and filter row
         filter_frame = tk.Frame(self.inventory_frame, bg='#F9FAFB')
         filter_frame.pack(fill='x', padx=10, pady=(0, 10))
@@ -797,59 +1413,41 @@ class AntibodyPanelManager:
         )
         low_stock_btn.pack(side='right', padx=(10, 0))
 
+        # Expiring lots filter button
+        tk.Button(
+            filter_frame,
+            text=f"⏳ Expiring in {EXPIRY_WARNING_DAYS} Days",
+            command=lambda: self.show_expiring_only.set(not self.show_expiring_only.get()),
+            bg='black', fg='black',
+            font=('Arial', 10, 'bold'),
+            padx=15, pady=5, cursor='hand2'
+        ).pack(side='right', padx=(10, 0))
+
         # Trace changes to refresh table only
-        self.inventory_search_var.trace('w', lambda *args: self.refresh_inventory_tab())
-        self.show_low_stock_only.trace('w', lambda *args: self.refresh_inventory_tab())
+        self.inventory_search_var.trace(
+            'w', lambda *args: self.debounce('inventory_search', self.refresh_inventory_tab))
+        self.show_low_stock_only.trace('w', lambda *args: self.invalidate('inventory'))
+        self.show_expiring_only.trace('w', lambda *args: self.invalidate('inventory'))
 
         # Table container (persistent)
         self.inventory_table_frame = tk.Frame(self.inventory_frame)
         self.inventory_table_frame.pack(fill='both', expand=True, padx=10, pady=(2, 10))
 
-        # Initial table load
-        self.refresh_inventory_tab()
-
-    def refresh_inventory_tab(self):
-        """Refresh inventory table with in-place editing and delete button."""
-        
-        # Clear previous table
-        for widget in self.inventory_table_frame.winfo_children():
-            widget.destroy()
-    
-        # Filter inventory
-        search_term = self.inventory_search_var.get().lower()
-        filtered_inventory = []
-        for ab in self.inventory:
-            search_match = (search_term == '' or
-                            search_term in ab['antigen'].lower() or
-                            search_term in ab['metal'].lower())
-            is_low_stock = ab['stockVolume'] <= ab['alertThreshold']
-            low_stock_match = not self.show_low_stock_only.get() or is_low_stock
-    
-            if search_match and low_stock_match:
-                filtered_inventory.append(ab)
-            
-        # Sort alphabetically by antigen
-        filtered_inventory.sort(key=lambda x: x['antigen'].lower())
-    
         # Table columns
         columns = ('Antigen', 'Metal', 'Clone', 'Conc', 'Stock',
-                   'Vol/Test', 'Date', 'Notes')
+                   'Vol/Test', 'Date', 'Notes', 'Runs Out', 'Next Expiry')
     
+        # The tree persists; rows are keyed by str(antibody id) and updated in place
         tree = ttk.Treeview(self.inventory_table_frame, columns=columns, show='headings', height=15)
         for col in columns:
             tree.heading(col, text=col)
             tree.column(col, width=100 if col != 'Notes' else 200)
-    
-        # Populate table
-        for ab in filtered_inventory:
-            values = (
-                ab['antigen'], ab['metal'], ab['clone'], ab['concentration'],
-                f"{ab['stockVolume']:.1f}", ab['volumePerTest'], ab['dateConjugated'], ab['notes']
-            )
-            tags = ('low_stock',) if ab['stockVolume'] <= ab['alertThreshold'] else ()
-            tree.insert('', 'end', values=values, tags=tags)
-    
         tree.tag_configure('low_stock', background='red')
+        tree.tag_configure('expiring', background='#FDBA74')
+        self.inventory_tree = tree
+        self._inventory_rows = {}   # antibody id -> (values, tags) last written to the tree
+        self._inventory_order = []  # sorted search_index.sort_key() of the rows shown
+        self._inventory_shown = {}  # antibody id -> its entry in _inventory_order
     
         # Scrollbar
         scrollbar = ttk.Scrollbar(self.inventory_table_frame, orient='vertical', command=tree.yview)
@@ -865,6 +1463,8 @@ class AntibodyPanelManager:
                 return
     
             col_idx = int(column.replace("#", "")) - 1
+            if col_idx >= len(EDITABLE_COLUMNS):
+                return  # computed columns are read-only
             x, y, width, height = tree.bbox(item_id, column)
             value = tree.set(item_id, column)
     
@@ -875,31 +1475,36 @@ class AntibodyPanelManager:
     
             def save_edit(event=None):
                 new_value = entry.get()
-                tree.set(item_id, column, new_value)
-                # Update underlying inventory
-                idx = tree.index(item_id)
-                ab = filtered_inventory[idx]
-                if col_idx == 0:  # Antigen
-                    ab['antigen'] = new_value
-                elif col_idx == 1:  # Metal
-                    ab['metal'] = new_value
-                elif col_idx == 2:  # Clone
-                    ab['clone'] = new_value
-                elif col_idx == 3:  # Conc
-                    try: ab['concentration'] = float(new_value)
-                    except ValueError: pass
-                elif col_idx == 4:  # Stock
-                    try: ab['stockVolume'] = float(new_value)
-                    except ValueError: pass
-                elif col_idx == 5:  # Vol/Test
-                    try: ab['volumePerTest'] = float(new_value)
-                    except ValueError: pass
-                elif col_idx == 6:  # Date
-                    ab['dateConjugated'] = new_value
-                elif col_idx == 7:  # Notes
-                    ab['notes'] = new_value
                 entry.destroy()
-                self.refresh_inventory_tab()
+                # Update underlying inventory
+                ab = self.inventory.get(int(item_id))
+                if ab is None:
+                    return
+                field = EDITABLE_COLUMNS[col_idx]
+                if field in NUMERIC_FIELDS:
+                    try: new_value = float(new_value)
+                    except ValueError: new_value = ab[field]
+                if new_value != ab[field]:
+                    try:
+                        self.service.update_antibody(ab['id'], field, new_value)
+                    except InvalidValue as exc:
+                        messagebox.showwarning("Invalid Value", f"⚠ {exc}")
+                        return
+                    except UnknownPanel as exc:
+                        # Deleted at another station; the sync removed it here too
+                        self.invalidate('antibodies', 'summary', 'alerts', 'inventory')
+                        messagebox.showerror("Edit Failed", f"🚫 {exc}")
+                        return
+                    except (VersionConflict, InsufficientStock):
+                        # The service has already reloaded the row and its lots
+                        self.invalidate('antibodies', 'summary', 'alerts', 'inventory')
+                        messagebox.showwarning(
+                            "Edit Conflict",
+                            f"{ab['antigen']} ({ab['metal']}) was changed at another station.\n"
+                            "The latest values have been loaded; please make the edit again.")
+                        return
+                    self.invalidate('antibodies', 'summary', 'alerts')
+                self.update_inventory_row(ab)
     
             entry.bind("<Return>", save_edit)
             entry.bind("<FocusOut>", lambda e: entry.destroy())
@@ -911,154 +1516,490 @@ class AntibodyPanelManager:
         btn_frame.pack(fill='x', pady=5)
     
         tk.Button(btn_frame, text="Delete Selected", bg="#ff5c5c", fg="black",
-                  command=lambda: self.delete_selected_antibody(tree, filtered_inventory)).pack(side='left', padx=5)
-    
-    def delete_selected_antibody(self, tree, visible_inventory):
+                  command=self.delete_selected_antibody).pack(side='left', padx=5)
+        tk.Button(btn_frame, text="🧫 Lots…", fg="black",
+                  command=self.open_lots_dialog).pack(side='left', padx=5)
+
+        # Initial table load
+        self.refresh_inventory_tab()
+
+    def filtered_inventory(self):
+        """Inventory rows matching the search box and filter toggles, in display order"""
+        within = self.alerts.low_ids() if self.show_low_stock_only.get() else None
+        if self.show_expiring_only.get():
+            expiring = {lot['antibodyId'] for lot in self.service.lots.expiring_within()}
+            within = expiring if within is None else within & expiring
+        return self.search_index.search(self.inventory_search_var.get(),
+                                        fields=('antigen', 'metal'), within=within)
+
+    def inventory_row_visible(self, ab):
+        """filtered_inventory's test for one antibody, without searching the rest"""
+        if self.show_low_stock_only.get() and not self.alerts.is_low(ab['id']):
+            return False
+        if self.show_expiring_only.get():
+            # The next lot drawn is the earliest-expiring one that holds stock
+            expiry = self.service.lots.next_expiry(ab['id'])
+            if not expiry or expiry > days_from(None, EXPIRY_WARNING_DAYS):
+                return False
+        return self.search_index.matches(ab['id'], self.inventory_search_var.get(),
+                                         fields=('antigen', 'metal'))
+
+    def _inventory_row(self, ab):
+        values = (
+            ab['antigen'], ab['metal'], ab['clone'], ab['concentration'],
+            f"{ab['stockVolume']:.1f}", ab['volumePerTest'], ab['dateConjugated'], ab['notes'],
+            runs_out_text(self.service.forecast.days_left(ab['id'])),
+            self.service.lots.next_expiry(ab['id']) or ''
+        )
+        if self.alerts.is_low(ab['id']):
+            tags = ('low_stock',)
+        elif values[-1] and values[-1] <= days_from(None, EXPIRY_WARNING_DAYS):
+            tags = ('expiring',)
+        else:
+            tags = ()
+        return values, tags
+
+    def _write_inventory_row(self, ab):
+        """Insert or update one tree row; no-op when its values are unchanged"""
+        row = self._inventory_row(ab)
+        cached = self._inventory_rows.get(ab['id'])
+        if cached == row:
+            return
+        values, tags = row
+        if cached is None:
+            self.inventory_tree.insert('', 'end', iid=str(ab['id']), values=values, tags=tags)
+        else:
+            self.inventory_tree.item(str(ab['id']), values=values, tags=tags)
+        self._inventory_rows[ab['id']] = row
+
+    def refresh_inventory_tab(self):
+        """Diff the filtered inventory against the persistent tree"""
+        filtered_inventory = self.filtered_inventory()
+        for ab in filtered_inventory:
+            self._write_inventory_row(ab)
+    
+        self._inventory_order = [self.search_index.sort_key(ab['id']) for ab in filtered_inventory]
+        self._inventory_shown = {entry[1]: entry for entry in self._inventory_order}
+
+        # Re-order and hide rows in a single call, only if the order changed
+        order = [str(ab['id']) for ab in filtered_inventory]
+        if list(self.inventory_tree.get_children()) != order:
+            self.inventory_tree.set_children('', *order)
+
+    def update_inventory_row(self, ab):
+        """Apply an edit to one antibody's row, moving or hiding only that row.
+
+        The row's new position is found by bisecting the sort keys of the
+        rows shown, so an edit does not re-run the search.
+        """
+        tree = self.inventory_tree
+        self._write_inventory_row(ab)
+        iid = str(ab['id'])
+        self._forget_inventory_position(ab['id'])
+        if not self.inventory_row_visible(ab):
+            tree.detach(iid)
+            return
+        entry = self._inventory_shown[ab['id']] = self.search_index.sort_key(ab['id'])
+        position = bisect.bisect_left(self._inventory_order, entry)
+        self._inventory_order.insert(position, entry)
+        tree.move(iid, '', position)
+
+    def _forget_inventory_position(self, ab_id):
+        entry = self._inventory_shown.pop(ab_id, None)
+        if entry is not None:
+            del self._inventory_order[bisect.bisect_left(self._inventory_order, entry)]
+
+    def remove_inventory_row(self, ab_id):
+        if ab_id in self._inventory_rows:
+            self.inventory_tree.delete(str(ab_id))
+            del self._inventory_rows[ab_id]
+            self._forget_inventory_position(ab_id)
+    
+    def delete_selected_antibody(self):
+        tree = self.inventory_tree
         selected = tree.selection()
         if not selected:
             messagebox.showwarning("No Selection", "Please select an antibody to delete.")
             return
     
-        idx = tree.index(selected[0])
-        ab = visible_inventory[idx]
+        ab = self.inventory.get(int(selected[0]))
     
         if messagebox.askyesno("Delete Antibody",
                                f"Remove {ab['antigen']} ({ab['metal']}) from inventory?"):
-            self.inventory.remove(ab)
-        self.refresh_inventory_tab()
+            try:
+                self.service.delete_antibody(ab['id'])
+            except PanelError as exc:
+                # Already deleted at another station; the sync removed it here too
+                messagebox.showerror("Delete Failed", f"🚫 {exc}")
+                self.invalidate('antibodies', 'inventory', 'summary', 'alerts')
+                return
+            except sqlite3.Error as exc:
+                self.show_store_error(exc)
+                return
+            self.invalidate('antibodies', 'summary', 'alerts')
+
+    def open_lots_dialog(self):
+        """Show the selected antibody's vials; add a lot or discard one"""
+        selected = self.inventory_tree.selection()
+        if not selected:
+            messagebox.showwarning("No Selection", "Please select an antibody to view its lots.")
+            return
+        ab = self.inventory.get(int(selected[0]))
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Lots — {ab['antigen']} ({ab['metal']})")
+        dialog.transient(self.root)
+
+        total = tk.Label(dialog, font=('Arial', 12, 'bold'), anchor='w')
+        total.pack(fill='x', padx=15, pady=(15, 5))
+
+        columns = ('Lot', 'Conjugated', 'Expiry', 'Volume (µL)')
+        tree = ttk.Treeview(dialog, columns=columns, show='headings', height=8)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120)
+        tree.tag_configure('expiring', background='#FDBA74')
+        tree.tag_configure('empty', foreground='#999')
+        tree.pack(fill='both', expand=True, padx=15, pady=5)
+
+        def show_lots():
+            # Draw order: the first non-empty row is the vial the next run takes from
+            warn = days_from(None, EXPIRY_WARNING_DAYS)
+            tree.delete(*tree.get_children())
+            for lot in self.service.lots.for_antibody(ab['id']):
+                if lot['volume'] <= 0:
+                    tags = ('empty',)
+                elif lot['expiry'] and lot['expiry'] <= warn:
+                    tags = ('expiring',)
+                else:
+                    tags = ()
+                tree.insert('', 'end', iid=str(lot['id']), tags=tags, values=(
+                    lot['lotNumber'] or f"#{lot['id']}", lot['dateConjugated'],
+                    lot['expiry'] or '—', f"{lot['volume']:.1f}"))
+            total.configure(text=f"{ab['stockVolume']:.1f} µL in stock, drawn from the "
+                                 "earliest-expiring lot first")
+
+        # New lot form
+        form = tk.Frame(dialog)
+        form.pack(fill='x', padx=15, pady=5)
+        lot_vars = {}
+        for col, (key, label, default) in enumerate((
+                ('lotNumber', 'Lot #', ''),
+                ('volume', 'Volume (µL)', ''),
+                ('dateConjugated', 'Conjugated', date.today().isoformat()),
+                ('expiry', 'Expiry (blank = default)', ''))):
+            tk.Label(form, text=label, font=('Arial', 10)).grid(row=0, column=col, sticky='w', padx=3)
+            lot_vars[key] = tk.StringVar(value=default)
+            tk.Entry(form, textvariable=lot_vars[key], width=16).grid(row=1, column=col, padx=3)
+
+        def changed():
+            show_lots()
+            self.invalidate('antibodies', 'summary', 'alerts', 'inventory')
+
+        def add_lot():
+            try:
+                volume = float(lot_vars['volume'].get() or 0)
+            except ValueError:
+                messagebox.showerror("Invalid Input", "Please enter a number for the volume",
+                                     parent=dialog)
+                return
+            try:
+                self.service.add_lot(ab['id'], volume, lot_vars['dateConjugated'].get(),
+                                     lot_vars['expiry'].get(), lot_vars['lotNumber'].get())
+            except PanelError as exc:
+                messagebox.showwarning("Cannot Add Lot", f"⚠ {exc}", parent=dialog)
+                return
+            for key in ('lotNumber', 'volume', 'expiry'):
+                lot_vars[key].set('')
+            changed()
+
+        def discard_lot():
+            chosen = tree.selection()
+            if not chosen:
+                return
+            lot = self.service.lots.get(int(chosen[0]))
+            if lot is None or lot['volume'] <= 0 or not messagebox.askyesno(
+                    "Discard Lot", f"Write off the {lot['volume']:.1f} µL left in this lot?",
+                    parent=dialog):
+                return
+            try:
+                self.service.discard_lot(lot['id'])
+            except InsufficientStock:
+                messagebox.showwarning("Discard Failed",
+                                       "This lot was drawn on at another station; "
+                                       "its latest volume has been loaded.", parent=dialog)
+            changed()
+
+        btns = tk.Frame(dialog)
+        btns.pack(fill='x', padx=15, pady=(5, 15))
+        tk.Button(btns, text="➕ Add Lot", command=add_lot, padx=15).pack(side='left')
+        tk.Button(btns, text="Discard Selected Lot", command=discard_lot,
+                  padx=15).pack(side='left', padx=10)
+        tk.Button(btns, text="Close", command=dialog.destroy, padx=15).pack(side='right')
+
+        show_lots()
 
 
     def export_inventory(self):
-        """Export inventory to CSV"""
+        """Export inventory to CSV or NDJSON in the background"""
         filename = filedialog.asksaveasfilename(
             defaultextension='.csv',
-            filetypes=[('CSV files', '*.csv')],
+            filetypes=EXPORT_FILETYPES,
             initialfile='antibody_inventory.csv'
         )
         
         if filename:
-            with open(filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Antigen', 'Clone', 'Metal', 'Concentration (mg/mL)',
-                               'Antibody per Test (µg)', 'Volume per Test (µL)',
-                               'Stock Volume (µL)', 'Alert Threshold (µL)',
-                               'Date Conjugated', 'Notes'])
-                
-                for ab in self.inventory:
-                    writer.writerow([
-                        ab['antigen'], ab['clone'], ab['metal'],
-                        ab['concentration'], ab['antibodyPerTest'],
-                        ab['volumePerTest'], f"{ab['stockVolume']:.2f}",
-                        ab['alertThreshold'], ab['dateConjugated'], ab['notes']
-                    ])
-            
-            messagebox.showinfo("Success", f"Inventory exported to {filename}")
+            self.run_export(self.service.export_job('inventory', filename), "Inventory")
+
+    def import_inventory(self):
+        """Bulk-import antibodies from a CSV in the inventory export layout"""
+        filename = filedialog.askopenfilename(
+            filetypes=[('CSV files', '*.csv'), ('All files', '*.*')]
+        )
+        if not filename:
+            return
     
-    def create_history_tab(self):
-        """Create history tab"""
-        self.history_frame = tk.Frame(self.notebook, bg='#F9FAFB')
-        self.notebook.add(self.history_frame, text='History')
-        self.refresh_history_tab()
+        try:
+            with open(filename, newline='', encoding='utf-8-sig') as f:
+                plan = plan_import(f, self.inventory)
+        except (OSError, UnicodeDecodeError, ImportFormatError) as exc:
+            messagebox.showerror("Import Failed", str(exc))
+            return
     
-    def refresh_history_tab(self):
-        """Display history in 3-column grid, sorted alphabetically"""
-        for widget in self.history_frame.winfo_children():
-            widget.destroy()
+        if not plan.inserts and not plan.updates:
+            self.show_import_report(plan, "Nothing to import.")
+            return
+        if not messagebox.askyesno(
+                "Confirm Import",
+                f"Add {len(plan.inserts)} new antibodies and update {len(plan.updates)} "
+                f"existing ones?\n{len(plan.errors)} row(s) have errors and will be skipped."):
+            return
+    
+        try:
+            self.service.apply_import(plan)
+        except (VersionConflict, InsufficientStock):
+            # The service reloaded the changed rows; a new plan will merge into them
+            self.invalidate('antibodies', 'inventory', 'alerts', 'summary')
+            messagebox.showerror("Import Failed",
+                                 "⚠ Some of these antibodies were changed at another station "
+                                 "while importing. Nothing was imported; the latest values have "
+                                 "been loaded, please run the import again.")
+            return
+        except sqlite3.Error as exc:
+            self.show_store_error(exc)
+            return
+    
+        # One refresh for the whole import
+        self.invalidate('antibodies', 'inventory', 'alerts')
+        self.show_import_report(
+            plan, f"Imported {len(plan.inserts)} new and updated {len(plan.updates)} antibodies.")
+    
+    def show_import_report(self, plan, summary):
+        lines = [summary, f"{plan.rows_read} row(s) read."]
+        if plan.errors:
+            lines.append(f"\n{len(plan.errors)} row(s) skipped:")
+            lines.extend(f"• Line {line}: {message}" for line, message in plan.errors[:20])
+            if len(plan.errors) > 20:
+                lines.append(f"… and {len(plan.errors) - 20} more")
+        messagebox.showinfo("Import Report", "\n".join(lines))
+    
+    def run_export(self, job, what):
+        """Start an export job with a progress window and a Cancel button"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Exporting {what}")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+    
+        tk.Label(dialog, text=f"Writing {job.total} records to\n{job.path}",
+                 font=('Arial', 11), justify='left').pack(padx=20, pady=(15, 5), anchor='w')
+        bar = ttk.Progressbar(dialog, length=320, maximum=max(job.total, 1))
+        bar.pack(padx=20, pady=5)
+        tk.Button(dialog, text="Cancel", command=job.cancel,
+                  font=('Arial', 10), padx=15, pady=3).pack(pady=(5, 15))
+        dialog.protocol('WM_DELETE_WINDOW', job.cancel)
+    
+        def poll():
+            bar['value'] = job.written
+            if not job.done:
+                self.root.after(100, poll)
+                return
+            dialog.destroy()
+            if job.error is not None:
+                messagebox.showerror("Export Failed", f"{what} export failed:\n{job.error}")
+            elif job.cancelled:
+                messagebox.showinfo("Export Cancelled", f"{what} export was cancelled.")
+            else:
+                messagebox.showinfo("Success", f"{what} exported to {job.path}")
     
+        job.start()
+        poll()
+    
+    def create_history_tab(self):
+        """Create history tab: filters, pager and one page of pooled cards"""
+        self.history_page = 0
+        self.history_cards = []
+
         # Header row
         header = tk.Frame(self.history_frame, bg='#F9FAFB')
         header.pack(fill='x', padx=10, pady=10)
-    
+
         tk.Label(header, text="Panel Execution History",
                  font=('Arial', 18, 'bold'), bg='#F9FAFB', fg='black').pack(side='left')
-    
-        if self.panel_history:
-            tk.Button(header, text="📥 Export to CSV", command=self.export_history,
-                      bg='white', fg='black', relief='raised',
-                      font=('Arial', 10), padx=12, pady=5).pack(side='right')
-    
-        if not self.panel_history:
-            tk.Label(self.history_frame, text="No panels executed yet",
-                     font=('Arial', 14), bg='#F9FAFB', fg='#999').pack(expand=True)
-            return
-    
-        # SCROLL CANVAS
-        canvas = tk.Canvas(self.history_frame, bg='#F9FAFB', highlightthickness=0)
-        scrollbar = ttk.Scrollbar(self.history_frame, orient='vertical', command=canvas.yview)
+
+        self.history_export_btn = tk.Button(header, text="📥 Export to CSV", command=self.export_history,
+                                            bg='white', fg='black', relief='raised',
+                                            font=('Arial', 10), padx=12, pady=5)
+
+        # Filters: answered from the history index, never by scanning
+        filters = tk.Frame(self.history_frame, bg='#F9FAFB')
+        filters.pack(fill='x', padx=10)
+
+        self.history_since_var = tk.StringVar()
+        self.history_until_var = tk.StringVar()
+        self.history_date_entries = {}
+        for label, var in (("From", self.history_since_var), ("To", self.history_until_var)):
+            tk.Label(filters, text=label, font=('Arial', 10), bg='#F9FAFB',
+                     fg='black').pack(side='left', padx=(0, 4))
+            entry = tk.Entry(filters, textvariable=var, width=11, font=('Arial', 10))
+            entry.pack(side='left', padx=(0, 10))
+            self.history_date_entries[label] = entry
+        tk.Label(filters, text="(YYYY-MM-DD)", font=('Arial', 9), bg='#F9FAFB',
+                 fg='#999').pack(side='left', padx=(0, 10))
+
+        self.history_user_var = tk.StringVar(value=ALL_USERS)
+        self.history_user_box = ttk.Combobox(filters, textvariable=self.history_user_var,
+                                             state='readonly', width=14)
+        self.history_user_box.pack(side='left', padx=(0, 10))
+
+        self.history_order_var = tk.StringVar(value=next(iter(HISTORY_ORDERS)))
+        ttk.Combobox(filters, textvariable=self.history_order_var, values=list(HISTORY_ORDERS),
+                     state='readonly', width=14).pack(side='left')
+
+        for var in (self.history_since_var, self.history_until_var,
+                    self.history_user_var, self.history_order_var):
+            var.trace('w', lambda *args: self.debounce('history', self.filter_history_tab))
+
+        # Pager
+        pager = tk.Frame(self.history_frame, bg='#F9FAFB')
+        pager.pack(fill='x', padx=10, pady=(8, 0))
+        self.history_prev_btn = tk.Button(pager, text="◀ Prev", bg='white', fg='black',
+                                          command=lambda: self.show_history_page(self.history_page - 1))
+        self.history_prev_btn.pack(side='left')
+        self.history_page_label = tk.Label(pager, font=('Arial', 10), bg='#F9FAFB', fg='#666')
+        self.history_page_label.pack(side='left', padx=10)
+        self.history_next_btn = tk.Button(pager, text="Next ▶", bg='white', fg='black',
+                                          command=lambda: self.show_history_page(self.history_page + 1))
+        self.history_next_btn.pack(side='left')
+
+        self.history_empty_label = tk.Label(self.history_frame, font=('Arial', 14),
+                                            bg='#F9FAFB', fg='#999')
+
+        # SCROLL CANVAS (persistent; holds at most one page of cards)
+        self.history_body = tk.Frame(self.history_frame, bg='#F9FAFB')
+        self.history_body.pack(fill='both', expand=True)
+        canvas = tk.Canvas(self.history_body, bg='#F9FAFB', highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.history_body, orient='vertical', command=canvas.yview)
         content = tk.Frame(canvas, bg='#F9FAFB')
-    
+
         content.bind('<Configure>', lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
         win = canvas.create_window((0,0), window=content, anchor="nw")
         canvas.bind("<Configure>", lambda e: canvas.itemconfig(win, width=e.width))
-    
+
         canvas.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
         canvas.configure(yscrollcommand=scrollbar.set)
-    
-        # 🟦 Display in 3-column grid
-        NUM_COLS = 3
-        sorted_history = sorted(self.panel_history, key=lambda x: x['panelName'].lower())
-    
-    # in refresh_history_tab
-        for i, entry in enumerate(sorted_history):
-            r, c = divmod(i, NUM_COLS)
-            self.create_history_card(content, entry).grid(row=r, column=c, padx=10, pady=10, sticky='nsew')
+        for c in range(HISTORY_COLUMNS):
             content.grid_columnconfigure(c, weight=1)
-    
-    def create_history_card(self, parent, entry):
-        frame = tk.Frame(parent, bg='white', width=300, height=180, padx=12, pady=10,
-                         highlightbackground='#D1D5DB', highlightthickness=1)
+        self.history_canvas = canvas
+        self.history_content = content
 
-    
-        ## TITLE ROW
-        top = tk.Frame(frame, bg='white')
-        top.pack(fill='x')
-    
-        tk.Label(top, text=entry['panelName'], font=('Arial', 18, 'bold'),
-                 bg='white', fg='#111').pack(side='left')
-    
-        timestamp = datetime.fromisoformat(entry['timestamp'])
-        tk.Label(top, text=timestamp.strftime("%d %b %Y • %H:%M"),
-                 font=('Arial',9), bg='white', fg='#666').pack(side='left', padx=8)
-    
-        # ↩ Undo + Delete
-        btns = tk.Frame(top, bg='white')
-        btns.pack(side='right')
-    
-        tk.Button(btns, text="↩ Undo", command=lambda e=entry:self.undo_panel(e),
-                  bg='white', fg='black', font=('Arial',9,'bold'), width=6).pack(side='left', padx=3)
-    
-        tk.Button(btns, text="🗑", command=lambda e=entry:self.delete_history_panel(e),
-                  bg='white', fg='black', font=('Arial',9,'bold'), width=4).pack(side='left', padx=3)
-    
-        # --- ANTIBODY GRID (2-col) ---
-        body = tk.Frame(frame, bg='white')
-        body.pack(fill='x', pady=(5,0))
-    
-        for i, ab in enumerate(entry['antibodies']):
-            r,c = divmod(i,2)
-            cell = tk.Frame(body, bg='#F4F6F8', padx=5, pady=2)
-            cell.grid(row=r, column=c, sticky='ew', padx=4, pady=3)
-    
-            tk.Label(cell, text=f"{ab['antigen']} ({ab['metal']})",
-                     font=('Arial',9), bg='#F4F6F8', fg='black').pack(side='left')
-    
-            tk.Label(cell, text=f"{ab['volumeUsed']:.2f} µL",
-                     font=('Arial',9,'bold'), bg='#F4F6F8', fg='#0A74DA').pack(side='right')
-    
-        # Total Volume
-        total = sum(a['volumeUsed'] for a in entry['antibodies'])
-        tk.Label(frame, text=f"Total: {total:.2f} µL", font=('Arial',10,'bold'),
-                 bg='white', fg='#0A74DA').pack(pady=(8,0))
-    
-        return frame
+        self.refresh_history_tab()
+
+    def history_filters(self):
+        """Index query arguments from the filter widgets; bad dates are ignored and shown red"""
+        bounds = {}
+        for label, key, var in (("From", 'since', self.history_since_var),
+                                ("To", 'until', self.history_until_var)):
+            text = var.get().strip()
+            valid = True
+            if text:
+                try:
+                    day = date.fromisoformat(text)
+                except ValueError:
+                    valid = False
+                else:
+                    # 'To' is inclusive of the whole day
+                    bounds[key] = (day + timedelta(days=1) if key == 'until' else day).isoformat()
+            self.history_date_entries[label].configure(fg='black' if valid else 'red')
+
+        user = self.history_user_var.get()
+        return dict(bounds, user=None if user == ALL_USERS else user,
+                    order=HISTORY_ORDERS[self.history_order_var.get()])
+
+    def filter_history_tab(self):
+        self.history_page = 0
+        self.refresh_history_tab()
+
+    def show_history_page(self, page):
+        self.history_page = page
+        self.refresh_history_tab()
+        self.history_canvas.yview_moveto(0)
+
+    def refresh_history_tab(self):
+        """Rebind the pooled cards to the current page; only visible entries are touched"""
+        history = self.panel_history
+        self.history_user_box.configure(values=[ALL_USERS] + history.users())
+        if history:
+            self.history_export_btn.pack(side='right')
+        else:
+            self.history_export_btn.pack_forget()
+
+        filters = self.history_filters()
+        total, entries = history.page(self.history_page * HISTORY_PAGE_SIZE,
+                                      HISTORY_PAGE_SIZE, **filters)
+        pages = max((total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE, 1)
+        if self.history_page >= pages:
+            # The last page emptied (undo/delete) or the filter narrowed
+            self.history_page = pages - 1
+            total, entries = history.page(self.history_page * HISTORY_PAGE_SIZE,
+                                          HISTORY_PAGE_SIZE, **filters)
+
+        if not total:
+            self.history_body.pack_forget()
+            self.history_empty_label.configure(
+                text="No panels executed yet" if not history else "No panels match these filters")
+            self.history_empty_label.pack(expand=True)
+        else:
+            self.history_empty_label.pack_forget()
+            self.history_body.pack(fill='both', expand=True)
+
+        # 🟦 Display in 3-column grid
+        while len(self.history_cards) < len(entries):
+            self.history_cards.append(HistoryCard(self.history_content, self.fonts,
+                                                  self.undo_panel, self.delete_history_panel))
+        for i, (card, entry) in enumerate(zip(self.history_cards, entries)):
+            r, c = divmod(i, HISTORY_COLUMNS)
+            card.bind(entry)
+            card.widget.grid(row=r, column=c, padx=10, pady=10, sticky='nsew')
+        for card in self.history_cards[len(entries):]:
+            card.widget.grid_remove()
+
+        self.history_page_label.configure(
+            text=f"Page {self.history_page + 1} of {pages} • {total} run(s)")
+        self.history_prev_btn.configure(state='normal' if self.history_page > 0 else 'disabled')
+        self.history_next_btn.configure(state='normal' if self.history_page < pages - 1 else 'disabled')
 
-        
     def delete_history_panel(self, entry):
         """Remove a panel from history without changing stock"""
         if messagebox.askyesno("Confirm Delete", f"Delete panel '{entry['panelName']}'?"):
-            self.panel_history = [e for e in self.panel_history if e['id'] != entry['id']]
-            self.refresh_history_tab()
+            try:
+                self.service.delete_history(entry['id'])
+            except PanelError as exc:
+                messagebox.showerror("Delete Failed", f"🚫 {exc}")
+            except sqlite3.Error as exc:
+                self.show_store_error(exc)
+                return
+            self.invalidate('history')
 
     
     def undo_panel(self, panel):
@@ -1067,59 +2008,41 @@ class AntibodyPanelManager:
                                    f"Are you sure you want to undo '{panel['panelName']}'?"):
             return
         
-        # Restore stock volumes
-        for ab_used in panel['antibodies']:
-            for ab in self.inventory:
-                if ab['antigen'] == ab_used['antigen'] and ab['metal'] == ab_used['metal']:
-                    ab['stockVolume'] += ab_used['volumeUsed']
-        
-        # Remove from history
-        self.panel_history = [p for p in self.panel_history if p['id'] != panel['id']]
+        # Restore stock volumes and remove from history
+        try:
+            self.service.undo_execution(panel['id'])
+        except PanelError as exc:
+            # Already undone or deleted at another station; the sync removed it here too
+            messagebox.showerror("Undo Failed", f"🚫 {exc}")
+            self.invalidate('history')
+            return
+        except InsufficientStock as exc:
+            self.sync_from_store()
+            self.show_shortfalls("🚨 Could not return the stock of this panel:", exc.shortfalls)
+            return
+        except sqlite3.Error as exc:
+            self.show_store_error(exc)
+            return
         
         # Refresh tabs
-        self.refresh_history_tab()
-        self.refresh_inventory_tab()
-        self.update_summary()
-        self.update_alerts()
+        self.invalidate('history', 'inventory', 'antibodies', 'summary', 'alerts')
         
         messagebox.showinfo("Undo Successful", f"Panel '{panel['panelName']}' has been undone.")
 
     def export_history(self):
-        """Export history to CSV"""
+        """Export history to CSV or NDJSON in the background"""
         filename = filedialog.asksaveasfilename(
             defaultextension='.csv',
-            filetypes=[('CSV files', '*.csv')],
+            filetypes=EXPORT_FILETYPES,
             initialfile='panel_history.csv'
         )
         
         if filename:
-            with open(filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Timestamp', 'User', 'Panel Name',
-                               'Cell Count (millions)', 'Antibodies Used',
-                               'Total Volume (µL)'])
-                
-                for entry in self.panel_history:
-                    timestamp = datetime.fromisoformat(entry['timestamp'])
-                    ab_list = '; '.join([f"{ab['antigen']}({ab['metal']})" 
-                                        for ab in entry['antibodies']])
-                    total_vol = sum(ab['volumeUsed'] for ab in entry['antibodies'])
-                    
-                    writer.writerow([
-                        timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                        entry['user'],
-                        entry['panelName'],
-                        entry['cellCount'],
-                        ab_list,
-                        f"{total_vol:.2f}"
-                    ])
-            
-            messagebox.showinfo("Success", f"History exported to {filename}")
+            self.run_export(self.service.export_job('history', filename), "History")
     
     def create_add_antibody_tab(self):
         """Create Add Antibody tab with 2-column grid"""
-        frame = tk.Frame(self.notebook, bg='black')
-        self.notebook.add(frame, text='Add Antibody')
+        frame = self.add_antibody_frame
         
         tk.Label(frame, text="Add New Antibody", font=('Arial', 20, 'bold'),
                  bg='black', fg='white').pack(pady=20)
@@ -1202,7 +2125,6 @@ class AntibodyPanelManager:
         
         try:
             new_antibody = {
-                'id': int(datetime.now().timestamp() * 1000),
                 'antigen': antigen,
                 'clone': self.new_ab_vars['clone'].get(),
                 'metal': self.new_ab_vars['metal'].get(),
@@ -1216,7 +2138,7 @@ class AntibodyPanelManager:
                 'stainType': self.stain_type_var.get() 
             }
             
-            self.inventory.append(new_antibody)
+            self.service.add_antibody(new_antibody)
             
             # Clear form
             for var in self.new_ab_vars.values():
@@ -1224,9 +2146,7 @@ class AntibodyPanelManager:
             self.new_ab_vars['alertThreshold'].set('50')
             self.notes_text.delete('1.0', 'end')
             
-            self.refresh_antibody_list()
-            self.refresh_inventory_tab()
-            self.update_alerts()
+            self.invalidate('antibodies', 'inventory', 'alerts')
             
             self.notebook.select(0)  # Switch to Build Panel tab
             messagebox.showinfo("Success", f"Antibody {antigen} added successfully!")
@@ -1234,6 +2154,120 @@ class AntibodyPanelManager:
         except ValueError:
             messagebox.showerror("Invalid Input",
                                "Please enter valid numbers for numeric fields")
+        except sqlite3.Error as exc:
+            self.show_store_error(exc)
+
+    def toggle_diagnostics_tab(self):
+        """Show the hidden Diagnostics tab, or hide it again"""
+        tab = str(self.diagnostics_frame)
+        if self.notebook.tab(tab, 'state') == 'hidden':
+            self.notebook.tab(tab, state='normal')
+            self.notebook.select(tab)
+        else:
+            self.notebook.hide(tab)
+
+    def sample_loop_lag(self, due=None):
+        """Measure how late each scheduled tick runs; a busy Tk thread shows as lag"""
+        now = time.perf_counter()
+        if due is not None:
+            self.diagnostics.record_lag(max(0.0, now - due))
+        self.root.after(LAG_SAMPLE_MS, self.sample_loop_lag, now + LAG_SAMPLE_MS / 1000)
+
+    def poll_diagnostics(self):
+        """Record live widget counts, and redraw the Diagnostics tab if it is showing"""
+        counts = {}
+        for label, attr in DIAGNOSTIC_FRAMES:
+            if hasattr(self, attr):
+                counts[label] = count_widgets(getattr(self, attr))
+        self.diagnostics.record_counter('live widgets', counts)
+        if self.notebook.select() == str(self.diagnostics_frame) and \
+                hasattr(self, 'diagnostics_tree'):
+            self.show_diagnostics()
+        self.root.after(DIAGNOSTICS_POLL_MS, self.poll_diagnostics)
+
+    def create_diagnostics_tab(self):
+        """Create the Diagnostics tab: method timings, loop lag and widget counts"""
+        frame = self.diagnostics_frame
+
+        header = tk.Frame(frame, bg='#F9FAFB')
+        header.pack(fill='x', padx=10, pady=10)
+        tk.Label(header, text="Diagnostics", font=('Arial', 20, 'bold'),
+                 bg='#F9FAFB', fg='black').pack(side='left')
+        tk.Button(header, text="💾 Save Trace", command=self.save_diagnostics_trace,
+                  font=('Arial', 10, 'bold'), padx=15, pady=5,
+                  cursor='hand2').pack(side='right')
+        tk.Button(header, text="Reset", command=self.reset_diagnostics,
+                  font=('Arial', 10, 'bold'), padx=15, pady=5,
+                  cursor='hand2').pack(side='right', padx=(0, 5))
+
+        self.diagnostics_lag_label = tk.Label(frame, font=('Arial', 12), bg='#F9FAFB',
+                                              fg='black', anchor='w')
+        self.diagnostics_lag_label.pack(fill='x', padx=10)
+        self.diagnostics_widgets_label = tk.Label(frame, font=('Arial', 12), bg='#F9FAFB',
+                                                  fg='black', anchor='w', justify='left')
+        self.diagnostics_widgets_label.pack(fill='x', padx=10, pady=(0, 10))
+
+        columns = ('calls', 'total', 'mean', 'max', 'last')
+        table = tk.Frame(frame)
+        table.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        self.diagnostics_tree = ttk.Treeview(table, columns=columns, height=20)
+        self.diagnostics_tree.heading('#0', text='Method')
+        self.diagnostics_tree.column('#0', width=260)
+        for col, heading in zip(columns, ('Calls', 'Total (ms)', 'Mean (ms)', 'Max (ms)',
+                                          'Last (ms)')):
+            self.diagnostics_tree.heading(col, text=heading)
+            self.diagnostics_tree.column(col, width=110, anchor='e')
+        scrollbar = ttk.Scrollbar(table, orient='vertical', command=self.diagnostics_tree.yview)
+        self.diagnostics_tree.configure(yscrollcommand=scrollbar.set)
+        self.diagnostics_tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        self.show_diagnostics()
+
+    def show_diagnostics(self):
+        lag = self.diagnostics.lag()
+        if lag is None:
+            self.diagnostics_lag_label.config(text="Event-loop lag: no samples yet")
+        else:
+            last, mean, worst, samples = lag
+            self.diagnostics_lag_label.config(
+                text=f"Event-loop lag: {last * 1000:.1f} ms now, {mean * 1000:.1f} ms mean, "
+                     f"{worst * 1000:.1f} ms worst (last {samples} samples)")
+        counts = self.diagnostics.counters.get('live widgets', {})
+        self.diagnostics_widgets_label.config(
+            text="Live widgets: " + ("   ".join(f"{label} {n}" for label, n in counts.items())
+                                     or "none counted yet"))
+
+        self.diagnostics_tree.delete(*self.diagnostics_tree.get_children())
+        for name, calls, total, mean, worst, last in self.diagnostics.rows():
+            self.diagnostics_tree.insert('', 'end', text=name, values=(
+                calls, f"{total * 1000:.1f}", f"{mean * 1000:.2f}", f"{worst * 1000:.2f}",
+                f"{last * 1000:.2f}"))
+
+    def reset_diagnostics(self):
+        self.diagnostics.reset()
+        self.show_diagnostics()
+
+    def save_diagnostics_trace(self):
+        """Write the recorded spans, counters and lag as a Chrome trace JSON file"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension='.json',
+            filetypes=[('Chrome trace (JSON)', '*.json')],
+            initialfile='panel_trace.json'
+        )
+        if not filename:
+            return
+        try:
+            self.diagnostics.dump(filename)
+        except OSError as exc:
+            messagebox.showerror("Save Failed", f"Could not write the trace:\n{exc}")
+            return
+        messagebox.showinfo("Trace Saved", f"Trace written to {filename}")
+
+
+def count_widgets(widget):
+    """Number of widgets below ``widget``"""
+    return sum(1 + count_widgets(child) for child in widget.winfo_children())
 
 
 def main():
@@ -0,0 +1,53 @@
+"""Data layer for the Antibody Panel Manager
+
+Names are imported from their submodules on first access, so importing the
+package (for the CLI, say) does not pull in NumPy until something needs it.
+"""
+
+_EXPORTS = {
+    'AlertEngine': 'alerts',
+    'ConsumptionForecast': 'forecast',
+    'Diagnostics': 'diagnostics',
+    'DuplicateName': 'core',
+    'HistoryIndex': 'history',
+    'InsufficientStock': 'store',
+    'InvalidValue': 'core',
+    'InventoryModel': 'model',
+    'Journal': 'journal',
+    'LotIndex': 'lots',
+    'MissingInput': 'core',
+    'PanelDesign': 'designer',
+    'PanelError': 'core',
+    'PanelSelection': 'model',
+    'PanelServer': 'server',
+    'PanelService': 'core',
+    'PanelStore': 'store',
+    'PreparedBatch': 'core',
+    'SavedPanelIndex': 'panels',
+    'SearchIndex': 'search',
+    'SpilloverChecker': 'spillover',
+    'UnknownPanel': 'core',
+    'VersionConflict': 'store',
+    'VolumeEngine': 'engine',
+    'calculate_volume': 'volumes',
+    'default_db_path': 'store',
+    'design_panel': 'designer',
+    'metal_mass': 'search',
+    'parse_samples': 'core',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,7 @@
+"""``python -m antibody_panel``: see antibody_panel.cli"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,85 @@
+"""Incremental low-stock alerts.
+
+The engine listens to the InventoryModel, so every stock change (execution,
+undo, inline edit, import) updates the low-stock set as it happens. Views
+then ask ``is_low``/``count``/``most_severe`` instead of rescanning the
+inventory.
+"""
+
+import heapq
+
+
+def severity(antibody):
+    """Fraction of the alert threshold still in stock; lower is more urgent"""
+    threshold = antibody['alertThreshold']
+    if threshold <= 0:
+        return 0.0 if antibody['stockVolume'] <= threshold else float('inf')
+    return antibody['stockVolume'] / threshold
+
+
+def is_low_stock(antibody):
+    return antibody['stockVolume'] <= antibody['alertThreshold']
+
+
+class AlertEngine:
+    """Low-stock set plus a heap ordered by severity.
+
+    Heap entries are never removed in place; an entry is live only while
+    its severity matches the current one recorded in ``_low``.
+    """
+
+    def __init__(self, model):
+        self._low = {}          # antibody id -> severity
+        self._heap = []         # [(severity, id)], may hold stale entries
+        for ab in model:
+            self._evaluate(ab)
+        model.subscribe(self._on_inventory_change)
+
+    def _evaluate(self, antibody):
+        ab_id = antibody['id']
+        if is_low_stock(antibody):
+            value = severity(antibody)
+            if self._low.get(ab_id) != value:
+                self._low[ab_id] = value
+                heapq.heappush(self._heap, (value, ab_id))
+        else:
+            self._low.pop(ab_id, None)
+
+        # Rebuild once stale entries dominate the heap
+        if len(self._heap) > 64 and len(self._heap) > 4 * len(self._low):
+            self._heap = [(value, i) for i, value in self._low.items()]
+            heapq.heapify(self._heap)
+
+    def _on_inventory_change(self, event, antibody, changes):
+        if event == 'add':
+            self._evaluate(antibody)
+        elif event == 'add_many':
+            for ab in antibody:
+                self._evaluate(ab)
+        elif event == 'remove':
+            self._low.pop(antibody['id'], None)
+        elif 'stockVolume' in changes or 'alertThreshold' in changes:
+            self._evaluate(antibody)
+
+    # ---------------- Queries ----------------
+
+    def count(self):
+        return len(self._low)
+
+    def is_low(self, ab_id):
+        return ab_id in self._low
+
+    def low_ids(self):
+        return set(self._low)
+
+    def most_severe(self, k):
+        """Up to ``k`` (antibody id, severity) pairs, most depleted first"""
+        found, seen = [], set()
+        while self._heap and len(found) < k:
+            value, ab_id = heapq.heappop(self._heap)
+            if self._low.get(ab_id) == value and ab_id not in seen:
+                seen.add(ab_id)
+                found.append((ab_id, value))
+        for ab_id, value in found:
+            heapq.heappush(self._heap, (value, ab_id))
+        return found
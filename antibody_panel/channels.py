@@ -0,0 +1,42 @@
+"""Mass-channel rules: detector sensitivity tiers and spillover between channels.
+
+Masses are the integer mass numbers parsed from metal labels by
+``metal_mass`` ('146Nd' -> 146). Spillover follows the usual mass-cytometry
+sources: isotopic impurity into the neighbouring masses (M-1, M+1) and metal
+oxide formation into M+16.
+"""
+
+# Detector sensitivity by mass window, best first; masses outside every
+# window (Y, In, Pt, Bi, unlabelled) fall in the lowest tier.
+SENSITIVITY_TIERS = (
+    ('high', 153, 176),
+    ('medium', 139, 152),
+)
+LOW_TIER = 'low'
+TIER_SCORES = {'high': 1.0, 'medium': 0.75, 'low': 0.4}
+
+# (target offset from source mass, fraction of source signal, reason)
+SPILLOVER_RULES = (
+    (1, 0.02, 'M+1 impurity'),
+    (-1, 0.01, 'M-1 impurity'),
+    (16, 0.03, 'M+16 oxide'),
+)
+
+
+def sensitivity_tier(mass):
+    for tier, low, high in SENSITIVITY_TIERS:
+        if low <= mass <= high:
+            return tier
+    return LOW_TIER
+
+
+def spillover(source, target):
+    """(fraction, reason) of ``source`` signal read in ``target``; (0.0, '') if none"""
+    if not source or not target:
+        return 0.0, ''
+    if source == target:
+        return 1.0, 'same mass'
+    for offset, fraction, reason in SPILLOVER_RULES:
+        if target - source == offset:
+            return fraction, reason
+    return 0.0, ''
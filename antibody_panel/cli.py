@@ -0,0 +1,260 @@
+"""Command-line access to the panel database, for scripts and cron jobs.
+
+    python -m antibody_panel inventory list [--low] [--format table|csv|ndjson]
+    python -m antibody_panel inventory expiring [--days 30]
+    python -m antibody_panel panel list
+    python -m antibody_panel panel execute --cells 8 NAME [--as RUN] [--dry-run]
+    python -m antibody_panel panel batch NAME SAMPLES [--dry-run]
+    python -m antibody_panel history export PATH [--since DAY] [--until DAY] [--for-user NAME]
+    python -m antibody_panel serve [--host 127.0.0.1] [--port 8765]
+
+Uses the same database (ANTIBODY_PANEL_DB, or ``--db``) and journal as the
+GUI and goes through the same PanelService, so an execution from cron is
+checked, journalled and seen by open GUI sessions like any other. Neither
+tkinter nor NumPy is imported unless a command needs it.
+"""
+
+import argparse
+import csv
+import getpass
+import json
+import sys
+from datetime import date, timedelta
+
+from .core import PanelError, PanelService, parse_samples
+from .export import INVENTORY_HEADER, inventory_row
+from .store import InsufficientStock, PanelStore, VersionConflict
+
+
+def _day(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {text!r}")
+
+
+def _cells(text):
+    try:
+        cells = float(text)
+    except ValueError:
+        cells = 0.0
+    if not cells > 0:
+        raise argparse.ArgumentTypeError(f"expected a positive cell count, got {text!r}")
+    return cells
+
+
+def _antibody_label(ab):
+    return f"{ab['antigen']} ({ab['metal']})"
+
+
+# ---------------- Commands ----------------
+
+def inventory_list(service, args, out):
+    antibodies = list(service.inventory)
+    if args.low:
+        low = service.alerts.low_ids()
+        antibodies = [ab for ab in antibodies if ab['id'] in low]
+    antibodies.sort(key=lambda ab: (ab['antigen'].lower(), ab['metal']))
+
+    if args.format == 'ndjson':
+        for ab in antibodies:
+            out.write(json.dumps(ab, ensure_ascii=False) + '\n')
+    elif args.format == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(INVENTORY_HEADER)
+        writer.writerows(inventory_row(ab) for ab in antibodies)
+    else:
+        from .forecast import runs_out_text
+        rows = [('Antigen', 'Metal', 'Clone', 'Stock (µL)', 'Alert (µL)', 'Runs Out', '')]
+        for ab in antibodies:
+            rows.append((ab['antigen'], ab['metal'], ab['clone'], f"{ab['stockVolume']:.1f}",
+                         f"{ab['alertThreshold']:g}",
+                         runs_out_text(service.forecast.days_left(ab['id'])),
+                         '⚠ low' if service.alerts.is_low(ab['id']) else ''))
+        widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+        for row in rows:
+            out.write('  '.join(str(v).ljust(w) for v, w in zip(row, widths)).rstrip() + '\n')
+    return 0
+
+
+def inventory_expiring(service, args, out):
+    lots = service.lots.expiring_within(args.days)
+    if not lots:
+        out.write(f"No lots expire in the next {args.days} days.\n")
+        return 0
+    rows = [('Expiry', 'Antigen', 'Metal', 'Lot', 'Volume (µL)')]
+    for lot in lots:
+        ab = service.inventory.get(lot['antibodyId'])
+        rows.append((lot['expiry'], ab['antigen'], ab['metal'], lot['lotNumber'] or f"#{lot['id']}",
+                     f"{lot['volume']:.1f}"))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        out.write('  '.join(v.ljust(w) for v, w in zip(row, widths)).rstrip() + '\n')
+    return 0
+
+
+def panel_list(service, args, out):
+    for panel in service.saved_panels:
+        count, summary = service.saved_panels.labels(panel)
+        out.write(f"{panel['name']}  [{count} antibodies]  {summary}\n")
+    return 0
+
+
+def panel_execute(service, args, out):
+    panel = service.find_saved_panel(args.name)
+    run_name = args.run_name or panel['name']
+    if args.dry_run:
+        entry = service.prepare_execution(run_name, panel['antibodyIds'], args.cells)
+    else:
+        entry = service.execute_panel(run_name, panel['antibodyIds'], args.cells)
+
+    verb = "Would execute" if args.dry_run else "Executed"
+    out.write(f"{verb} '{entry['panelName']}' at {args.cells:g}M cells:\n")
+    for used in entry['antibodies']:
+        ab = service.inventory.get(used['id'])
+        out.write(f"  {_antibody_label(used):<24} {used['volumeUsed']:8.2f} µL"
+                  f"   {ab['stockVolume']:.1f} µL in stock\n")
+    total = sum(used['volumeUsed'] for used in entry['antibodies'])
+    out.write(f"  {'Total':<24} {total:8.2f} µL\n")
+    return 0
+
+
+def panel_batch(service, args, out):
+    panel = service.find_saved_panel(args.name)
+    with open(args.samples, encoding='utf-8-sig') as f:
+        samples = parse_samples(f)
+    batch = service.prepare_batch(panel['antibodyIds'], samples)
+    if not args.dry_run:
+        service.record_batch(batch)
+
+    verb = "Would execute" if args.dry_run else "Executed"
+    out.write(f"{verb} '{panel['name']}' on {len(batch.entries)} samples:\n")
+    for ab_id, change in batch.stock_changes:
+        ab = service.inventory.get(ab_id)
+        out.write(f"  {_antibody_label(ab):<24} {-change:8.2f} µL"
+                  f"   {ab['stockVolume']:.1f} µL in stock\n")
+    total = -sum(change for _, change in batch.stock_changes)
+    out.write(f"  {'Total':<24} {total:8.2f} µL\n")
+    return 0
+
+
+def history_export(service, args, out):
+    until = args.until + timedelta(days=1) if args.until else None     # inclusive day
+    _, entries = service.panel_history.page(
+        since=args.since.isoformat() if args.since else None,
+        until=until.isoformat() if until else None,
+        user=args.user_filter, order='newest')
+    job = service.export_job('history', args.path, records=entries, fmt=args.format).start()
+    job.join()
+    if job.error is not None:
+        raise job.error
+    out.write(f"Exported {job.total} history entries to {job.path}\n")
+    return 0
+
+
+def serve(args, out):
+    import asyncio
+    from .server import PanelServer
+
+    def started(server):
+        out.write(f"Serving the panel API on http://{server.host}:{server.port}/\n")
+        out.flush()
+
+    server = PanelServer(args.db, host=args.host, port=args.port, user=args.user)
+    try:
+        asyncio.run(server.serve_forever(started))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+# ---------------- Entry point ----------------
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='antibody_panel',
+                                     description="Antibody Panel Manager from the command line")
+    parser.add_argument('--db', help="database file (default: ANTIBODY_PANEL_DB or "
+                                     "~/.antibody_panel/panels.db)")
+    parser.add_argument('--user', default=getpass.getuser(),
+                        help="name recorded in history and the journal (default: login name)")
+    groups = parser.add_subparsers(dest='group', required=True,
+                                   metavar='{inventory,panel,history,serve}')
+
+    inventory = groups.add_parser('inventory', help="list the antibody inventory or expiring lots")
+    inventory_cmds = inventory.add_subparsers(dest='command', required=True)
+    listing = inventory_cmds.add_parser('list', help="print every antibody")
+    listing.add_argument('--low', action='store_true', help="only antibodies at/below threshold")
+    listing.add_argument('--format', choices=('table', 'csv', 'ndjson'), default='table')
+    listing.set_defaults(run=inventory_list)
+    expiring = inventory_cmds.add_parser('expiring', help="lots expired or expiring soon")
+    expiring.add_argument('--days', type=int, default=30,
+                          help="look this many days ahead (default: %(default)s)")
+    expiring.set_defaults(run=inventory_expiring)
+
+    panel = groups.add_parser('panel', help="list or execute saved panels")
+    panel_cmds = panel.add_subparsers(dest='command', required=True)
+    panel_cmds.add_parser('list', help="print the saved panel library").set_defaults(
+        run=panel_list)
+    execute = panel_cmds.add_parser('execute', help="execute a saved panel, drawing stock")
+    execute.add_argument('name', metavar='NAME', help="saved panel name (case-insensitive)")
+    execute.add_argument('--cells', type=_cells, default=4.0,
+                         help="cell count in millions (default: 4)")
+    execute.add_argument('--as', dest='run_name', metavar='RUN',
+                         help="name recorded in history (default: the panel name)")
+    execute.add_argument('--dry-run', action='store_true',
+                         help="check stock and print volumes without executing")
+    execute.set_defaults(run=panel_execute)
+    batch = panel_cmds.add_parser('batch', help="execute a saved panel on many samples at once")
+    batch.add_argument('name', metavar='NAME', help="saved panel name (case-insensitive)")
+    batch.add_argument('samples', metavar='SAMPLES',
+                       help="CSV of sample name, cell count in millions; one history entry each")
+    batch.add_argument('--dry-run', action='store_true',
+                       help="check stock and print total volumes without executing")
+    batch.set_defaults(run=panel_batch)
+
+    history = groups.add_parser('history', help="export execution history")
+    history_cmds = history.add_subparsers(dest='command', required=True)
+    export = history_cmds.add_parser('export', help="write history to CSV or NDJSON")
+    export.add_argument('path', metavar='PATH', help="output file; .ndjson/.jsonl for JSON lines")
+    export.add_argument('--format', choices=('csv', 'ndjson'),
+                        help="override the format implied by PATH")
+    export.add_argument('--since', type=_day, metavar='DAY', help="first day to include")
+    export.add_argument('--until', type=_day, metavar='DAY', help="last day to include")
+    export.add_argument('--for-user', dest='user_filter', metavar='NAME',
+                        help="only panels executed by this user")
+    export.set_defaults(run=history_export)
+
+    api = groups.add_parser('serve', help="run the JSON API for LIMS and instrument PCs")
+    api.add_argument('--host', default='127.0.0.1',
+                     help="interface to listen on (default: %(default)s)")
+    api.add_argument('--port', type=int, default=8765,
+                     help="port to listen on (default: %(default)s)")
+    api.set_defaults(serve=serve)
+    return parser
+
+
+def main(argv=None, out=None, err=None):
+    out = out or sys.stdout
+    err = err or sys.stderr
+    args = build_parser().parse_args(argv)
+    if hasattr(args, 'serve'):
+        # The server opens its own service on its worker thread
+        return args.serve(args, out)
+
+    service = PanelService(PanelStore(args.db), user=args.user)
+    service.on_journal_error = lambda action, exc: err.write(
+        f"warning: '{action}' was saved but could not be journalled: {exc}\n")
+    try:
+        return args.run(service, args, out)
+    except InsufficientStock as exc:
+        err.write("Not enough antibody for panel execution:\n")
+        for ab_id, available, required in exc.shortfalls:
+            ab = service.inventory.get(ab_id)
+            err.write(f"  {_antibody_label(ab)} needs {required:.2f} µL, "
+                      f"only {available:.2f} µL available\n")
+        return 1
+    except (PanelError, VersionConflict, OSError) as exc:
+        err.write(f"error: {exc}\n")
+        return 1
+    finally:
+        service.close()
@@ -0,0 +1,758 @@
+"""Panel operations without a GUI: the rules the Tk app and the CLI share.
+
+PanelService owns the store, the inventory model and the indexes built on
+it. Every mutation is written to the store first, then journalled, then
+applied to the in-memory model, so model listeners only ever see committed
+changes. Once the store has committed, a journal write that fails (disk
+full, say) is passed to ``on_journal_error`` instead of being raised, so
+the model still follows the store. Validation failures raise PanelError subclasses (or the store's
+InsufficientStock / VersionConflict) with messages meant for the user;
+callers decide whether that is a message box or a line on stderr.
+
+Nothing here imports NumPy at module load. The volume engine, the
+consumption forecast, the journal, the lot index and the saved panel /
+history indexes are built on first use, so a script that lists the
+inventory opens only the database.
+
+Stock lives in lots. Executions draw from them oldest-expiring first and
+record the lots drawn in the history entry, so an undo puts the volume
+back into the same vials. Expired lots still count towards
+``stockVolume`` until discarded, but no execution draws on them.
+
+A batch runs one panel on many samples (a plate) as a single execution:
+volumes are summed per antibody, checked and drawn once, and one history
+entry per sample is recorded, linked by a shared ``batchId``.
+"""
+
+import sys
+from collections import namedtuple
+from datetime import date, datetime
+
+from .alerts import AlertEngine
+from .export import ExportJob
+from .lots import EPSILON, days_from
+from .model import InventoryModel
+from .store import (ANTIBODY, DEFAULT_SHELF_LIFE_DAYS, HISTORY, SAVED_PANEL, InsufficientStock,
+                    PanelStore, VersionConflict)
+
+
+class PanelError(Exception):
+    """A request the core refuses; the message is meant for the user"""
+
+
+class MissingInput(PanelError):
+    """A required name or selection was not given"""
+
+
+class DuplicateName(PanelError):
+    """The name is already used by a saved or executed panel"""
+
+
+class UnknownPanel(PanelError, LookupError):
+    """No saved panel, history entry, antibody or lot matches"""
+
+
+class InvalidValue(PanelError, ValueError):
+    """A volume or date the inventory cannot hold"""
+
+
+PreparedBatch = namedtuple('PreparedBatch', 'entries stock_changes lot_changes')
+PreparedBatch.__doc__ = """A validated batch: its history entries and the combined draws"""
+
+
+def parse_samples(lines):
+    """[(sample name, cell count)] from "name, cells" lines.
+
+    Columns may be separated by commas or tabs (as pasted from a
+    spreadsheet). Blank lines are skipped, and so is a header line before
+    the first sample.
+    """
+    samples = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split('\t' if '\t' in line else ',')]
+        if len(parts) < 2:
+            raise InvalidValue(f"Line {number}: expected 'sample name, cell count'.")
+        try:
+            cells = float(parts[1])
+        except ValueError:
+            if not samples:
+                continue        # header
+            raise InvalidValue(f"Line {number}: '{parts[1]}' is not a cell count.")
+        samples.append((parts[0], cells))
+    return samples
+
+
+def _split_draws(draws, volumes):
+    """Share one antibody's lot draws out to samples in order; a list of lot lists"""
+    draws = [[lot_id, volume] for lot_id, volume in draws]
+    shares, i = [], 0
+    for volume in volumes:
+        share = []
+        while volume > EPSILON and i < len(draws):
+            take = min(draws[i][1], volume)
+            share.append({'id': draws[i][0], 'volume': take})
+            volume -= take
+            draws[i][1] -= take
+            if draws[i][1] <= EPSILON:
+                i += 1
+        shares.append(share)
+    return shares
+
+
+def _report_journal_error(action, exc):
+    sys.stderr.write(f"warning: '{action}' was saved but could not be journalled: {exc}\n")
+
+
+def _deleted_elsewhere(ab):
+    return f"{ab['antigen']} ({ab['metal']}) was deleted at another station."
+
+
+def _iso_date(text, what):
+    try:
+        return date.fromisoformat(text.strip()).isoformat()
+    except ValueError:
+        raise InvalidValue(f"{what} must be a date like 2025-06-30, not '{text}'.")
+
+
+class PanelService:
+    """Inventory, saved panels and history over one PanelStore"""
+
+    def __init__(self, store=None, user=''):
+        self.store = store if store is not None else PanelStore()
+        self.user = user
+        # Called as on_journal_error(action, exc) when an append fails
+        self.on_journal_error = _report_journal_error
+        self.inventory = InventoryModel(self.store.load_inventory())
+        self.alerts = AlertEngine(self.inventory)
+        self.inventory.subscribe(self._on_inventory_change)
+
+        # Built on first access
+        self._journal = None
+        self._engine = None
+        self._forecast = None
+        self._saved_panels = None
+        self._panel_history = None
+        self._lots = None
+
+    def close(self):
+        self.store.close()
+        if self._journal is not None:
+            self._journal.close()
+
+    # ---------------- Lazily built parts ----------------
+
+    @property
+    def journal(self):
+        if self._journal is None:
+            from .journal import Journal, default_journal_dir
+            self._journal = Journal(default_journal_dir(self.store.path))
+        return self._journal
+
+    def _journal_action(self, user, action, changes=(), ref=None):
+        """Journal a change the store has already committed; a failure is reported, not raised"""
+        try:
+            self.journal.append(user, action, changes, ref=ref)
+        except OSError as exc:
+            self.on_journal_error(action, exc)
+
+    @property
+    def engine(self):
+        """VolumeEngine over the inventory; the first access imports NumPy"""
+        if self._engine is None:
+            from .engine import VolumeEngine
+            self._engine = VolumeEngine(self.inventory)
+        return self._engine
+
+    @property
+    def forecast(self):
+        if self._forecast is None:
+            from .forecast import ConsumptionForecast
+            self._forecast = ConsumptionForecast(self.inventory, self.store.load_daily_usage())
+        return self._forecast
+
+    @property
+    def saved_panels(self):
+        """SavedPanelIndex over the saved panel library, A-Z when iterated"""
+        if self._saved_panels is None:
+            from .panels import SavedPanelIndex
+            self._saved_panels = SavedPanelIndex(self.inventory, self.store.load_saved_panels())
+        return self._saved_panels
+
+    @property
+    def panel_history(self):
+        """HistoryIndex over every executed panel, newest first when iterated"""
+        if self._panel_history is None:
+            from .history import HistoryIndex
+            self._panel_history = HistoryIndex(self.store.load_history())
+        return self._panel_history
+
+    @property
+    def lots(self):
+        """LotIndex over every antibody's vials"""
+        if self._lots is None:
+            from .lots import LotIndex
+            self._lots = LotIndex(self.store.load_lots())
+        return self._lots
+
+    def _reload_lots(self, antibody_ids):
+        # An unbuilt lot index reads every lot from the store when built
+        if self._lots is not None and antibody_ids:
+            by_antibody = {ab_id: [] for ab_id in antibody_ids}
+            for lot in self.store.load_lots(by_antibody):
+                by_antibody[lot['antibodyId']].append(lot)
+            for ab_id, lots in by_antibody.items():
+                self._lots.replace_antibody(ab_id, lots)
+
+    def _on_inventory_change(self, event, antibody, changes):
+        # Saved panel summaries name each antibody as "antigen - metal"
+        if self._saved_panels is not None and (
+                event != 'update' or 'antigen' in changes or 'metal' in changes):
+            for ab in (antibody if event == 'add_many' else [antibody]):
+                self._saved_panels.invalidate_antibody(ab['id'])
+
+    # ---------------- Stock ----------------
+
+    def _apply_stock(self, stock):
+        """Apply the {antibody id: (stock, version)} the store wrote; returns the journal changes.
+
+        The store's values are authoritative: other stations may have drawn
+        on the same antibodies since this one last synced.
+        """
+        changes = []
+        for ab_id, (volume, version) in stock.items():
+            ab = self.inventory.get(ab_id)
+            if ab is None:
+                continue
+            old = ab['stockVolume']
+            self.inventory.update(ab_id, stockVolume=volume, version=version)
+            changes.append((ab, 'stockVolume', old, volume))
+        return changes
+
+    def _history_matches(self, ab_used):
+        if 'id' not in ab_used:
+            # Entries recorded before ids were stored in history
+            return self.inventory.find(ab_used['antigen'], ab_used['metal'])
+        # A deleted antibody is skipped, even if a new one has the same label
+        ab = self.inventory.get(ab_used['id'])
+        return [ab] if ab is not None else []
+
+    def history_stock_changes(self, entry):
+        """(antibody id, volume used) for each antibody a history entry drew on"""
+        return [(ab['id'], ab_used['volumeUsed'])
+                for ab_used in entry['antibodies'] for ab in self._history_matches(ab_used)]
+
+    def history_lot_changes(self, entry):
+        """(lot id, volume) returning a history entry's draws to the lots they came from.
+
+        Volume drawn before lots were recorded, or from a lot that is gone,
+        goes to the antibody's last-expiring lot.
+        """
+        lot_changes = []
+        for ab_used in entry['antibodies']:
+            for ab in self._history_matches(ab_used):
+                returned = 0.0
+                for drawn in ab_used.get('lots', ()):
+                    lot = self.lots.get(drawn['id'])
+                    if lot is not None and lot['antibodyId'] == ab['id']:
+                        lot_changes.append((lot['id'], drawn['volume']))
+                        returned += drawn['volume']
+                rest = ab_used['volumeUsed'] - returned
+                if rest > EPSILON:
+                    lot_changes.extend(self._stock_lot_changes(ab['id'], rest))
+        return lot_changes
+
+    def _stock_lot_changes(self, ab_id, delta):
+        """(lot id, delta) changes moving an antibody's stock by ``delta``.
+
+        A decrease is a write-down, so it takes expired lots too (first, as
+        they expire first). InsufficientStock is raised when the lots hold
+        less than the decrease, i.e. they no longer add up to the stock
+        this station has loaded.
+        """
+        if delta < 0:
+            draws, uncovered = self.lots.allocate(ab_id, -delta, include_expired=True)
+            if uncovered > EPSILON:
+                raise InsufficientStock([(ab_id, -delta - uncovered, -delta)])
+            return [(lot_id, -volume) for lot_id, volume in draws]
+        lot_id = self.lots.deposit_lot(ab_id)
+        return [(lot_id, delta)] if delta > 0 and lot_id is not None else []
+
+    def _set_lot_volumes(self, volumes):
+        if self._lots is not None:
+            self._lots.set_volumes(volumes)
+
+    def _record_usage(self, when, stock_changes):
+        # An unbuilt forecast reads this usage back from the store when built
+        if self._forecast is not None:
+            self._forecast.record(when, stock_changes)
+
+    # ---------------- Executing panels ----------------
+
+    def prepare_execution(self, name, antibody_ids, cell_count, user=None):
+        """Validate a panel run and return its history entry, not yet recorded.
+
+        ``user`` names who ran it, defaulting to the service's user. The
+        entry's ``id`` stays None until the store records it. Raises
+        MissingInput, InvalidValue, DuplicateName (history names are unique)
+        or InsufficientStock listing every antibody the current stock, or its
+        unexpired lots, cannot cover.
+        """
+        name = name.strip()
+        antibody_ids = [i for i in dict.fromkeys(antibody_ids) if i in self.inventory]
+        if not antibody_ids:
+            raise MissingInput("Please select at least one antibody.")
+        if not name:
+            raise MissingInput("You must enter a panel name before executing.")
+        if cell_count <= 0:
+            raise InvalidValue("The cell count must be above 0.")
+        if self.panel_history.has_name(name):
+            raise DuplicateName(f"A panel named '{name}' has already been executed.\n"
+                                "Please choose a different name before executing.")
+
+        check = self.engine.check(antibody_ids, cell_count)
+        volumes = check.required.tolist()
+        if not check.ok:
+            raise InsufficientStock([
+                (ab_id, available, required)
+                for ab_id, required, available, short in zip(
+                    antibody_ids, volumes, check.available.tolist(), check.shortfall.tolist())
+                if short > 0])
+
+        # Each antibody's volume comes from its unexpired lots, oldest-expiring first
+        draws, shortfalls = [], []
+        for ab_id, volume in zip(antibody_ids, volumes):
+            lot_draws, uncovered = self.lots.allocate(ab_id, volume)
+            draws.append(lot_draws)
+            if uncovered > EPSILON:
+                shortfalls.append((ab_id, self.lots.available(ab_id), volume))
+        if shortfalls:
+            raise InsufficientStock(shortfalls)
+
+        return {
+            'id': None,
+            'timestamp': datetime.now().isoformat(),
+            'user': user or self.user,
+            'panelName': name,
+            'cellCount': cell_count,
+            'batchId': None,
+            'antibodies': [{
+                'id': ab['id'],
+                'antigen': ab['antigen'],
+                'metal': ab['metal'],
+                'volumeUsed': volume,
+                'lots': [{'id': lot_id, 'volume': drawn} for lot_id, drawn in lot_draws]
+            } for ab, volume, lot_draws in zip(self.inventory.resolve(antibody_ids), volumes,
+                                               draws)]
+        }
+
+    def record_execution(self, entry):
+        """Draw the entry's volumes from stock and add it to history.
+
+        The store re-checks stock in the same transaction and raises
+        InsufficientStock, writing nothing, if another station got there
+        first.
+        """
+        stock_changes = [(used['id'], -used['volumeUsed']) for used in entry['antibodies']]
+        lot_changes = [(drawn['id'], -drawn['volume'])
+                       for used in entry['antibodies'] for drawn in used.get('lots', ())]
+        stock, lots = self.store.record_execution(entry, stock_changes, lot_changes)
+        self._record_usage(entry['timestamp'], stock_changes)
+        self._set_lot_volumes(lots)
+        self._journal_action(entry['user'], 'stock.execute', self._apply_stock(stock),
+                             ref=entry['id'])
+        if self._panel_history is not None:
+            self._panel_history.add(entry)
+        return entry
+
+    def execute_panel(self, name, antibody_ids, cell_count, user=None):
+        """Validate and record a panel run in one step; returns the history entry"""
+        return self.record_execution(
+            self.prepare_execution(name, antibody_ids, cell_count, user))
+
+    def prepare_batch(self, antibody_ids, samples, user=None):
+        """Validate one panel run on many samples; returns a PreparedBatch, not yet recorded.
+
+        ``samples`` is [(name, cell count)]. Each name becomes a history
+        entry, so names must be unique. ``user`` names who ran the batch,
+        defaulting to the service's user. Volumes are summed per antibody in
+        one pass and checked together: InsufficientStock lists the totals
+        stock cannot cover, and then no sample runs.
+        """
+        antibody_ids = [i for i in dict.fromkeys(antibody_ids) if i in self.inventory]
+        if not antibody_ids:
+            raise MissingInput("Please select at least one antibody.")
+        if not samples:
+            raise MissingInput("Please enter at least one sample.")
+        names = set()
+        for name, cell_count in samples:
+            name = name.strip()
+            if not name:
+                raise MissingInput("Every sample needs a name.")
+            if name.lower() in names:
+                raise DuplicateName(f"Sample '{name}' appears more than once in the batch.")
+            if self.panel_history.has_name(name):
+                raise DuplicateName(f"A panel named '{name}' has already been executed.\n"
+                                    "Please rename the sample before executing.")
+            if cell_count <= 0:
+                raise InvalidValue(f"Sample '{name}' needs a cell count above 0.")
+            names.add(name.lower())
+
+        check = self.engine.check_batch(antibody_ids, [cells for _, cells in samples])
+        totals = check.total.tolist()
+        if not check.ok:
+            raise InsufficientStock([
+                (ab_id, available, required)
+                for ab_id, required, available, short in zip(
+                    antibody_ids, totals, check.available.tolist(), check.shortfall.tolist())
+                if short > 0])
+
+        # One lot draw per antibody for the whole batch, shared out to the samples
+        # in order so each entry records, and an undo returns, its own lots
+        required = check.required.T.tolist()        # antibody -> per-sample volumes
+        lot_changes, shares, shortfalls = [], [], []
+        for ab_id, total, volumes in zip(antibody_ids, totals, required):
+            draws, uncovered = self.lots.allocate(ab_id, total)
+            if uncovered > EPSILON:
+                shortfalls.append((ab_id, self.lots.available(ab_id), total))
+            lot_changes.extend((lot_id, -volume) for lot_id, volume in draws)
+            shares.append(_split_draws(draws, volumes))
+        if shortfalls:
+            raise InsufficientStock(shortfalls)
+
+        timestamp = datetime.now().isoformat()
+        antibodies = self.inventory.resolve(antibody_ids)
+        entries = [{
+            'id': None,
+            'timestamp': timestamp,
+            'user': user or self.user,
+            'panelName': name.strip(),
+            'cellCount': cell_count,
+            'batchId': None,
+            'antibodies': [{
+                'id': ab['id'],
+                'antigen': ab['antigen'],
+                'metal': ab['metal'],
+                'volumeUsed': volumes[i],
+                'lots': lots[i]
+            } for ab, volumes, lots in zip(antibodies, required, shares)]
+        } for i, (name, cell_count) in enumerate(samples)]
+        return PreparedBatch(entries, [(ab_id, -total) for ab_id, total
+                                       in zip(antibody_ids, totals)], lot_changes)
+
+    def record_batch(self, batch):
+        """Draw a prepared batch's combined volumes and add all its entries to history.
+
+        One store transaction, one journal action and one usage update
+        cover the whole batch, journalled under the user the entries were
+        prepared for. The store sets each entry's ``id`` and the shared
+        ``batchId``. Returns the entries.
+        """
+        stock, lots = self.store.record_batch(batch.entries, batch.stock_changes,
+                                              batch.lot_changes)
+        self._record_usage(batch.entries[0]['timestamp'], batch.stock_changes)
+        self._set_lot_volumes(lots)
+        self._journal_action(batch.entries[0]['user'], 'stock.batch',
+                             self._apply_stock(stock), ref=batch.entries[0]['batchId'])
+        if self._panel_history is not None:
+            for entry in batch.entries:
+                self._panel_history.add(entry)
+        return batch.entries
+
+    def execute_batch(self, antibody_ids, samples, user=None):
+        """Validate and record a batch in one step; returns its history entries"""
+        return self.record_batch(self.prepare_batch(antibody_ids, samples, user))
+
+    def undo_execution(self, entry_id):
+        """Return an executed panel's volumes to stock and drop it from history"""
+        entry = self.panel_history.get(entry_id)
+        if entry is None:
+            raise UnknownPanel(f"No executed panel with id {entry_id}.")
+        stock_changes = self.history_stock_changes(entry)
+        try:
+            stock, lots = self.store.undo_execution(entry_id, stock_changes,
+                                                    self.history_lot_changes(entry))
+        except KeyError:
+            self.sync()
+            raise UnknownPanel(f"'{entry['panelName']}' was already undone or deleted "
+                               "at another station.")
+        self._record_usage(entry['timestamp'], stock_changes)
+        self._set_lot_volumes(lots)
+        self._journal_action(self.user, 'stock.undo', self._apply_stock(stock), ref=entry_id)
+        self.panel_history.remove(entry_id)
+        return entry
+
+    def delete_history(self, entry_id):
+        """Remove an executed panel from history without changing stock"""
+        entry = self.panel_history.get(entry_id)
+        if entry is None:
+            raise UnknownPanel(f"No executed panel with id {entry_id}.")
+        try:
+            self.store.delete_history(entry_id)
+        except KeyError:
+            self.sync()
+            raise UnknownPanel(f"'{entry['panelName']}' was already undone or deleted "
+                               "at another station.")
+        self._journal_action(self.user, 'history.delete', [(None, None, entry, None)],
+                             ref=entry_id)
+        return self.panel_history.remove(entry_id)
+
+    # ---------------- Saved panels ----------------
+
+    def find_saved_panel(self, name):
+        panel = self.saved_panels.find(name.strip())
+        if panel is None:
+            raise UnknownPanel(f"No saved panel named '{name.strip()}'.")
+        return panel
+
+    def save_panel(self, name, antibody_ids):
+        """Save a named selection to the panel library; returns the panel"""
+        name = name.strip()
+        if not antibody_ids:
+            raise MissingInput("Please select at least one antibody before saving.")
+        if not name:
+            raise MissingInput("You must enter a panel name before saving.")
+        if self.saved_panels.has_name(name):
+            raise DuplicateName(f"A panel named '{name}' already exists.\n"
+                                "Please choose a different name.")
+
+        panel = {
+            'id': None,         # assigned by the store
+            'name': name,
+            'antibodyIds': list(antibody_ids),
+            'createdBy': self.user,
+            'createdAt': datetime.now().isoformat()
+        }
+        self.store.insert_saved_panel(panel)
+        self._journal_action(self.user, 'panel.save', [(None, None, None, panel)],
+                             ref=panel['id'])
+        self.saved_panels.add(panel)
+        return panel
+
+    def delete_saved_panel(self, panel_id):
+        panel = self.saved_panels.get(panel_id)
+        if panel is None:
+            raise UnknownPanel(f"No saved panel with id {panel_id}.")
+        try:
+            self.store.delete_saved_panel(panel_id)
+        except KeyError:
+            self.sync()
+            raise UnknownPanel(f"Saved panel '{panel['name']}' was already deleted "
+                               "at another station.")
+        self._journal_action(self.user, 'panel.delete', [(None, None, panel, None)],
+                             ref=panel_id)
+        return self.saved_panels.remove(panel_id)
+
+    # ---------------- Inventory ----------------
+
+    def add_antibody(self, antibody):
+        """Add a record (without an id) to the inventory; returns it with its new id"""
+        self.store.insert_antibody(antibody)
+        self._journal_action(self.user, 'antibody.add',
+                             [(antibody, None, None, dict(antibody))])
+        self.inventory.add(antibody)
+        self._reload_lots([antibody['id']])
+        return antibody
+
+    def update_antibody(self, ab_id, field, value):
+        """Edit one field unless another station changed the row first.
+
+        Returns the previous value. Raises VersionConflict after reloading
+        the row from the store, so callers can simply redraw it, or
+        UnknownPanel if the reload found it deleted at another station. A
+        new ``stockVolume`` is made up by drawing from the lots
+        oldest-expiring first, or by adding to the last-expiring lot;
+        InsufficientStock (again after reloading) means the lots no longer
+        covered the decrease.
+        """
+        ab = self.inventory.get(ab_id)
+        if ab is None:
+            raise UnknownPanel(f"No antibody with id {ab_id}.")
+        old_value = ab[field]
+        if value == old_value:
+            return old_value
+        if field == 'stockVolume':
+            if value < 0:
+                raise InvalidValue("Stock volume cannot be negative.")
+            try:
+                stock, lots = self.store.adjust_stock(
+                    ab_id, self._stock_lot_changes(ab_id, value - old_value),
+                    expected_version=ab.get('version'))
+            except (VersionConflict, InsufficientStock):
+                # Reload the row and its lots so the edit can be made again
+                self.sync()
+                self._reload_lots([ab_id])
+                if ab_id not in self.inventory:
+                    raise UnknownPanel(_deleted_elsewhere(ab)) from None
+                raise
+            self._set_lot_volumes(lots)
+            self._journal_action(self.user, 'antibody.update', self._apply_stock(stock))
+            return old_value
+        try:
+            version = self.store.update_antibody(
+                ab_id, expected_version=ab.get('version'), **{field: value})
+        except VersionConflict:
+            self.sync()
+            if ab_id not in self.inventory:
+                raise UnknownPanel(_deleted_elsewhere(ab)) from None
+            raise
+        self.inventory.update(ab_id, version=version, **{field: value})
+        self._journal_action(self.user, 'antibody.update', [(ab, field, old_value, value)])
+        return old_value
+
+    def delete_antibody(self, ab_id):
+        """Remove an antibody and its lots; UnknownPanel if it is already gone"""
+        ab = self.inventory.get(ab_id)
+        if ab is None:
+            raise UnknownPanel(f"No antibody with id {ab_id}.")
+        try:
+            self.store.delete_antibody(ab_id)
+        except KeyError:
+            self.sync()
+            raise UnknownPanel(_deleted_elsewhere(ab))
+        self._journal_action(self.user, 'antibody.delete', [(ab, None, dict(ab), None)])
+        if self._lots is not None:
+            self._lots.remove_antibody(ab_id)
+        return self.inventory.remove(ab_id)
+
+    def apply_import(self, plan):
+        """Write a validated ImportPlan in one transaction and one journal action.
+
+        Merged rows are written only if no other station changed them since
+        this one last synced; otherwise nothing is written and, after
+        reloading them, VersionConflict is raised so the import can be
+        planned again.
+        """
+        restocked = [ab_id for ab_id, fields in plan.updates if 'stockVolume' in fields]
+        try:
+            lot_changes = [
+                change for ab_id, fields in plan.updates if 'stockVolume' in fields
+                for change in self._stock_lot_changes(
+                    ab_id, fields['stockVolume'] - self.inventory.get(ab_id)['stockVolume'])]
+            versions = self.store.import_antibodies(
+                plan.inserts, plan.updates, lot_changes,
+                versions={ab_id: self.inventory.get(ab_id).get('version')
+                          for ab_id, _ in plan.updates})
+        except (VersionConflict, InsufficientStock):
+            self.sync()
+            raise
+
+        changes = [(ab, None, None, dict(ab)) for ab in plan.inserts]
+        self.inventory.add_many(plan.inserts)
+        for ab_id, fields in plan.updates:
+            old = self.inventory.update(ab_id, version=versions[ab_id], **fields)
+            old.pop('version', None)
+            ab = self.inventory.get(ab_id)
+            changes.extend((ab, field, old_value, ab[field]) for field, old_value in old.items())
+        self._reload_lots([ab['id'] for ab in plan.inserts] + restocked)
+        self._journal_action(self.user, 'antibody.import', changes)
+
+    # ---------------- Lots ----------------
+
+    def add_lot(self, ab_id, volume, date_conjugated, expiry='', lot_number=''):
+        """Add a vial to an antibody's stock; returns the new lot.
+
+        Without an expiry the lot keeps DEFAULT_SHELF_LIFE_DAYS from its
+        conjugation date.
+        """
+        ab = self.inventory.get(ab_id)
+        if ab is None:
+            raise UnknownPanel(f"No antibody with id {ab_id}.")
+        if volume <= 0:
+            raise InvalidValue("A new lot needs a volume above 0 µL.")
+        if not date_conjugated.strip():
+            raise MissingInput("Please enter the date the lot was conjugated.")
+        conjugated = _iso_date(date_conjugated, "Date conjugated")
+        if expiry.strip():
+            expiry = _iso_date(expiry, "Expiry")
+        else:
+            expiry = days_from(date.fromisoformat(conjugated), DEFAULT_SHELF_LIFE_DAYS)
+        lot = {'antibodyId': ab_id, 'lotNumber': lot_number.strip(), 'volume': float(volume),
+               'dateConjugated': conjugated, 'expiry': expiry}
+        lot['id'], stock = self.store.insert_lot(lot)
+        if self._lots is not None:
+            self._lots.add(lot)
+        self._journal_action(self.user, 'lot.add',
+                             [(ab, 'lot', None, lot)] + self._apply_stock(stock), ref=lot['id'])
+        return lot
+
+    def discard_lot(self, lot_id):
+        """Write off what is left in a vial (expired, contaminated); returns the volume"""
+        lot = self.lots.get(lot_id)
+        if lot is None:
+            raise UnknownPanel(f"No lot with id {lot_id}.")
+        volume = lot['volume']
+        if volume <= 0:
+            return 0.0
+        try:
+            stock, lots = self.store.adjust_stock(lot['antibodyId'], [(lot_id, -volume)])
+        except InsufficientStock:
+            # Another station drew on the lot in the meantime
+            self.sync()
+            raise
+        self._set_lot_volumes(lots)
+        self._journal_action(self.user, 'lot.discard', self._apply_stock(stock), ref=lot_id)
+        return volume
+
+    # ---------------- Exports ----------------
+
+    def export_job(self, kind, path, records=None, fmt=None):
+        """Unstarted ExportJob over a snapshot of the inventory or the history"""
+        if records is None:
+            if kind == 'inventory':
+                # Records are edited in place, so the snapshot copies them
+                records = [dict(ab) for ab in self.inventory]
+            else:
+                # History entries are never edited in place; a shallow copy is a consistent snapshot
+                records = list(self.panel_history)
+        return ExportJob(path, records, kind, fmt)
+
+    # ---------------- Other stations ----------------
+
+    def sync(self):
+        """Reload the rows other stations changed; returns the entity kinds touched"""
+        changes = self.store.poll_changes()
+        reload = changes is None
+        if reload:
+            # Fell behind the retained change feed: reload everything
+            ids = {ab['id'] for ab in self.store.load_inventory()}
+            ids.update(ab['id'] for ab in self.inventory)
+            changes = [(ANTIBODY, ab_id) for ab_id in ids]
+            self._panel_history = self._saved_panels = self._lots = None
+            touched = {HISTORY, SAVED_PANEL}
+        else:
+            touched = set()
+
+        self._reload_lots([entity_id for entity, entity_id in changes if entity == ANTIBODY])
+        for entity, entity_id in changes:
+            touched.add(entity)
+            if entity == ANTIBODY:
+                row = self.store.load_antibody(entity_id)
+                if row is None:
+                    if entity_id in self.inventory:
+                        self.inventory.remove(entity_id)
+                elif entity_id in self.inventory:
+                    self.inventory.update(entity_id, **row)
+                else:
+                    self.inventory.add(row)
+            elif entity == HISTORY and self._panel_history is not None:
+                entry = self.store.load_history_entry(entity_id)
+                known = self._panel_history.remove(entity_id)
+                if entry is not None:
+                    self._panel_history.add(entry)
+                    if known is None:
+                        # Another station's execution counts towards burn rates; removals
+                        # are left alone since undo and delete look the same from here
+                        self._record_usage(entry['timestamp'],
+                                           [(ab_id, -volume) for ab_id, volume
+                                            in self.history_stock_changes(entry)])
+            elif entity == SAVED_PANEL and self._saved_panels is not None:
+                panel = self.store.load_saved_panel(entity_id)
+                self._saved_panels.remove(entity_id)
+                if panel is not None:
+                    self._saved_panels.add(panel)
+        if reload and self._forecast is not None:
+            # Burn rates come from the whole history, which may have changed in any way
+            self._forecast.reset(self.store.load_daily_usage())
+        return touched
@@ -0,0 +1,183 @@
+"""Panel designer: assign one conjugate per target antigen to distinct mass channels.
+
+The design is a rectangular assignment problem with antigens as rows and
+mass channels as columns. Each cell holds the best conjugate of that antigen
+on that channel, scored by detector sensitivity tier and by how many tests
+its stock covers. It is solved with the Hungarian algorithm. Spillover is
+pairwise, so it cannot be priced into a single assignment. Instead, channels
+that receive spillover from the current design are penalised and the
+problem is re-solved a few times; the best design by the full objective is
+kept.
+"""
+
+from collections import namedtuple
+
+from .channels import TIER_SCORES, sensitivity_tier, spillover
+from .volumes import calculate_volume
+from .search import metal_mass
+
+
+STOCK_WEIGHT = 0.4
+TIER_WEIGHT = 0.6
+SPILLOVER_WEIGHT = 10.0
+FULL_STOCK_TESTS = 50           # tests of stock that earn the full stock score
+UNASSIGNED_COST = 100.0         # leaving an antigen out; any real pairing is cheaper
+INFEASIBLE_COST = 1e6           # antigen has no usable conjugate on the channel
+
+PanelDesign = namedtuple('PanelDesign', 'assignments unassigned score spillover')
+PanelDesign.__doc__ = """Designed panel.
+
+``assignments`` is [(antigen, antibody)] in request order, ``unassigned``
+the antigens with no usable conjugate, ``spillover`` [(source antibody,
+target antibody, fraction, reason)] between assigned channels.
+"""
+
+
+def hungarian(cost):
+    """Minimum-cost assignment of every row to a distinct column (rows <= columns).
+
+    Shortest augmenting paths with row/column potentials, O(rows^2 * columns).
+    Returns the chosen column index for each row.
+    """
+    n, m = len(cost), len(cost[0]) if cost else 0
+    if n > m:
+        raise ValueError("hungarian() needs at least as many columns as rows")
+    inf = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    owner = [0] * (m + 1)           # column -> row (1-based, 0 = free)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            row, ui0 = cost[i0 - 1], u[i0]
+            delta, j1 = inf, 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = row[j - 1] - ui0 - v[j]
+                    if reduced < minv[j]:
+                        minv[j] = reduced
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            result[owner[j] - 1] = j - 1
+    return result
+
+
+def conjugate_score(antibody, cell_count):
+    """Score in [0, 1] from sensitivity tier and stock; None when stock cannot cover one test"""
+    required = calculate_volume(antibody, cell_count)
+    if required <= 0:
+        tests = FULL_STOCK_TESTS
+    else:
+        tests = antibody['stockVolume'] / required
+        if tests < 1:
+            return None
+    stock_score = min(tests, FULL_STOCK_TESTS) / FULL_STOCK_TESTS
+    tier_score = TIER_SCORES[sensitivity_tier(metal_mass(antibody['metal']))]
+    return TIER_WEIGHT * tier_score + STOCK_WEIGHT * stock_score
+
+
+def _spill_between(masses):
+    """Total pairwise spillover fraction and (i, j, fraction, reason) pairs"""
+    pairs = []
+    for i, a in enumerate(masses):
+        for j, b in enumerate(masses):
+            if i != j:
+                fraction, reason = spillover(a, b)
+                if fraction:
+                    pairs.append((i, j, fraction, reason))
+    return sum(p[2] for p in pairs), pairs
+
+
+def design_panel(antigens, antibodies, cell_count=4.0, iterations=5):
+    """Pick one conjugate per antigen so no mass channel is used twice.
+
+    ``antigens`` are matched case-insensitively against the ``antibodies``
+    (any iterable of inventory records). Maximises the summed conjugate
+    score minus ``SPILLOVER_WEIGHT`` times the pairwise spillover.
+    """
+    first = {}                      # lowercase antigen -> first spelling given
+    for a in antigens:
+        if a.strip():
+            first.setdefault(a.strip().lower(), a.strip())
+    targets = list(first.values())
+    wanted = {a.lower(): row for row, a in enumerate(targets)}
+
+    # Best conjugate for every (antigen, channel) pair
+    best = {}                       # (row, mass) -> (score, antibody)
+    for ab in antibodies:
+        row = wanted.get(ab['antigen'].lower())
+        mass = metal_mass(ab['metal'])
+        if row is None or not mass:
+            continue
+        score = conjugate_score(ab, cell_count)
+        if score is not None and score > best.get((row, mass), (-1, None))[0]:
+            best[(row, mass)] = (score, ab)
+
+    channels = sorted({mass for _, mass in best})
+    if not targets:
+        return PanelDesign([], [], 0.0, [])
+
+    column_of = {mass: col for col, mass in enumerate(channels)}
+    base = [[INFEASIBLE_COST] * len(channels) for _ in targets]
+    for (row, mass), (score, _) in best.items():
+        base[row][column_of[mass]] = -score
+    penalty = [0.0] * len(channels)
+
+    best_design, best_objective, seen = None, None, set()
+    for _ in range(max(iterations, 1)):
+        # One "leave out" column per antigen keeps the problem always solvable
+        cost = [[c + p for c, p in zip(row, penalty)] + [UNASSIGNED_COST] * len(targets)
+                for row in base]
+        columns = hungarian(cost)
+        chosen = tuple(col if col < len(channels) and base[row][col] < INFEASIBLE_COST else None
+                       for row, col in enumerate(columns))
+        if chosen in seen:
+            break
+        seen.add(chosen)
+
+        assigned = [(row, channels[col]) for row, col in enumerate(chosen) if col is not None]
+        total_spill, pairs = _spill_between([mass for _, mass in assigned])
+        objective = sum(best[key][0] for key in assigned) - SPILLOVER_WEIGHT * total_spill
+        objective -= UNASSIGNED_COST * (len(targets) - len(assigned))
+        if best_objective is None or objective > best_objective:
+            best_objective = objective
+            best_design = (assigned, pairs)
+
+        # Price each channel by the spillover it would exchange with this design
+        used = {mass for _, mass in assigned}
+        penalty = [SPILLOVER_WEIGHT * sum(spillover(m, c)[0] + spillover(c, m)[0]
+                                          for m in used if m != c)
+                   for c in channels]
+
+    assigned, pairs = best_design
+    antibody_for = {row: best[(row, mass)][1] for row, mass in assigned}
+    assignments = [(targets[row], antibody_for[row]) for row in sorted(antibody_for)]
+    unassigned = [a for row, a in enumerate(targets) if row not in antibody_for]
+    ordered = [best[key][1] for key in assigned]
+    spill = [(ordered[i], ordered[j], fraction, reason) for i, j, fraction, reason in pairs]
+    return PanelDesign(assignments, unassigned,
+                       best_objective + UNASSIGNED_COST * len(unassigned), spill)
@@ -0,0 +1,112 @@
+"""Timing spans, counters and event-loop lag for finding slow views.
+
+Nothing here runs unless asked: ``instrument`` wraps the named methods of
+one object by shadowing them with instance attributes, so an object that
+was never instrumented calls its methods directly and pays nothing.
+
+``trace()`` returns the Chrome trace-event format (load the dumped file in
+chrome://tracing or https://ui.perfetto.dev): spans are complete ("X")
+events, counters and loop lag are counter ("C") events.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+
+ENV_VAR = 'ANTIBODY_PANEL_DIAGNOSTICS'
+MAX_EVENTS = 20000              # trace events kept; older ones are dropped
+LAG_WINDOW = 120                # lag samples kept for the recent mean/max
+
+
+def enabled_from_env():
+    return os.environ.get(ENV_VAR, '').lower() not in ('', '0', 'no', 'off', 'false')
+
+
+class Diagnostics:
+    """Per-method call statistics plus a bounded trace of recent events"""
+
+    def __init__(self, clock=time.perf_counter, max_events=MAX_EVENTS):
+        self.clock = clock
+        self._origin = clock()
+        self._events = deque(maxlen=max_events)
+        self._lag = deque(maxlen=LAG_WINDOW)
+        self.stats = {}         # name -> [calls, total s, max s, last s]
+        self.counters = {}      # name -> {series: latest value}
+
+    def instrument(self, obj, names):
+        """Time every call of ``obj.<name>`` for each name, by shadowing the method"""
+        for name in names:
+            setattr(obj, name, self.timed(name, getattr(obj, name)))
+
+    def timed(self, name, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = self.clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record_span(name, start, self.clock() - start)
+        return wrapper
+
+    def record_span(self, name, start, duration):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0.0, 0.0, 0.0]
+        stat[0] += 1
+        stat[1] += duration
+        stat[2] = max(stat[2], duration)
+        stat[3] = duration
+        self._events.append(('X', name, start, duration, threading.get_ident()))
+
+    def record_counter(self, name, values):
+        """Record the current values of a named group of series, e.g. widget counts"""
+        self.counters[name] = dict(values)
+        self._events.append(('C', name, self.clock(), dict(values), None))
+
+    def record_lag(self, lag):
+        """Record how late (in seconds) a scheduled event-loop callback ran"""
+        self._lag.append(lag)
+        self._events.append(('C', 'loop lag (ms)', self.clock(), {'lag': lag * 1000}, None))
+
+    def lag(self):
+        """(last, mean, max, samples) loop lag in seconds over the recent window, or None"""
+        if not self._lag:
+            return None
+        return self._lag[-1], sum(self._lag) / len(self._lag), max(self._lag), len(self._lag)
+
+    def rows(self):
+        """[(name, calls, total s, mean s, max s, last s)], slowest total first"""
+        return sorted(((name, calls, total, total / calls, worst, last)
+                       for name, (calls, total, worst, last) in self.stats.items()),
+                      key=lambda row: row[2], reverse=True)
+
+    def reset(self):
+        self._events.clear()
+        self._lag.clear()
+        self.stats.clear()
+        self.counters.clear()
+
+    def trace(self):
+        pid = os.getpid()
+        events = []
+        for kind, name, start, value, tid in self._events:
+            event = {'name': name, 'ph': kind, 'pid': pid,
+                     'ts': round((start - self._origin) * 1e6, 1)}
+            if kind == 'X':
+                event.update(dur=round(value * 1e6, 1), tid=tid)
+            else:
+                event.update(args=value, tid=0)
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'stats': {name: {'calls': calls, 'total_ms': total * 1000,
+                                               'max_ms': worst * 1000}
+                                        for name, calls, total, _, worst, _ in self.rows()}}}
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.trace(), f)
+            f.write('\n')
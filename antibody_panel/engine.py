@@ -0,0 +1,176 @@
+"""Columnar NumPy engine for staining volumes and stock validation.
+
+The inventory fields that drive volume maths (volume per test, stock,
+alert threshold and the stain-type factor) are mirrored into NumPy arrays
+kept in step with the InventoryModel. A panel, or a batch of what-if
+scenarios, is then evaluated with a handful of array operations instead of
+one ``calculate_volume`` call per antibody.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .volumes import STANDARD_CELL_COUNT, stain_factor
+
+
+_COLUMN_FIELDS = ('volumePerTest', 'stockVolume', 'alertThreshold', 'stainType')
+
+PanelCheck = namedtuple('PanelCheck', 'ids required available shortfall remaining ok')
+PanelCheck.__doc__ = """Per-antibody arrays for one panel at one cell count"""
+
+Scenarios = namedtuple('Scenarios', 'max_cells feasible total_volume')
+Scenarios.__doc__ = """Panels x cell counts what-if results"""
+
+BatchCheck = namedtuple('BatchCheck', 'ids required total available shortfall ok')
+BatchCheck.__doc__ = """Samples x antibodies volumes for one panel, checked on their totals"""
+
+
+class VolumeEngine:
+    """Column arrays over the inventory, indexed through an id -> row map"""
+
+    def __init__(self, model, capacity=64):
+        self._rows = {}                 # antibody id -> row
+        self._ids = []                  # row -> antibody id
+        capacity = max(capacity, len(model))
+        self.volume_per_test = np.zeros(capacity)
+        self.stock = np.zeros(capacity)
+        self.threshold = np.zeros(capacity)
+        self.factor = np.ones(capacity)
+
+        for ab in model:
+            self._add(ab)
+        model.subscribe(self._on_inventory_change)
+
+    def __len__(self):
+        return len(self._ids)
+
+    # ---------------- Keeping columns in step ----------------
+
+    def _grow(self):
+        size = max(len(self.stock) * 2, 64)
+        for name in ('volume_per_test', 'stock', 'threshold', 'factor'):
+            column = getattr(self, name)
+            grown = np.ones(size) if name == 'factor' else np.zeros(size)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _write(self, row, antibody):
+        self.volume_per_test[row] = antibody['volumePerTest']
+        self.stock[row] = antibody['stockVolume']
+        self.threshold[row] = antibody['alertThreshold']
+        self.factor[row] = stain_factor(antibody)
+
+    def _add(self, antibody):
+        row = len(self._ids)
+        if row == len(self.stock):
+            self._grow()
+        self._rows[antibody['id']] = row
+        self._ids.append(antibody['id'])
+        self._write(row, antibody)
+
+    def _remove(self, ab_id):
+        # Swap the last row into the freed slot to keep the columns dense
+        row = self._rows.pop(ab_id)
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            for column in (self.volume_per_test, self.stock, self.threshold, self.factor):
+                column[row] = column[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+
+    def _on_inventory_change(self, event, antibody, changes):
+        if event == 'add':
+            self._add(antibody)
+        elif event == 'add_many':
+            for ab in antibody:
+                self._add(ab)
+        elif event == 'remove':
+            self._remove(antibody['id'])
+        elif any(field in changes for field in _COLUMN_FIELDS):
+            self._write(self._rows[antibody['id']], antibody)
+
+    # ---------------- Queries ----------------
+
+    def rows(self, ids):
+        return np.fromiter((self._rows[i] for i in ids), dtype=np.intp, count=len(ids))
+
+    def base_volumes(self, ids):
+        """Volume per test after the stain-type factor, at 1x strength"""
+        rows = self.rows(ids)
+        return self.volume_per_test[rows] * self.factor[rows]
+
+    def required(self, ids, cell_count):
+        return self.base_volumes(ids) * (cell_count / STANDARD_CELL_COUNT)
+
+    def check(self, ids, cell_count):
+        """Required volume, shortfall and post-execution stock for one panel"""
+        ids = list(ids)
+        rows = self.rows(ids)
+        required = self.volume_per_test[rows] * self.factor[rows] * (cell_count / STANDARD_CELL_COUNT)
+        available = self.stock[rows]
+        shortfall = np.maximum(required - available, 0.0)
+        remaining = available - required
+        return PanelCheck(ids, required, available, shortfall, remaining,
+                          not (required > available).any())
+
+    def check_batch(self, ids, cell_counts):
+        """Per-sample volumes for one panel run on many samples, and the stock check.
+
+        ``required`` is ``len(cell_counts) x len(ids)``; stock is checked
+        against each antibody's ``total`` over all samples, so the batch
+        either fits as a whole or not at all.
+        """
+        ids = list(ids)
+        rows = self.rows(ids)
+        scale = np.asarray(cell_counts, dtype=float) / STANDARD_CELL_COUNT
+        required = scale[:, None] * (self.volume_per_test[rows] * self.factor[rows])[None, :]
+        total = required.sum(axis=0)
+        available = self.stock[rows]
+        shortfall = np.maximum(total - available, 0.0)
+        return BatchCheck(ids, required, total, available, shortfall,
+                          not (total > available).any())
+
+    def low_stock(self, ids=None):
+        """Boolean mask (over ``ids`` or every row) of stock at/below threshold"""
+        if ids is None:
+            n = len(self._ids)
+            return self.stock[:n] <= self.threshold[:n]
+        rows = self.rows(ids)
+        return self.stock[rows] <= self.threshold[rows]
+
+    def scenarios(self, panels, cell_counts):
+        """Evaluate every panel (a list of antibody ids) at every cell count.
+
+        Each panel is judged against current stock on its own. A panel is
+        feasible up to ``max_cells``, the cell count at which its scarcest
+        antibody runs out; ``feasible`` and ``total_volume`` are
+        ``len(panels) x len(cell_counts)`` arrays.
+        """
+        cell_counts = np.asarray(cell_counts, dtype=float)
+        lengths = np.fromiter((len(p) for p in panels), dtype=np.intp, count=len(panels))
+        if not len(panels):
+            empty = np.zeros((0, len(cell_counts)))
+            return Scenarios(np.zeros(0), empty.astype(bool), empty)
+
+        rows = self.rows([ab_id for panel in panels for ab_id in panel])
+        base = self.volume_per_test[rows] * self.factor[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            headroom = np.where(base > 0, self.stock[rows] / base, np.inf)
+
+        # Segment reductions over the concatenated panels; empty panels get
+        # a harmless dummy segment and are patched afterwards.
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        nonempty = lengths > 0
+        max_cells = np.full(len(panels), np.inf)
+        total_base = np.zeros(len(panels))
+        if nonempty.any():
+            max_cells[nonempty] = np.minimum.reduceat(headroom, starts[nonempty]) * STANDARD_CELL_COUNT
+            total_base[nonempty] = np.add.reduceat(base, starts[nonempty])
+
+        scale = cell_counts / STANDARD_CELL_COUNT
+        feasible = cell_counts[None, :] <= max_cells[:, None]
+        total_volume = total_base[:, None] * scale[None, :]
+        return Scenarios(max_cells, feasible, total_volume)
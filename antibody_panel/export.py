@@ -0,0 +1,133 @@
+"""Streaming CSV / NDJSON export of inventory and history on a worker thread.
+
+An ExportJob is handed a snapshot of the records when it is created, so
+the GUI can keep mutating the live collections while the file is written.
+Rows are formatted and written in chunks; ``progress`` and ``cancel`` are
+safe to use from the Tk thread.
+"""
+
+import csv
+import io
+import json
+import os
+import threading
+
+
+INVENTORY_HEADER = ['Antigen', 'Clone', 'Metal', 'Concentration (mg/mL)',
+                    'Antibody per Test (µg)', 'Volume per Test (µL)',
+                    'Stock Volume (µL)', 'Alert Threshold (µL)',
+                    'Date Conjugated', 'Notes']
+
+HISTORY_HEADER = ['Timestamp', 'User', 'Panel Name',
+                  'Cell Count (millions)', 'Antibodies Used',
+                  'Total Volume (µL)']
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+
+def export_format(filename):
+    """'ndjson' for JSON-lines file names, otherwise 'csv'"""
+    return 'ndjson' if filename.lower().endswith(NDJSON_EXTENSIONS) else 'csv'
+
+
+def inventory_row(ab):
+    return [
+        ab['antigen'], ab['clone'], ab['metal'],
+        ab['concentration'], ab['antibodyPerTest'],
+        ab['volumePerTest'], f"{ab['stockVolume']:.2f}",
+        ab['alertThreshold'], ab['dateConjugated'], ab['notes']
+    ]
+
+
+def history_row(entry):
+    # ISO timestamps already sort and slice as 'YYYY-MM-DD HH:MM:SS'
+    timestamp = entry['timestamp'][:19].replace('T', ' ')
+    ab_list = '; '.join(f"{ab['antigen']}({ab['metal']})" for ab in entry['antibodies'])
+    total_vol = sum(ab['volumeUsed'] for ab in entry['antibodies'])
+    return [timestamp, entry['user'], entry['panelName'], entry['cellCount'],
+            ab_list, f"{total_vol:.2f}"]
+
+
+def read_ndjson(path):
+    """Records written by an NDJSON export, exactly as they were exported"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ExportJob:
+    """Write ``records`` to ``path`` on a background thread.
+
+    ``kind`` is 'inventory' or 'history' and selects the CSV layout; NDJSON
+    exports write each record verbatim. The file is written under a
+    temporary name and only moved into place when the export completes.
+    """
+
+    HEADERS = {'inventory': INVENTORY_HEADER, 'history': HISTORY_HEADER}
+    ROW_FORMATTERS = {'inventory': inventory_row, 'history': history_row}
+
+    def __init__(self, path, records, kind, fmt=None, chunk_size=1000):
+        self.path = path
+        self.records = records
+        self.kind = kind
+        self.fmt = fmt or export_format(path)
+        self.chunk_size = chunk_size
+
+        self.total = len(records)
+        self.written = 0
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'export-{kind}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    @property
+    def progress(self):
+        return self.written / self.total if self.total else 1.0
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _format_chunk(self, chunk):
+        buffer = io.StringIO()
+        if self.fmt == 'ndjson':
+            for record in chunk:
+                buffer.write(json.dumps(record, ensure_ascii=False))
+                buffer.write('\n')
+        else:
+            writer = csv.writer(buffer)
+            writer.writerows(self.ROW_FORMATTERS[self.kind](record) for record in chunk)
+        return buffer.getvalue()
+
+    def _run(self):
+        partial = self.path + '.part'
+        try:
+            with open(partial, 'w', newline='', encoding='utf-8') as f:
+                if self.fmt == 'csv':
+                    csv.writer(f).writerow(self.HEADERS[self.kind])
+                for start in range(0, self.total, self.chunk_size):
+                    if self._cancel.is_set():
+                        break
+                    chunk = self.records[start:start + self.chunk_size]
+                    f.write(self._format_chunk(chunk))
+                    self.written = start + len(chunk)
+            if self._cancel.is_set():
+                os.remove(partial)
+            else:
+                os.replace(partial, self.path)
+        except Exception as exc:
+            self.error = exc
+            if os.path.exists(partial):
+                os.remove(partial)
@@ -0,0 +1,146 @@
+"""Consumption forecasting from rolling per-antibody burn rates.
+
+Usage is kept as daily buckets per antibody plus an exponentially weighted
+daily burn rate. Both are updated in O(panel size) when a panel is executed
+or undone, so projecting a depletion date never touches the history itself.
+
+The EWMA is stored as ``(value, day)``: ``value`` is the rate as of ``day``
+and decays by ``(1 - alpha)`` for every later day without usage. Volume used
+on day ``d`` contributes ``alpha * (1 - alpha) ** (day - d) * volume``, which
+is linear, so an undo subtracts exactly what the execution added even when
+later days have been recorded since.
+"""
+
+from datetime import date, datetime, timedelta
+
+
+def day_number(when):
+    """Ordinal day of a date, datetime or ISO timestamp string"""
+    if isinstance(when, str):
+        return date.fromisoformat(when[:10]).toordinal()
+    if isinstance(when, datetime):
+        return when.date().toordinal()
+    return when.toordinal()
+
+
+class _Usage:
+    __slots__ = ('daily', 'rate', 'rate_day', 'first_day')
+
+    def __init__(self):
+        self.daily = {}         # ordinal day -> µL used
+        self.rate = 0.0
+        self.rate_day = None
+        self.first_day = None
+
+
+class ConsumptionForecast:
+    """Burn rate and projected depletion per antibody id.
+
+    ``daily_usage`` seeds the rollups from ``PanelStore.load_daily_usage``
+    rows; ``span`` is the EWMA span in days (alpha = 2 / (span + 1)).
+    """
+
+    def __init__(self, model, daily_usage=(), span=14):
+        self.model = model
+        self.alpha = 2.0 / (span + 1)
+        self.reset(daily_usage)
+        model.subscribe(self._on_inventory_change)
+
+    def reset(self, daily_usage=()):
+        """Drop every rollup and seed them again from ``daily_usage`` rows"""
+        self._usage = {}        # antibody id -> _Usage
+        for day, ab_id, antigen, metal, volume in daily_usage:
+            for target in self._targets(ab_id, antigen, metal):
+                self.consume(target, day, volume)
+
+    def _on_inventory_change(self, event, antibody, changes):
+        if event == 'remove':
+            self._usage.pop(antibody['id'], None)
+
+    def _targets(self, ab_id, antigen, metal):
+        # History written before ids were recorded resolves by label, as undo does
+        if ab_id in self.model:
+            return [ab_id]
+        return [ab['id'] for ab in self.model.find(antigen, metal)]
+
+    # ---------------- Updates ----------------
+
+    def consume(self, ab_id, when, volume):
+        """Add ``volume`` µL used on ``when`` (negative to take it back)"""
+        day = day_number(when)
+        usage = self._usage.get(ab_id)
+        if usage is None:
+            usage = self._usage[ab_id] = _Usage()
+
+        used = usage.daily.get(day, 0.0) + volume
+        if used > 1e-9:
+            usage.daily[day] = used
+        else:
+            usage.daily.pop(day, None)
+
+        keep = 1.0 - self.alpha
+        if usage.rate_day is None or day > usage.rate_day:
+            decayed = usage.rate * keep ** (day - usage.rate_day) if usage.rate_day is not None else 0.0
+            usage.rate = decayed + self.alpha * volume
+            usage.rate_day = day
+        else:
+            usage.rate += self.alpha * keep ** (usage.rate_day - day) * volume
+        if usage.rate < 1e-9:
+            usage.rate = 0.0
+        if usage.first_day is None or day < usage.first_day:
+            usage.first_day = day
+        elif day == usage.first_day and day not in usage.daily:
+            # The earliest day was undone entirely
+            usage.first_day = min(usage.daily) if usage.daily else None
+            if usage.first_day is None:
+                usage.rate, usage.rate_day = 0.0, None
+
+    def record(self, when, stock_changes):
+        """Apply the (antibody id, stock delta) pairs of an execution or undo"""
+        for ab_id, delta in stock_changes:
+            self.consume(ab_id, when, -delta)
+
+    # ---------------- Queries ----------------
+
+    def burn_rate(self, ab_id, today=None):
+        """Weighted µL/day as of ``today``; 0 when the antibody has no usage"""
+        usage = self._usage.get(ab_id)
+        if usage is None or not usage.rate:
+            return 0.0
+        today = max(day_number(today or date.today()), usage.rate_day)
+        keep = 1.0 - self.alpha
+        rate = usage.rate * keep ** (today - usage.rate_day)
+        # Bias correction: the EWMA starts from zero on the first day of use
+        return rate / (1.0 - keep ** (today - usage.first_day + 1))
+
+    def used_since(self, ab_id, days, today=None):
+        """Total µL used over the last ``days`` days (O(days) bucket lookups)"""
+        usage = self._usage.get(ab_id)
+        if usage is None:
+            return 0.0
+        today = day_number(today or date.today())
+        return sum(usage.daily.get(d, 0.0) for d in range(today - days + 1, today + 1))
+
+    def days_left(self, ab_id, today=None):
+        """Days of stock at the current burn rate, or None without usage"""
+        rate = self.burn_rate(ab_id, today)
+        antibody = self.model.get(ab_id)
+        if not rate or antibody is None:
+            return None
+        return max(antibody['stockVolume'], 0.0) / rate
+
+    def depletion_date(self, ab_id, today=None):
+        days = self.days_left(ab_id, today)
+        if days is None:
+            return None
+        today = date.fromordinal(day_number(today or date.today()))
+        return today + timedelta(days=int(days))
+
+
+def runs_out_text(days):
+    """Short label for a days_left value"""
+    if days is None:
+        return ''
+    if days < 1:
+        return 'today'
+    return f"~{days:.0f} days"
@@ -0,0 +1,120 @@
+"""Execution history indexed by timestamp, panel name and user.
+
+The History tab pages through these indexes instead of sorting and
+rendering every entry. Date-range and user filters are bisections over
+sorted ``(timestamp, id)`` lists, so a page costs O(log n + page size)
+in the unfiltered views and O(log n + matches) when a filter is sorted
+by name.
+"""
+
+import bisect
+
+
+class HistoryIndex:
+    """Executed panels keyed by id, iterated newest first"""
+
+    def __init__(self, entries=()):
+        self._by_id = {}
+        self._by_time = []      # sorted [(timestamp, id)]
+        self._by_name = []      # sorted [(lowered name, id)]
+        self._by_user = {}      # user -> sorted [(timestamp, id)]
+        self._names = {}        # lowered name -> number of entries
+
+        for entry in entries:
+            self._index(entry)
+            self._by_time.append((entry['timestamp'], entry['id']))
+            self._by_name.append((entry['panelName'].lower(), entry['id']))
+            self._by_user.setdefault(entry['user'], []).append((entry['timestamp'], entry['id']))
+        self._by_time.sort()
+        self._by_name.sort()
+        for keys in self._by_user.values():
+            keys.sort()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __bool__(self):
+        return bool(self._by_id)
+
+    def __iter__(self):
+        """Entries newest first, as PanelStore.load_history returns them"""
+        by_id = self._by_id
+        return iter([by_id[ab_id] for _, ab_id in reversed(self._by_time)])
+
+    def __contains__(self, entry_id):
+        return entry_id in self._by_id
+
+    def _index(self, entry):
+        self._by_id[entry['id']] = entry
+        name = entry['panelName'].lower()
+        self._names[name] = self._names.get(name, 0) + 1
+
+    # ---------------- Mutations ----------------
+
+    def add(self, entry):
+        self._index(entry)
+        bisect.insort(self._by_time, (entry['timestamp'], entry['id']))
+        bisect.insort(self._by_name, (entry['panelName'].lower(), entry['id']))
+        bisect.insort(self._by_user.setdefault(entry['user'], []),
+                      (entry['timestamp'], entry['id']))
+
+    def remove(self, entry_id):
+        entry = self._by_id.pop(entry_id, None)
+        if entry is None:
+            return None
+        name = entry['panelName'].lower()
+        self._names[name] -= 1
+        if not self._names[name]:
+            del self._names[name]
+
+        _discard(self._by_time, (entry['timestamp'], entry_id))
+        _discard(self._by_name, (name, entry_id))
+        user_keys = self._by_user[entry['user']]
+        _discard(user_keys, (entry['timestamp'], entry_id))
+        if not user_keys:
+            del self._by_user[entry['user']]
+        return entry
+
+    # ---------------- Queries ----------------
+
+    def get(self, entry_id):
+        return self._by_id.get(entry_id)
+
+    def has_name(self, name):
+        """Case-insensitive check for an executed panel with this name"""
+        return name.lower() in self._names
+
+    def users(self):
+        return sorted(self._by_user)
+
+    def page(self, offset=0, limit=None, since=None, until=None, user=None, order='name'):
+        """(total matches, entries[offset:offset + limit]) for a filtered view.
+
+        ``since``/``until`` are ISO timestamps (inclusive / exclusive);
+        ``order`` is ``'name'`` (A-Z) or ``'newest'``.
+        """
+        by_id = self._by_id
+        if since is None and until is None and user is None and order == 'name':
+            total = len(self._by_name)
+            stop = total if limit is None else offset + limit
+            return total, [by_id[i] for _, i in self._by_name[offset:stop]]
+
+        keys = self._by_user.get(user, []) if user is not None else self._by_time
+        lo = bisect.bisect_left(keys, (since,)) if since is not None else 0
+        hi = bisect.bisect_left(keys, (until,)) if until is not None else len(keys)
+        total = max(hi - lo, 0)
+        stop = total if limit is None else min(offset + limit, total)
+
+        if order == 'newest':
+            # Walk the matching time range backwards, touching only this page
+            ids = [keys[hi - 1 - k][1] for k in range(offset, stop)]
+        else:
+            ids = sorted((by_id[i]['panelName'].lower(), i) for _, i in keys[lo:hi])
+            ids = [i for _, i in ids[offset:stop]]
+        return total, [by_id[i] for i in ids]
+
+
+def _discard(keys, key):
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
@@ -0,0 +1,142 @@
+"""Bulk inventory import from the CSV layout written by the inventory export.
+
+Rows are streamed from the file and validated in batches. Each valid row is
+matched against the inventory on (antigen, clone, metal) through the
+model's (antigen, metal) hash index: matches are merged into the existing
+record, everything else becomes a new antibody. Nothing is applied until
+the whole file has been read, and then it is applied in one transaction.
+"""
+
+import csv
+import math
+from collections import namedtuple
+from itertools import islice
+
+from .export import INVENTORY_HEADER
+
+
+# Export header -> (field, parser). 'Stain Type' is accepted in addition to
+# the export columns so files can carry the intracellular flag.
+COLUMNS = {
+    'Antigen': ('antigen', str),
+    'Clone': ('clone', str),
+    'Metal': ('metal', str),
+    'Concentration (mg/mL)': ('concentration', float),
+    'Antibody per Test (µg)': ('antibodyPerTest', float),
+    'Volume per Test (µL)': ('volumePerTest', float),
+    'Stock Volume (µL)': ('stockVolume', float),
+    'Alert Threshold (µL)': ('alertThreshold', float),
+    'Date Conjugated': ('dateConjugated', str),
+    'Notes': ('notes', str),
+    'Stain Type': ('stainType', str),
+}
+REQUIRED_COLUMNS = ('Antigen', 'Stock Volume (µL)')
+STAIN_TYPES = ('Extracellular', 'Intracellular')
+
+DEFAULTS = {
+    'clone': '', 'metal': '', 'concentration': 0.0, 'antibodyPerTest': 0.0,
+    'volumePerTest': 0.0, 'alertThreshold': 50.0, 'dateConjugated': '',
+    'notes': '', 'stainType': 'Extracellular',
+}
+
+ImportPlan = namedtuple('ImportPlan', 'inserts updates errors rows_read')
+ImportPlan.__doc__ = """Validated import: new records, (id, fields) merges and (line, message) errors"""
+
+
+class ImportFormatError(ValueError):
+    """The file is not in the inventory export layout"""
+
+
+def _parse_row(row, columns):
+    """One CSV row -> field dict, raising ValueError with a readable message"""
+    record = {}
+    for index, (header, (field, parser)) in columns:
+        raw = row[index].strip() if index < len(row) else ''
+        if parser is float:
+            if raw == '':
+                continue
+            try:
+                record[field] = float(raw)
+            except ValueError:
+                raise ValueError(f"{header}: '{raw}' is not a number") from None
+            if not math.isfinite(record[field]):
+                raise ValueError(f"{header}: '{raw}' is not a finite number")
+            if record[field] < 0:
+                raise ValueError(f"{header}: must not be negative")
+        else:
+            record[field] = raw
+
+    if not record.get('antigen'):
+        raise ValueError("Antigen is required")
+    if 'stockVolume' not in record:
+        raise ValueError("Stock Volume (µL) is required")
+    if record.get('stainType', 'Extracellular') not in STAIN_TYPES:
+        raise ValueError(f"Stain Type must be one of {', '.join(STAIN_TYPES)}")
+    if not record.get('stainType'):
+        record.pop('stainType', None)
+    return record
+
+
+def _numbered(reader):
+    """(first line, row) for each record; a quoted field may span several lines"""
+    line = reader.line_num
+    for row in reader:
+        yield line + 1, row
+        line = reader.line_num
+
+
+def plan_import(lines, model, batch_size=5000):
+    """Read CSV ``lines`` and work out what importing them would change.
+
+    ``lines`` is any iterable of text lines (an open file streams). Rows
+    duplicating an earlier row of the same file are reported as errors; rows
+    matching an existing antibody become merges.
+    """
+    reader = csv.reader(lines)
+    try:
+        header = [h.strip() for h in next(reader)]
+    except StopIteration:
+        raise ImportFormatError("The file is empty") from None
+
+    missing = [h for h in REQUIRED_COLUMNS if h not in header]
+    if missing:
+        raise ImportFormatError(
+            f"Missing column(s): {', '.join(missing)}. "
+            f"Expected the export layout: {', '.join(INVENTORY_HEADER)}")
+    columns = [(header.index(h), (h, spec)) for h, spec in COLUMNS.items() if h in header]
+
+    inserts, updates, errors = [], [], []
+    seen = {}           # (antigen, clone, metal) -> first line in this file
+    rows_read = 0
+    rows = _numbered(reader)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        for line_no, row in batch:
+            rows_read += 1
+            if not any(cell.strip() for cell in row):
+                continue
+            try:
+                record = _parse_row(row, columns)
+            except ValueError as exc:
+                errors.append((line_no, str(exc)))
+                continue
+
+            key = (record['antigen'], record.get('clone', ''), record.get('metal', ''))
+            if key in seen:
+                errors.append((line_no, f"Duplicate of line {seen[key]} "
+                                        f"({key[0]} / {key[1]} / {key[2]})"))
+                continue
+            seen[key] = line_no
+
+            existing = [ab for ab in model.find(key[0], key[2]) if ab['clone'] == key[1]]
+            if existing:
+                target = existing[0]
+                fields = {f: v for f, v in record.items() if target.get(f) != v}
+                if fields:
+                    updates.append((target['id'], fields))
+            else:
+                inserts.append({**DEFAULTS, **record})
+
+    return ImportPlan(inserts, updates, errors, rows_read)
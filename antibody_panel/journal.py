@@ -0,0 +1,369 @@
+"""Append-only audit journal of every inventory mutation.
+
+Events are written as JSON lines to segment files that roll over when they
+reach ``max_bytes`` or when the calendar month changes. Each segment is cut
+into blocks of ``block_events`` events; a sidecar ``.idx`` file records the
+byte offset and first timestamp of every block plus the blocks each
+antibody id appears in. ``manifest.json`` lists the sealed segments with
+their time range, users and antibody ids, so a query only opens the
+segments, and only reads the blocks, that can contain matching events.
+
+Several processes (the GUI and command-line jobs) may append to one
+journal. Writers take an exclusive lock on ``journal.lock`` and first index
+whatever the others appended or sealed, so every writer's offsets stay
+exact. Without ``fcntl`` (Windows) a journal directory must have a single
+writer.
+"""
+
+import bisect
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+MANIFEST = 'manifest.json'
+LOCK_FILE = 'journal.lock'
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'   # fixed width, so strings sort by time
+
+
+def default_journal_dir(db_path):
+    """Journal directory, overridable with ANTIBODY_PANEL_JOURNAL"""
+    return os.environ.get('ANTIBODY_PANEL_JOURNAL') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'journal')
+
+
+def antibody_label(antibody):
+    """Human-readable key used in queries, e.g. 'CD8-146Nd'"""
+    return f"{antibody.get('antigen', '')}-{antibody.get('metal', '')}"
+
+
+def timestamp(when=None):
+    return (when or datetime.now()).strftime(TIMESTAMP_FORMAT)
+
+
+class _SegmentIndex:
+    """Coarse and block-level index of one segment file"""
+
+    def __init__(self, name):
+        self.name = name
+        self.first_ts = None
+        self.last_ts = None
+        self.count = 0
+        self.size = 0
+        self.users = set()
+        self.ids = set()
+        self.blocks = []        # [(byte offset, first timestamp)]
+        self.id_blocks = {}     # antibody id -> [block numbers]
+
+    def add(self, event, offset, length, block_events):
+        if self.count % block_events == 0:
+            self.blocks.append((offset, event['ts']))
+        block = len(self.blocks) - 1
+        if self.first_ts is None:
+            self.first_ts = event['ts']
+        self.last_ts = event['ts']
+        self.count += 1
+        self.size = offset + length
+        self.users.add(event['user'])
+        ab_id = event.get('antibodyId')
+        if ab_id is not None:
+            self.ids.add(ab_id)
+            blocks = self.id_blocks.setdefault(ab_id, [])
+            if not blocks or blocks[-1] != block:
+                blocks.append(block)
+
+    def manifest_entry(self):
+        return {'name': self.name, 'first_ts': self.first_ts, 'last_ts': self.last_ts,
+                'count': self.count, 'users': sorted(self.users), 'ids': sorted(self.ids)}
+
+    def sidecar(self):
+        return {'size': self.size, 'blocks': self.blocks,
+                'id_blocks': {str(k): v for k, v in self.id_blocks.items()}}
+
+    @classmethod
+    def from_files(cls, entry, sidecar):
+        index = cls(entry['name'])
+        index.first_ts, index.last_ts = entry['first_ts'], entry['last_ts']
+        index.count, index.size = entry['count'], sidecar['size']
+        index.users, index.ids = set(entry['users']), set(entry['ids'])
+        index.blocks = [tuple(b) for b in sidecar['blocks']]
+        index.id_blocks = {int(k): v for k, v in sidecar['id_blocks'].items()}
+        return index
+
+    def may_contain(self, antibody_ids, user, since, until):
+        if not self.count:
+            return False
+        if since is not None and self.last_ts < since:
+            return False
+        if until is not None and self.first_ts >= until:
+            return False
+        if user is not None and user not in self.users:
+            return False
+        if antibody_ids is not None and not self.ids & antibody_ids:
+            return False
+        return True
+
+    def byte_ranges(self, antibody_ids, since, until):
+        """Merged (start, end) offsets of the blocks a query must read"""
+        first = 0
+        last = len(self.blocks)
+        starts = [ts for _, ts in self.blocks]
+        if since is not None:
+            first = max(bisect.bisect_right(starts, since) - 1, 0)
+        if until is not None:
+            last = bisect.bisect_left(starts, until)
+
+        if antibody_ids is None:
+            wanted = range(first, last)
+        else:
+            wanted = sorted({b for ab_id in antibody_ids
+                             for b in self.id_blocks.get(ab_id, ()) if first <= b < last})
+
+        ranges = []
+        for block in wanted:
+            start = self.blocks[block][0]
+            end = self.blocks[block + 1][0] if block + 1 < len(self.blocks) else self.size
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+
+class Journal:
+    """Segmented, indexed, append-only event log"""
+
+    def __init__(self, directory, max_bytes=4 << 20, block_events=128):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.block_events = block_events
+        os.makedirs(directory, exist_ok=True)
+
+        self._sealed = []           # manifest entries of sealed segments
+        self._labels = {}           # label -> [antibody ids]; active segment re-scanned on open
+        self._next_segment = 1
+        self._manifest_stamp = None     # mtime of the manifest last read or written
+        self._active = None
+        self._file = None
+        self._lock = open(os.path.join(directory, LOCK_FILE), 'a') if fcntl else None
+        with self._locked(catch_up=False):
+            self._load_manifest()
+            self._open_active()
+
+    # ---------------- Segment management ----------------
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _locked(self, catch_up=True):
+        """Hold the journal lock, first indexing what other writers added"""
+        if self._lock is None:
+            yield
+            return
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            if catch_up:
+                self._catch_up()
+            yield
+        finally:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+
+    def _load_manifest(self):
+        """Read the manifest if it changed since we last saw it; True when read"""
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if stamp == self._manifest_stamp:
+            return False
+        with open(path) as f:
+            manifest = json.load(f)
+        self._sealed = manifest['segments']
+        self._labels = manifest['labels']
+        self._next_segment = manifest['next_segment']
+        self._manifest_stamp = stamp
+        return True
+
+    def _catch_up(self):
+        if self._load_manifest():
+            # Another writer sealed the segment we were appending to
+            self._file.close()
+            self._open_active()
+        else:
+            self._scan_active()
+
+    def _scan_active(self):
+        """Index complete lines past the end of the active index; returns the new end"""
+        index = self._active
+        offset = index.size
+        with open(self._segment_path(index.name), 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                event = json.loads(line)
+                index.add(event, offset, len(line), self.block_events)
+                self._note_label(event)
+                offset += len(line)
+        return offset
+
+    def _open_active(self):
+        """Re-open (and re-index) the newest unsealed segment, or start one"""
+        name = f'segment-{self._next_segment:06d}.ndjson'
+        self._active = _SegmentIndex(name)
+        path = self._segment_path(name)
+        if os.path.exists(path):
+            offset = self._scan_active()
+            # A torn write at the tail is overwritten by the next append
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        self._file = open(path, 'ab')
+
+    def _note_label(self, event):
+        if event.get('antibodyId') is None:
+            return
+        ids = self._labels.setdefault(event['label'], [])
+        if event['antibodyId'] not in ids:
+            ids.append(event['antibodyId'])
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'segments': self._sealed, 'labels': self._labels,
+                       'next_segment': self._next_segment}, f)
+        os.replace(path + '.tmp', path)
+        self._manifest_stamp = os.stat(path).st_mtime_ns
+
+    def _seal(self):
+        index = self._active
+        self._file.close()
+        with open(self._segment_path(index.name + '.idx'), 'w') as f:
+            json.dump(index.sidecar(), f)
+        self._sealed.append(index.manifest_entry())
+        self._next_segment += 1
+        self._write_manifest()
+        self._open_active()
+
+    def _needs_roll(self, ts):
+        index = self._active
+        if not index.count:
+            return False
+        return index.size >= self.max_bytes or index.first_ts[:7] != ts[:7]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    # ---------------- Writing ----------------
+
+    def append(self, user, action, changes=(), ref=None, when=None):
+        """Record one action; ``changes`` is [(antibody, field, old, new)].
+
+        An action without antibody changes (saving a panel, say) is recorded
+        as a single event with no antibody id.
+        """
+        with self._locked():
+            ts = timestamp(when)
+            if self._needs_roll(ts):
+                self._seal()
+
+            events = []
+            for antibody, field, old, new in (changes or [(None, None, None, None)]):
+                event = {'ts': ts, 'user': user, 'action': action,
+                         'antibodyId': antibody['id'] if antibody else None,
+                         'label': antibody_label(antibody) if antibody else None,
+                         'field': field, 'old': old, 'new': new, 'ref': ref}
+                events.append(event)
+                self._note_label(event)
+
+            # One buffered write per action
+            offset = self._active.size
+            chunk = []
+            for event in events:
+                line = (json.dumps(event, default=str) + '\n').encode('utf-8')
+                self._active.add(event, offset, len(line), self.block_events)
+                offset += len(line)
+                chunk.append(line)
+            self._file.write(b''.join(chunk))
+            self._file.flush()
+        return events
+
+    # ---------------- Querying ----------------
+
+    def segments(self):
+        return [entry['name'] for entry in self._sealed] + [self._active.name]
+
+    def ids_for_label(self, label):
+        return set(self._labels.get(label, ()))
+
+    def _segment_indexes(self, antibody_ids, user, since, until):
+        for entry in self._sealed:
+            probe = _SegmentIndex(entry['name'])
+            probe.first_ts, probe.last_ts, probe.count = entry['first_ts'], entry['last_ts'], entry['count']
+            probe.users, probe.ids = set(entry['users']), set(entry['ids'])
+            if not probe.may_contain(antibody_ids, user, since, until):
+                continue
+            with open(self._segment_path(entry['name'] + '.idx')) as f:
+                yield _SegmentIndex.from_files(entry, json.load(f))
+        if self._active.may_contain(antibody_ids, user, since, until):
+            yield self._active
+
+    def query(self, antibody_id=None, label=None, user=None, field=None, action=None,
+              since=None, until=None):
+        """Events matching every given criterion, oldest first.
+
+        ``since``/``until`` accept datetimes or journal timestamps and form a
+        half-open interval. Only segments whose manifest entry overlaps the
+        query are opened, and only the indexed blocks inside them are read.
+        """
+        if isinstance(since, datetime):
+            since = timestamp(since)
+        if isinstance(until, datetime):
+            until = timestamp(until)
+
+        # Other writers' appends are indexed before the label lookup
+        with self._locked():
+            self._file.flush()
+
+        antibody_ids = None
+        if antibody_id is not None:
+            antibody_ids = {antibody_id}
+        if label is not None:
+            by_label = self.ids_for_label(label)
+            antibody_ids = by_label if antibody_ids is None else antibody_ids & by_label
+            if not antibody_ids:
+                return
+
+        for index in self._segment_indexes(antibody_ids, user, since, until):
+            with open(self._segment_path(index.name), 'rb') as f:
+                for start, end in index.byte_ranges(antibody_ids, since, until):
+                    f.seek(start)
+                    for line in f.read(end - start).splitlines():
+                        event = json.loads(line)
+                        if since is not None and event['ts'] < since:
+                            continue
+                        if until is not None and event['ts'] >= until:
+                            continue
+                        if antibody_ids is not None and event['antibodyId'] not in antibody_ids:
+                            continue
+                        if label is not None and event['label'] != label:
+                            continue
+                        if user is not None and event['user'] != user:
+                            continue
+                        if field is not None and event['field'] != field:
+                            continue
+                        if action is not None and event['action'] != action:
+                            continue
+                        yield event
@@ -0,0 +1,173 @@
+"""Lots (vials) of each conjugate, drawn oldest-expiring first.
+
+An antibody's ``stockVolume`` is the total of its lots; the store updates
+both in one transaction. LotIndex mirrors the lots in memory. A heap per
+antibody orders its non-empty lots by expiry, so planning a draw only
+looks at the vials it takes from. A sorted (expiry, lot id) list of the
+non-empty lots answers "what expires before this date" with two
+bisections instead of a scan.
+"""
+
+import bisect
+import heapq
+from datetime import date, timedelta
+
+
+NO_EXPIRY = '9999-12-31'        # lots without an expiry date are drawn last
+EXPIRY_WARNING_DAYS = 30
+EPSILON = 1e-9                  # float slack between the stock total and its lots
+
+
+def draw_order(lot):
+    """Heap key: earliest expiry first, then oldest conjugation, then oldest lot"""
+    return (lot['expiry'] or NO_EXPIRY, lot['dateConjugated'], lot['id'])
+
+
+def days_from(today, days):
+    """ISO date ``days`` after ``today`` (a date, or None for today)"""
+    return ((today or date.today()) + timedelta(days=days)).isoformat()
+
+
+class LotIndex:
+    """Lots by id and by antibody, with draw-order heaps and an expiry index.
+
+    Heap entries are never removed in place; an entry is live only while
+    its lot still exists, holds stock and has the same draw order.
+    """
+
+    def __init__(self, lots=()):
+        self._lots = {}             # lot id -> record
+        self._by_antibody = {}      # antibody id -> {lot id, ...}
+        self._heaps = {}            # antibody id -> [draw_order(lot)], may hold stale entries
+        self._expiry = []           # sorted [(expiry, lot id)] of non-empty lots with an expiry
+        for lot in lots:
+            self._index(lot)
+
+    def __len__(self):
+        return len(self._lots)
+
+    def get(self, lot_id):
+        return self._lots.get(lot_id)
+
+    def for_antibody(self, ab_id):
+        """Every lot of one antibody (empty ones too), in draw order"""
+        return sorted((self._lots[i] for i in self._by_antibody.get(ab_id, ())), key=draw_order)
+
+    # ---------------- Keeping the indexes in step ----------------
+
+    def _live(self, entry):
+        lot = self._lots.get(entry[-1])
+        return lot is not None and lot['volume'] > 0 and draw_order(lot) == entry
+
+    def _index(self, lot):
+        self._lots[lot['id']] = lot
+        self._by_antibody.setdefault(lot['antibodyId'], set()).add(lot['id'])
+        if lot['volume'] > 0:
+            heap = self._heaps.setdefault(lot['antibodyId'], [])
+            heapq.heappush(heap, draw_order(lot))
+            if lot['expiry']:
+                bisect.insort(self._expiry, (lot['expiry'], lot['id']))
+
+    def _unindex(self, lot):
+        if lot['volume'] > 0 and lot['expiry']:
+            key = (lot['expiry'], lot['id'])
+            i = bisect.bisect_left(self._expiry, key)
+            if i < len(self._expiry) and self._expiry[i] == key:
+                del self._expiry[i]
+
+    def add(self, lot):
+        self._index(lot)
+
+    def remove_antibody(self, ab_id):
+        for lot_id in self._by_antibody.pop(ab_id, ()):
+            self._unindex(self._lots.pop(lot_id))
+        self._heaps.pop(ab_id, None)
+
+    def replace_antibody(self, ab_id, lots):
+        """Swap in an antibody's lots as reloaded from the store"""
+        self.remove_antibody(ab_id)
+        for lot in lots:
+            self._index(lot)
+
+    def set_volumes(self, volumes):
+        """Apply the {lot id: volume} the store wrote"""
+        for lot_id, volume in volumes.items():
+            lot = self._lots.get(lot_id)
+            if lot is None or lot['volume'] == volume:
+                continue
+            was_empty = lot['volume'] <= 0
+            self._unindex(lot)
+            lot['volume'] = volume
+            if volume > 0:
+                if lot['expiry']:
+                    bisect.insort(self._expiry, (lot['expiry'], lot_id))
+                if was_empty:
+                    heapq.heappush(self._heaps.setdefault(lot['antibodyId'], []), draw_order(lot))
+
+    # ---------------- Allocation ----------------
+
+    def allocate(self, ab_id, amount, today=None, include_expired=False):
+        """Plan drawing ``amount`` from an antibody's lots, oldest-expiring first.
+
+        Lots past their expiry date on ``today`` (default: the current
+        date) are skipped, so a run is never planned on expired reagent,
+        unless ``include_expired`` (for writing stock down). Returns
+        ([(lot id, volume)], uncovered), where ``uncovered`` is what the
+        usable lots could not supply. Nothing changes until the store has
+        written the draws and ``set_volumes`` applies them.
+        """
+        first_usable = '' if include_expired else (today or date.today()).isoformat()
+        heap = self._heaps.get(ab_id, [])
+        draws, taken, seen = [], [], set()
+        remaining = amount
+        while heap and remaining > EPSILON:
+            entry = heapq.heappop(heap)
+            if entry[-1] in seen or not self._live(entry):
+                continue        # stale or duplicate entries are dropped for good
+            seen.add(entry[-1])
+            taken.append(entry)
+            lot = self._lots[entry[-1]]
+            if lot['expiry'] and lot['expiry'] < first_usable:
+                continue        # expired: kept in the heap, but not drawn
+            volume = min(lot['volume'], remaining)
+            draws.append((entry[-1], volume))
+            remaining -= volume
+        for entry in taken:
+            heapq.heappush(heap, entry)
+        return draws, max(remaining, 0.0)
+
+    def deposit_lot(self, ab_id):
+        """Lot that takes stock returned without a recorded lot: the last to expire"""
+        lots = self.for_antibody(ab_id)
+        return lots[-1]['id'] if lots else None
+
+    def next_expiry(self, ab_id):
+        """Expiry of the lot that will be drawn next, or None"""
+        heap = self._heaps.get(ab_id)
+        while heap and not self._live(heap[0]):
+            heapq.heappop(heap)
+        if not heap or heap[0][0] == NO_EXPIRY:
+            return None
+        return heap[0][0]
+
+    # ---------------- Expiry queries ----------------
+
+    def expiring(self, until, since=''):
+        """Non-empty lots expiring in [since, until] (ISO dates), soonest first"""
+        lo = bisect.bisect_left(self._expiry, (since,))
+        hi = bisect.bisect_right(self._expiry, (until, float('inf')))
+        return [self._lots[lot_id] for _, lot_id in self._expiry[lo:hi]]
+
+    def expiring_within(self, days=EXPIRY_WARNING_DAYS, today=None):
+        """Non-empty lots already expired or expiring in the next ``days`` days"""
+        return self.expiring(days_from(today, days))
+
+    def expired(self, today=None):
+        """Non-empty lots whose expiry date has passed"""
+        return self.expiring(days_from(today, -1))
+
+    def available(self, ab_id, on=None):
+        """Volume in an antibody's lots that are unexpired on ``on`` (default today)"""
+        day = (on or date.today()).isoformat()
+        return sum(self._lots[i]['volume'] for i in self._by_antibody.get(ab_id, ())
+                   if not self._lots[i]['expiry'] or self._lots[i]['expiry'] >= day)
@@ -0,0 +1,138 @@
+"""In-memory inventory model with id / (antigen, metal) indexes and panel selection."""
+
+
+class InventoryModel:
+    """Owns the antibody records and keeps lookup indexes in step with them.
+
+    Listeners registered with ``subscribe`` are called as
+    ``listener(event, antibody, changes)`` where ``event`` is ``'add'``,
+    ``'update'`` or ``'remove'`` and ``changes`` maps each edited field to
+    its previous value (empty for add/remove). Bulk inserts send a single
+    ``'add_many'`` event whose ``antibody`` argument is the list of records.
+    """
+
+    def __init__(self, antibodies=()):
+        self._by_id = {}        # id -> record, in insertion order
+        self._by_label = {}     # (antigen, metal) -> {id, ...}
+        self._listeners = []
+        for ab in antibodies:
+            self._index(ab)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, ab_id):
+        return ab_id in self._by_id
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, event, antibody, changes=None):
+        for listener in self._listeners:
+            listener(event, antibody, changes or {})
+
+    # ---------------- Lookups ----------------
+
+    def get(self, ab_id):
+        return self._by_id.get(ab_id)
+
+    def find(self, antigen, metal):
+        """Records conjugated as (antigen, metal), usually zero or one"""
+        return [self._by_id[i] for i in self._by_label.get((antigen, metal), ())]
+
+    def resolve(self, ids):
+        """Records for the given ids, skipping ids no longer in inventory"""
+        return [self._by_id[i] for i in ids if i in self._by_id]
+
+    # ---------------- Mutations ----------------
+
+    def _index(self, antibody):
+        self._by_id[antibody['id']] = antibody
+        self._by_label.setdefault((antibody['antigen'], antibody['metal']), set()).add(antibody['id'])
+
+    def _unindex_label(self, ab_id, antigen, metal):
+        ids = self._by_label.get((antigen, metal))
+        if ids is not None:
+            ids.discard(ab_id)
+            if not ids:
+                del self._by_label[(antigen, metal)]
+
+    def add(self, antibody):
+        self._index(antibody)
+        self._notify('add', antibody)
+
+    def add_many(self, antibodies):
+        for ab in antibodies:
+            self._index(ab)
+        self._notify('add_many', antibodies)
+
+    def remove(self, ab_id):
+        antibody = self._by_id.pop(ab_id)
+        self._unindex_label(ab_id, antibody['antigen'], antibody['metal'])
+        self._notify('remove', antibody)
+        return antibody
+
+    def update(self, ab_id, **fields):
+        """Edit fields of one record in place; returns {field: old value}"""
+        antibody = self._by_id[ab_id]
+        changes = {f: antibody.get(f) for f, v in fields.items() if antibody.get(f) != v}
+        if not changes:
+            return changes
+        if 'antigen' in changes or 'metal' in changes:
+            self._unindex_label(ab_id, antibody['antigen'], antibody['metal'])
+            antibody.update(fields)
+            self._index(antibody)
+        else:
+            antibody.update(fields)
+        self._notify('update', antibody, changes)
+        return changes
+
+    def adjust_stock(self, ab_id, delta):
+        antibody = self._by_id[ab_id]
+        return self.update(ab_id, stockVolume=antibody['stockVolume'] + delta)
+
+
+class PanelSelection:
+    """Insertion-ordered, set-backed selection of antibody ids"""
+
+    def __init__(self, model):
+        self.model = model
+        self._ids = {}          # id -> None; a dict keeps click order
+
+        model.subscribe(self._on_inventory_change)
+
+    def _on_inventory_change(self, event, antibody, changes):
+        if event == 'remove':
+            self._ids.pop(antibody['id'], None)
+
+    def __contains__(self, ab_id):
+        return ab_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __bool__(self):
+        return bool(self._ids)
+
+    def __iter__(self):
+        """Selected records in the order they were picked"""
+        return iter(self.model.resolve(list(self._ids)))
+
+    def ids(self):
+        return list(self._ids)
+
+    def set(self, ab_id, selected):
+        if selected:
+            if ab_id in self.model:
+                self._ids.setdefault(ab_id, None)
+        else:
+            self._ids.pop(ab_id, None)
+
+    def replace(self, ids):
+        self._ids = dict.fromkeys(i for i in ids if i in self.model)
+
+    def clear(self):
+        self._ids.clear()
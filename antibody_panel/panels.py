@@ -0,0 +1,143 @@
+"""Saved panel library with a token-prefix name index and cached labels.
+
+Each saved panel's antibody summary ("CD3 - 170Er, CD4 - 145Nd") is built
+once and cached. A reverse map from antibody id to the panels referencing it
+invalidates only the affected summaries when an antibody is renamed, added
+or removed. Name filtering looks query words up in a prefix index instead of
+scanning every panel.
+"""
+
+import bisect
+import re
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+MAX_PREFIX = 24
+
+
+def _tokens(name):
+    return _TOKEN_RE.findall(name.lower())
+
+
+def _prefixes(name):
+    prefixes = set()
+    for token in _tokens(name):
+        for i in range(1, min(len(token), MAX_PREFIX) + 1):
+            prefixes.add(token[:i])
+    return prefixes
+
+
+class SavedPanelIndex:
+    """Saved panels by id, listed A-Z by name"""
+
+    def __init__(self, model, panels=()):
+        self.model = model
+        self._by_id = {}
+        self._order = []            # sorted [(lowered name, panel id)]
+        self._ranks = None          # panel id -> position in _order, built lazily
+        self._names = {}            # lowered name -> panel id
+        self._prefixes = {}         # token prefix -> {panel id, ...}
+        self._referenced_by = {}    # antibody id -> {panel id, ...}
+        self._labels = {}           # panel id -> (antibody count, summary text)
+        for panel in panels:
+            self._index(panel)
+            self._order.append((panel['name'].lower(), panel['id']))
+        self._order.sort()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __bool__(self):
+        return bool(self._by_id)
+
+    def __iter__(self):
+        return iter([self._by_id[i] for _, i in self._order])
+
+    def _index(self, panel):
+        panel_id = panel['id']
+        self._by_id[panel_id] = panel
+        self._names[panel['name'].lower()] = panel_id
+        for prefix in _prefixes(panel['name']):
+            self._prefixes.setdefault(prefix, set()).add(panel_id)
+        for ab_id in panel['antibodyIds']:
+            self._referenced_by.setdefault(ab_id, set()).add(panel_id)
+
+    # ---------------- Mutations ----------------
+
+    def add(self, panel):
+        self._index(panel)
+        bisect.insort(self._order, (panel['name'].lower(), panel['id']))
+        self._ranks = None
+
+    def remove(self, panel_id):
+        panel = self._by_id.pop(panel_id, None)
+        if panel is None:
+            return None
+        self._names.pop(panel['name'].lower(), None)
+        for prefix in _prefixes(panel['name']):
+            ids = self._prefixes[prefix]
+            ids.discard(panel_id)
+            if not ids:
+                del self._prefixes[prefix]
+        for ab_id in panel['antibodyIds']:
+            ids = self._referenced_by.get(ab_id)
+            if ids is not None:
+                ids.discard(panel_id)
+                if not ids:
+                    del self._referenced_by[ab_id]
+        self._labels.pop(panel_id, None)
+        key = (panel['name'].lower(), panel_id)
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+        self._ranks = None
+        return panel
+
+    def invalidate_antibody(self, ab_id):
+        """Drop cached summaries of panels using this antibody; returns their ids"""
+        panel_ids = self._referenced_by.get(ab_id, ())
+        for panel_id in panel_ids:
+            self._labels.pop(panel_id, None)
+        return set(panel_ids)
+
+    # ---------------- Queries ----------------
+
+    def get(self, panel_id):
+        return self._by_id.get(panel_id)
+
+    def has_name(self, name):
+        return name.lower() in self._names
+
+    def find(self, name):
+        """The panel with this name, ignoring case, or None"""
+        panel_id = self._names.get(name.lower())
+        return None if panel_id is None else self._by_id[panel_id]
+
+    def labels(self, panel):
+        """(number of antibodies still in inventory, "antigen - metal" summary)"""
+        cached = self._labels.get(panel['id'])
+        if cached is None:
+            antibodies = self.model.resolve(panel['antibodyIds'])
+            cached = self._labels[panel['id']] = (
+                len(antibodies),
+                ', '.join(f"{ab['antigen']} - {ab['metal']}" for ab in antibodies))
+        return cached
+
+    def search(self, query):
+        """Panels A-Z whose name has a word starting with each query word"""
+        words = _tokens(query)
+        if not words:
+            return list(self)
+
+        matches = None
+        for word in sorted(words, key=len, reverse=True):
+            ids = self._prefixes.get(word[:MAX_PREFIX], set())
+            matches = set(ids) if matches is None else matches & ids
+            if not matches:
+                return []
+        if any(len(word) > MAX_PREFIX for word in words):
+            matches = {i for i in matches
+                       if all(any(t.startswith(w) for t in _tokens(self._by_id[i]['name']))
+                              for w in words)}
+        if self._ranks is None:
+            self._ranks = {panel_id: i for i, (_, panel_id) in enumerate(self._order)}
+        return [self._by_id[i] for i in sorted(matches, key=self._ranks.__getitem__)]
@@ -0,0 +1,162 @@
+"""Incremental substring index shared by the Build Panel and Inventory searches.
+
+Every indexed field is lowered once and broken into all of its 1-, 2- and
+3-character grams. Queries of up to three characters are answered directly
+from the posting sets; longer queries intersect the postings of their
+trigrams and verify the few remaining candidates with ``in``.
+"""
+
+import bisect
+import re
+
+
+SEARCH_FIELDS = ('antigen', 'metal', 'clone')
+MAX_GRAM = 3
+
+_MASS_RE = re.compile(r"(\d+)")
+
+
+def metal_mass(metal):
+    """Mass number at the start of a metal label ('146Nd' -> 146), 0 if absent"""
+    m = _MASS_RE.match(metal or '')
+    return int(m.group(1)) if m else 0
+
+
+def _grams(text):
+    return {text[i:i + n] for n in range(1, MAX_GRAM + 1)
+            for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """Lowered fields, n-gram postings and a presorted (antigen, mass) order"""
+
+    def __init__(self, antibodies=(), fields=SEARCH_FIELDS):
+        self.fields = fields
+        self._records = {}                      # id -> antibody record
+        self._lowered = {}                      # id -> {field: lowered text}
+        self._postings = {f: {} for f in fields}  # field -> gram -> ids
+        self._masses = {}                       # id -> parsed mass number
+        self._keys = {}                         # id -> (antigen, mass) sort key
+        self._order = []                        # sorted [(sort key, id)]
+        self._ranks = None                      # id -> position in _order, built lazily
+        self._ordered = None                    # records in _order, built lazily
+
+        for ab in antibodies:
+            self._order.append(self._index(ab))
+        self._order.sort()
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, antibody):
+        if antibody['id'] in self._records:
+            self.remove(antibody['id'])
+        key = self._index(antibody)
+        bisect.insort(self._order, key)
+        self._ranks = self._ordered = None
+
+    def add_many(self, antibodies):
+        for ab in antibodies:
+            if ab['id'] in self._records:
+                self.remove(ab['id'])
+            self._order.append(self._index(ab))
+        self._order.sort()
+        self._ranks = self._ordered = None
+
+    def _index(self, antibody):
+        ab_id = antibody['id']
+        lowered = {f: str(antibody.get(f, '')).lower() for f in self.fields}
+        for field, text in lowered.items():
+            postings = self._postings[field]
+            for gram in _grams(text):
+                ids = postings.get(gram)
+                if ids is None:
+                    postings[gram] = {ab_id}
+                else:
+                    ids.add(ab_id)
+
+        mass = metal_mass(antibody.get('metal'))
+        self._records[ab_id] = antibody
+        self._lowered[ab_id] = lowered
+        self._masses[ab_id] = mass
+        key = self._keys[ab_id] = (lowered.get('antigen', ''), mass)
+        return (key, ab_id)
+
+    def update(self, antibody):
+        """Re-index a record after an in-place edit"""
+        self.add(antibody)
+
+    def remove(self, ab_id):
+        antibody = self._records.pop(ab_id, None)
+        if antibody is None:
+            return
+        lowered = self._lowered.pop(ab_id)
+        del self._masses[ab_id]
+        key = (self._keys.pop(ab_id), ab_id)
+
+        for field, text in lowered.items():
+            postings = self._postings[field]
+            for gram in _grams(text):
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(ab_id)
+                    if not ids:
+                        del postings[gram]
+
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+        self._ranks = self._ordered = None
+
+    def mass(self, ab_id):
+        return self._masses.get(ab_id, 0)
+
+    def sort_key(self, ab_id):
+        """The (sort key, id) entry that places a record among search results"""
+        return (self._keys[ab_id], ab_id)
+
+    def matches(self, ab_id, query, fields=None):
+        """Whether one record would be found by ``search(query, fields)``"""
+        lowered = self._lowered.get(ab_id)
+        query = query.lower()
+        return lowered is not None and any(query in lowered[f] for f in fields or self.fields)
+
+    def _matching_ids(self, query, fields):
+        matches = set()
+        for field in fields:
+            postings = self._postings[field]
+            if len(query) <= MAX_GRAM:
+                matches |= postings.get(query, set())
+                continue
+
+            grams = sorted((postings.get(query[i:i + MAX_GRAM], ())
+                            for i in range(len(query) - MAX_GRAM + 1)), key=len)
+            if not grams[0]:
+                continue
+            candidates = set(grams[0]).intersection(*grams[1:])
+            matches.update(ab_id for ab_id in candidates
+                           if query in self._lowered[ab_id][field])
+        return matches
+
+    def search(self, query, fields=None, within=None):
+        """Records whose fields contain ``query``, ordered by (antigen, mass).
+
+        ``within`` restricts the result to a set of ids (e.g. the low-stock
+        set) without walking the rest of the index.
+        """
+        query = query.lower()
+        if not query and within is None:
+            if self._ordered is None:
+                self._ordered = [self._records[ab_id] for _, ab_id in self._order]
+            return list(self._ordered)
+
+        if not query:
+            matches = {ab_id for ab_id in within if ab_id in self._records}
+        else:
+            matches = self._matching_ids(query, fields or self.fields)
+            if within is not None:
+                matches &= within
+        if self._ranks is None:
+            self._ranks = {ab_id: i for i, (_, ab_id) in enumerate(self._order)}
+        records = self._records
+        return [records[ab_id] for ab_id in sorted(matches, key=self._ranks.__getitem__)]
@@ -0,0 +1,508 @@
+"""Optional asyncio HTTP/JSON API for LIMS and instrument PCs.
+
+    GET  /inventory[?q=CD3&low=1]     antibodies ordered by (antigen, mass)
+    GET  /inventory/<id>
+    GET  /panels                      saved panels with their antibody summaries
+    POST /panels/check                {"panel": NAME | "antibodyIds": [...], "cells": 8 | [4, 8]}
+    POST /panels/execute              {"panel" | "antibodyIds", "cells", "name", "user"}
+    GET  /history[?since=&until=&user=]   NDJSON, newest first, streamed
+
+The server keeps its own PanelService on the database the GUI uses. It
+acts as one more station, so its executions go through the same atomic
+stock checks and appear in open GUI sessions on their next poll. That
+service lives on one worker thread (SQLite connections belong to the thread
+that opened them). Requests arriving together are handed to it as one
+batch: the change feed is polled once, and feasibility checks share one
+vectorized engine pass. History streams come from a small pool of
+read-only connections on other threads, so a long export never holds up
+executions.
+
+The HTTP layer is a minimal HTTP/1.1 implementation (keep-alive, chunked
+responses) on asyncio streams, so nothing beyond the standard library is
+needed. It binds to localhost by default and has no authentication.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from .core import DuplicateName, MissingInput, PanelError, PanelService, UnknownPanel
+from .store import (InsufficientStock, PanelStore, ReaderPool, VersionConflict,
+                    default_db_path, history_pages)
+from .volumes import STANDARD_CELL_COUNT
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+BATCH_WINDOW = 0.002            # seconds to let concurrent requests join a batch
+MAX_BATCH = 256
+HISTORY_PAGE = 500              # rows per streamed chunk
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+
+STATUS_TEXT = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 411: 'Length Required',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+# Most specific first
+ERROR_STATUS = ((UnknownPanel, 404), (DuplicateName, 409), (InsufficientStock, 409),
+                (VersionConflict, 409), (PanelError, 400))
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        super().__init__(message)
+
+
+def _json_bytes(obj):
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _cell_counts(value):
+    counts = value if isinstance(value, list) else [value]
+    if not counts or not all(isinstance(c, (int, float)) and not isinstance(c, bool) and c > 0
+                             for c in counts):
+        raise HTTPError(400, "'cells' must be a positive number or a list of them")
+    return [float(c) for c in counts]
+
+
+def _error_result(exc):
+    """(status, JSON body) for an exception raised while answering a request"""
+    if isinstance(exc, HTTPError):
+        return exc.status, _json_bytes({'error': str(exc)})
+    for error, status in ERROR_STATUS:
+        if isinstance(exc, error):
+            body = {'error': str(exc)}
+            if isinstance(exc, InsufficientStock):
+                body['shortfalls'] = [
+                    {'id': ab_id, 'available': available, 'required': required}
+                    for ab_id, available, required in exc.shortfalls]
+            return status, _json_bytes(body)
+    return 500, _json_bytes({'error': f"{type(exc).__name__}: {exc}"})
+
+
+class _Batcher:
+    """Queue calls from the event loop and run them on ``executor`` in batches.
+
+    Calls made while a batch is running form the next batch, so under load
+    the worker thread sees a few large batches instead of many small hops.
+    """
+
+    def __init__(self, executor, run_batch, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.executor = executor
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._task = None
+
+    async def submit(self, op, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, args, future))
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(self.window)
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, self.run_batch, [(op, args) for op, args, _ in batch])
+                except Exception as exc:
+                    results = [(500, _json_bytes({'error': str(exc)}))] * len(batch)
+                for (_, _, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._task = None
+
+
+class PanelServer:
+    """JSON API over one database; ``start`` inside a running event loop"""
+
+    def __init__(self, db_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT, readers=4,
+                 user='api'):
+        self.db_path = db_path or default_db_path()
+        self.host = host
+        self.port = port
+        self.user = user
+        self.service = None
+        self.search_index = None
+        self.readers = readers
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='panel-api')
+        self._reader_threads = ThreadPoolExecutor(max_workers=readers,
+                                                  thread_name_prefix='panel-api-read')
+        self._readers = None
+        self._reader_slots = None
+        self._batcher = _Batcher(self._worker, self._run_batch)
+        self._server = None
+
+    # ---------------- Lifecycle ----------------
+
+    def _open(self):
+        from .search import SearchIndex
+        self.service = PanelService(PanelStore(self.db_path), user=self.user)
+        self.search_index = SearchIndex(self.service.inventory)
+        self.service.inventory.subscribe(self._on_inventory_change)
+
+    def _on_inventory_change(self, event, antibody, changes):
+        if event == 'add':
+            self.search_index.add(antibody)
+        elif event == 'add_many':
+            self.search_index.add_many(antibody)
+        elif event == 'remove':
+            self.search_index.remove(antibody['id'])
+        elif set(changes) & set(self.search_index.fields):
+            self.search_index.update(antibody)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # The service's connection must be opened on the thread that will use it
+        await loop.run_in_executor(self._worker, self._open)
+        self._readers = ReaderPool(self.db_path, self.readers)
+        self._reader_slots = asyncio.Semaphore(self._readers.size)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        loop = asyncio.get_running_loop()
+        if self.service is not None:
+            await loop.run_in_executor(self._worker, self.service.close)
+        if self._readers is not None:
+            self._readers.close()
+        self._worker.shutdown()
+        self._reader_threads.shutdown()
+
+    async def serve_forever(self, started=None):
+        """Start, call ``started(self)`` once listening, and serve until cancelled"""
+        await self.start()
+        if started is not None:
+            started(self)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    # ---------------- Worker thread ----------------
+
+    def _run_batch(self, calls):
+        """Answer a batch of (op, args) calls as [(status, body bytes)]"""
+        self.service.sync()
+        results = [None] * len(calls)
+        checks = [i for i, (op, _) in enumerate(calls) if op == 'check']
+        if checks:
+            for i, result in zip(checks, self._checks([calls[i][1][0] for i in checks])):
+                results[i] = result
+        for i, (op, args) in enumerate(calls):
+            if results[i] is None:
+                results[i] = self._answer(getattr(self, f'_op_{op}'), *args)
+        return results
+
+    def _answer(self, handler, *args):
+        try:
+            status, body = handler(*args)
+        except Exception as exc:
+            return _error_result(exc)
+        return status, _json_bytes(body)
+
+    def _antibody_json(self, ab):
+        record = dict(ab)
+        record['low'] = self.service.alerts.is_low(ab['id'])
+        record['daysLeft'] = self.service.forecast.days_left(ab['id'])
+        return record
+
+    def _panel_ids(self, payload):
+        """(antibody ids, saved panel name or None) named by a request body"""
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+        if payload.get('panel') is not None:
+            panel = self.service.find_saved_panel(str(payload['panel']))
+            return panel['antibodyIds'], panel['name']
+        ids = payload.get('antibodyIds')
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise HTTPError(400, "give 'panel' (a saved panel name) or 'antibodyIds'")
+        return ids, None
+
+    def _op_inventory(self, query):
+        within = self.service.alerts.low_ids() if query.get('low') in ('1', 'true') else None
+        found = self.search_index.search(query.get('q', ''), within=within)
+        return 200, [self._antibody_json(ab) for ab in found]
+
+    def _op_antibody(self, ab_id):
+        ab = self.service.inventory.get(ab_id)
+        if ab is None:
+            raise HTTPError(404, f"No antibody with id {ab_id}")
+        return 200, self._antibody_json(ab)
+
+    def _op_panels(self):
+        panels = []
+        for panel in self.service.saved_panels:
+            count, summary = self.service.saved_panels.labels(panel)
+            panels.append(dict(panel, antibodyCount=count, summary=summary))
+        return 200, panels
+
+    def _op_execute(self, payload):
+        ids, panel_name = self._panel_ids(payload)
+        name = str(payload.get('name') or panel_name or '')
+        if not name:
+            raise MissingInput("'name' is required when executing by 'antibodyIds'")
+        cells, = _cell_counts(payload.get('cells', STANDARD_CELL_COUNT))
+        user = str(payload.get('user') or self.user)
+        return 201, self.service.execute_panel(name, ids, cells, user)
+
+    def _checks(self, payloads):
+        """Feasibility of every requested panel, evaluated in one engine pass"""
+        results = [None] * len(payloads)
+        panels = []                 # (result slot, known ids, unknown ids, cell counts)
+        for i, payload in enumerate(payloads):
+            try:
+                ids, _ = self._panel_ids(payload)
+                cells = _cell_counts(payload.get('cells', STANDARD_CELL_COUNT))
+                known = [ab_id for ab_id in ids if ab_id in self.service.inventory]
+                if not known:
+                    raise HTTPError(400, "none of the antibodies are in inventory")
+                panels.append((i, known, [ab_id for ab_id in ids if ab_id not in known], cells))
+            except Exception as exc:
+                results[i] = _error_result(exc)
+        if not panels:
+            return results
+
+        engine = self.service.engine
+        max_cells = engine.scenarios([known for _, known, _, _ in panels], []).max_cells.tolist()
+        all_ids = [ab_id for _, known, _, _ in panels for ab_id in known]
+        rows = engine.rows(all_ids)
+        base = (engine.volume_per_test[rows] * engine.factor[rows]).tolist()
+        available = engine.stock[rows].tolist()
+
+        start = 0
+        for (i, known, unknown, cells), limit in zip(panels, max_cells):
+            stop = start + len(known)
+            checks = []
+            for count in cells:
+                scale = count / STANDARD_CELL_COUNT
+                shortfalls = [{'id': ab_id, 'required': b * scale, 'available': a}
+                              for ab_id, b, a in zip(known, base[start:stop], available[start:stop])
+                              if b * scale > a]
+                checks.append({'cells': count, 'feasible': not shortfalls,
+                               'totalVolume': sum(base[start:stop]) * scale,
+                               'shortfalls': shortfalls})
+            results[i] = 200, _json_bytes({
+                'antibodyIds': known, 'unknownIds': unknown,
+                'maxCells': None if limit == float('inf') else limit, 'checks': checks})
+            start = stop
+        return results
+
+    # ---------------- HTTP ----------------
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' \
+                    else connection == 'keep-alive'
+                try:
+                    keep_alive = await self._dispatch(method, target, version, body, writer,
+                                                      keep_alive)
+                except HTTPError as exc:
+                    _send(writer, exc.status, _json_bytes({'error': str(exc)}), keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as exc:
+            # The request itself could not be parsed; answer and hang up
+            _send(writer, exc.status, _json_bytes({'error': str(exc)}), False)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, version, body, writer, keep_alive):
+        """Answer one request; returns whether the connection can take another"""
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = path.strip('/').split('/')
+
+        if parts[0] == 'history' and len(parts) == 1:
+            _allow(method, 'GET')
+            return await self._stream_history(query, version, writer, keep_alive)
+
+        if parts == ['inventory']:
+            _allow(method, 'GET')
+            status, payload = await self._batcher.submit('inventory', query)
+        elif parts[0] == 'inventory' and len(parts) == 2:
+            _allow(method, 'GET')
+            if not parts[1].isdigit():
+                raise HTTPError(404, f"No antibody with id {parts[1]}")
+            status, payload = await self._batcher.submit('antibody', int(parts[1]))
+        elif parts == ['panels']:
+            _allow(method, 'GET')
+            status, payload = await self._batcher.submit('panels')
+        elif parts in (['panels', 'check'], ['panels', 'execute']):
+            _allow(method, 'POST')
+            try:
+                data = json.loads(body or b'{}')
+            except ValueError:
+                raise HTTPError(400, "request body is not valid JSON")
+            status, payload = await self._batcher.submit(parts[1], data)
+        else:
+            raise HTTPError(404, f"No such endpoint: {path}")
+        _send(writer, status, payload, keep_alive)
+        return keep_alive
+
+    async def _stream_history(self, query, version, writer, keep_alive):
+        """NDJSON history, one chunk per page of rows read on a reader thread.
+
+        HTTP/1.0 clients cannot take chunks; they get the rows unframed and
+        the connection closes at the end.
+        """
+        loop = asyncio.get_running_loop()
+        chunked = version == 'HTTP/1.1'
+        keep_alive = keep_alive and chunked
+        async with self._reader_slots:
+            conn = self._readers.acquire()         # never waits: the semaphore holds a slot
+            try:
+                pages = history_pages(conn, query.get('since'), query.get('until'),
+                                      query.get('user'), HISTORY_PAGE)
+
+                def next_chunk():
+                    page = next(pages, None)
+                    if page is None:
+                        return None
+                    return b''.join(_json_bytes(entry) + b'\n' for entry in page)
+
+                head = ['HTTP/1.1 200 OK', 'Content-Type: application/x-ndjson']
+                if chunked:
+                    head.append('Transfer-Encoding: chunked')
+                if not keep_alive:
+                    head.append('Connection: close')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                while True:
+                    data = await loop.run_in_executor(self._reader_threads, next_chunk)
+                    if data is None:
+                        break
+                    writer.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+                    await writer.drain()
+                if chunked:
+                    writer.write(b'0\r\n\r\n')
+                await loop.run_in_executor(self._reader_threads, pages.close)
+            finally:
+                self._readers.release(conn)
+        return keep_alive
+
+
+def _allow(method, allowed):
+    if method != allowed:
+        raise HTTPError(405, f"Use {allowed}")
+
+
+async def _read_request(reader):
+    """(method, target, version, headers, body), or None at end of stream"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(400, "too many headers")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise HTTPError(411, "send a Content-Length instead of a chunked body")
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPError(400, "malformed Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, version.upper(), headers, body
+
+
+def _send(writer, status, body, keep_alive):
+    head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            'Content-Type: application/json', f'Content-Length: {len(body)}']
+    if not keep_alive:
+        head.append('Connection: close')
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+
+# ---------------- Running ----------------
+
+class ServerThread(threading.Thread):
+    """Runs a PanelServer on its own event loop, e.g. beside the Tk mainloop"""
+
+    def __init__(self, **options):
+        super().__init__(name='panel-api-loop', daemon=True)
+        self.server = PanelServer(**options)
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self.error = None
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.server.start())
+        except Exception as exc:
+            self.error = exc
+            self._ready.set()
+            return
+        self._ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+
+    def start(self):
+        """Start serving; raises if the port cannot be bound"""
+        super().start()
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop(self, timeout=5.0):
+        if self.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.join(timeout)
+
+
+def start_from_env(db_path=None):
+    """ServerThread on the [host:]port in ANTIBODY_PANEL_API, or None when it is unset.
+
+    A value without a valid port raises ValueError before anything starts.
+    """
+    value = os.environ.get('ANTIBODY_PANEL_API')
+    if not value:
+        return None
+    host, _, port = value.rpartition(':')
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"ANTIBODY_PANEL_API={value!r} is not [host:]port")
+    return ServerThread(db_path=db_path, host=host or DEFAULT_HOST, port=int(port)).start()
@@ -0,0 +1,111 @@
+"""Channel conflict and spillover checks for the live panel selection.
+
+A mass x mass crosstalk matrix is built once from the channel rules. The
+checker keeps a per-mass count of selected conjugates and the spillover
+each channel receives (``counts @ CROSSTALK``). A checkbox toggle adds or
+subtracts one matrix row, so the summary never recomputes the whole
+selection.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .channels import SPILLOVER_RULES
+
+MAX_MASS = 256
+SPILL_WARN_FRACTION = 0.01      # received spillover worth mentioning
+
+
+def crosstalk_matrix(max_mass=MAX_MASS):
+    """``matrix[source, target]``: fraction of source signal read in target"""
+    matrix = np.zeros((max_mass, max_mass))
+    sources = np.arange(1, max_mass)
+    for offset, fraction, _ in SPILLOVER_RULES:
+        targets = sources + offset
+        ok = (targets > 0) & (targets < max_mass)
+        matrix[sources[ok], targets[ok]] = fraction
+    return matrix
+
+
+CROSSTALK = crosstalk_matrix()
+_REASONS = {offset: reason for offset, _, reason in SPILLOVER_RULES}
+
+Warning = namedtuple('Warning', 'kind mass antibody_ids fraction message')
+Warning.__doc__ = """One summary warning: kind is 'conflict' or 'spillover'"""
+
+
+class SpilloverChecker:
+    """Incremental per-mass counts and received spillover for a selection.
+
+    ``mass_of`` maps an antibody id to its mass number (the search index
+    already parses these).
+    """
+
+    def __init__(self, mass_of):
+        self.mass_of = mass_of
+        self.counts = np.zeros(MAX_MASS, dtype=np.int64)
+        self.received = np.zeros(MAX_MASS)
+        self._masses = {}           # selected antibody id -> mass in the counts
+
+    def _add(self, ab_id, mass):
+        self._masses[ab_id] = mass
+        if 0 < mass < MAX_MASS:
+            self.counts[mass] += 1
+            self.received += CROSSTALK[mass]
+
+    def _remove(self, ab_id):
+        mass = self._masses.pop(ab_id)
+        if 0 < mass < MAX_MASS:
+            self.counts[mass] -= 1
+            self.received -= CROSSTALK[mass]
+
+    def sync(self, ids):
+        """Bring the counts in line with the selected ids, touching only what changed"""
+        current = {ab_id: self.mass_of(ab_id) for ab_id in ids}
+        for ab_id, mass in list(self._masses.items()):
+            if current.get(ab_id) != mass:
+                self._remove(ab_id)
+        for ab_id, mass in current.items():
+            if ab_id not in self._masses:
+                self._add(ab_id, mass)
+        # Clear float drift once the selection empties
+        if not self._masses:
+            self.received[:] = 0.0
+
+    def warnings(self, label=str):
+        """Conflicts and spillover into selected channels, worst first.
+
+        ``label(antibody_id)`` names antibodies in the messages.
+        """
+        by_mass = {}
+        for ab_id, mass in self._masses.items():
+            by_mass.setdefault(mass, []).append(ab_id)
+
+        warnings = []
+        masses = np.fromiter((m for m in by_mass if 0 < m < MAX_MASS), dtype=np.intp)
+        if not len(masses):
+            return warnings
+
+        # One vectorized pass over the selected channels
+        conflicted = masses[self.counts[masses] > 1]
+        received = self.received[masses]
+        spilled = masses[received >= SPILL_WARN_FRACTION - 1e-9]
+
+        for mass in conflicted.tolist():
+            ids = by_mass[mass]
+            warnings.append(Warning('conflict', mass, ids, 1.0,
+                                    f"{' & '.join(label(i) for i in ids)} share mass {mass}"))
+
+        for mass in spilled.tolist():
+            sources = np.nonzero(CROSSTALK[:, mass] * self.counts)[0].tolist()
+            parts = [f"{' & '.join(label(i) for i in by_mass[s])} ({_REASONS[mass - s]})"
+                     for s in sources]
+            fraction = float(self.received[mass])
+            warnings.append(Warning(
+                'spillover', mass, by_mass[mass], fraction,
+                f"{' & '.join(label(i) for i in by_mass[mass])} receives "
+                f"{fraction:.0%} from {', '.join(parts)}"))
+
+        warnings.sort(key=lambda w: (w.kind != 'conflict', -w.fraction))
+        return warnings
@@ -0,0 +1,714 @@
+"""SQLite persistence for inventory, saved panels and execution history.
+
+The database runs in WAL mode with ``synchronous=NORMAL`` so that every
+mutation is a short transaction touching only the rows it changes; commits
+append to the WAL instead of rewriting the database file.
+
+Several stations may share one database file. Stock is checked and
+decremented in a single conditional UPDATE, edits are guarded by a per-row
+version, and each commit appends to a ``changes`` table that the other
+stations poll (cheaply, through ``PRAGMA data_version``) to pick up what
+changed. WAL needs shared memory, so a database on a network disk must be
+opened in ``shared`` mode, which uses the rollback journal instead.
+
+Stock is held in lots (vials), each with its own volume and expiry; an
+antibody's ``stockVolume`` is the total of its lots and is updated in the
+same transaction as them. Databases from before lots existed get one lot
+per antibody when first opened, without an expiry date since the real one
+is unknown; expired lots are not drawn on, and a guessed date would block
+older stock.
+
+Row ids are assigned by SQLite inside the inserting transaction, so
+stations sharing a file cannot hand out the same id. The id columns are
+AUTOINCREMENT: an id is never reused, even after its row is deleted, so
+history entries keep pointing at the antibodies they drew on.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+
+ANTIBODY_FIELDS = (
+    'antigen', 'clone', 'metal', 'concentration', 'antibodyPerTest',
+    'volumePerTest', 'stockVolume', 'notes', 'dateConjugated',
+    'alertThreshold', 'stainType',
+)
+
+DEFAULT_INVENTORY = [
+    {
+        'id': 1,
+        'antigen': 'CD3',
+        'clone': 'UCHT1',
+        'metal': '170Er',
+        'concentration': 0.5,
+        'antibodyPerTest': 1.0,
+        'volumePerTest': 2.0,
+        'stockVolume': 500.0,
+        'notes': 'Core marker',
+        'dateConjugated': '2024-10-15',
+        'alertThreshold': 50.0
+    },
+    {
+        'id': 2,
+        'antigen': 'CD4',
+        'clone': 'RPA-T4',
+        'metal': '145Nd',
+        'concentration': 0.5,
+        'antibodyPerTest': 1.0,
+        'volumePerTest': 2.0,
+        'stockVolume': 450.0,
+        'notes': 'T-helper cells',
+        'dateConjugated': '2024-10-12',
+        'alertThreshold': 50.0
+    },
+    {
+        'id': 3,
+        'antigen': 'CD8',
+        'clone': 'SK1',
+        'metal': '146Nd',
+        'concentration': 0.5,
+        'antibodyPerTest': 1.0,
+        'volumePerTest': 2.0,
+        'stockVolume': 35.0,
+        'notes': 'Cytotoxic T cells',
+        'dateConjugated': '2024-09-20',
+        'alertThreshold': 50.0
+    }
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS antibodies (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    antigen         TEXT NOT NULL,
+    clone           TEXT NOT NULL DEFAULT '',
+    metal           TEXT NOT NULL DEFAULT '',
+    concentration   REAL NOT NULL DEFAULT 0,
+    antibodyPerTest REAL NOT NULL DEFAULT 0,
+    volumePerTest   REAL NOT NULL DEFAULT 0,
+    stockVolume     REAL NOT NULL DEFAULT 0,
+    notes           TEXT NOT NULL DEFAULT '',
+    dateConjugated  TEXT NOT NULL DEFAULT '',
+    alertThreshold  REAL NOT NULL DEFAULT 50,
+    stainType       TEXT NOT NULL DEFAULT 'Extracellular',
+    version         INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS saved_panels (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT NOT NULL,
+    antibodyIds TEXT NOT NULL,
+    createdBy   TEXT NOT NULL DEFAULT '',
+    createdAt   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS panel_history (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp  TEXT NOT NULL,
+    user       TEXT NOT NULL DEFAULT '',
+    panelName  TEXT NOT NULL,
+    cellCount  REAL NOT NULL,
+    antibodies TEXT NOT NULL,
+    batchId    INTEGER
+);
+CREATE INDEX IF NOT EXISTS panel_history_timestamp ON panel_history (timestamp);
+CREATE TABLE IF NOT EXISTS lots (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    antibodyId     INTEGER NOT NULL,
+    lotNumber      TEXT NOT NULL DEFAULT '',
+    volume         REAL NOT NULL DEFAULT 0,
+    dateConjugated TEXT NOT NULL DEFAULT '',
+    expiry         TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS lots_antibody ON lots (antibodyId);
+CREATE TABLE IF NOT EXISTS changes (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity   TEXT NOT NULL,
+    entityId INTEGER NOT NULL,
+    station  TEXT NOT NULL
+);
+"""
+
+# Entities named in the changes table. Lot changes are recorded against their
+# antibody, whose stock total changes with them
+ANTIBODY, SAVED_PANEL, HISTORY = 'antibody', 'saved_panel', 'history'
+
+# Tables whose ids other rows refer to; older databases created them without
+# AUTOINCREMENT and are rebuilt once so ids are never reused
+ID_TABLES = ('antibodies', 'saved_panels', 'panel_history')
+
+LOT_FIELDS = ('antibodyId', 'lotNumber', 'volume', 'dateConjugated', 'expiry')
+
+# Expiry given to the lot created with a new antibody (added or imported):
+# its conjugation date plus this
+DEFAULT_SHELF_LIFE_DAYS = 365
+
+# One lot holding an antibody's whole stock; a WHERE clause picks the antibodies
+INITIAL_LOT_SQL = f"""
+INSERT INTO lots (antibodyId, volume, dateConjugated, expiry)
+SELECT id, stockVolume, dateConjugated,
+       COALESCE(date(NULLIF(dateConjugated, ''), '+{DEFAULT_SHELF_LIFE_DAYS} days'), '')
+FROM antibodies
+"""
+
+# The same for stock that predates lots, whose expiry is unknown
+LEGACY_LOT_SQL = """
+INSERT INTO lots (antibodyId, volume, dateConjugated, expiry)
+SELECT id, stockVolume, dateConjugated, '' FROM antibodies
+"""
+
+# Change rows kept for stations that fall behind; older ones are pruned
+CHANGE_RETENTION = 10000
+
+
+class InsufficientStock(ValueError):
+    """A conditional stock decrement found less stock than required.
+
+    ``shortfalls`` lists (antibody id, available, required) for every
+    antibody that could not cover its share; nothing was written.
+    """
+
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__(f"Insufficient stock for {len(shortfalls)} antibody(ies)")
+
+
+class VersionConflict(Exception):
+    """The row was changed by another station since it was read"""
+
+    def __init__(self, antibody_id):
+        self.antibody_id = antibody_id
+        super().__init__(f"Antibody {antibody_id} was changed by another station")
+
+
+def shared_mode():
+    """True when ANTIBODY_PANEL_SHARED asks for network-disk safe locking"""
+    return os.environ.get('ANTIBODY_PANEL_SHARED', '').lower() in ('1', 'true', 'yes')
+
+
+def default_db_path():
+    """Database location, overridable with ANTIBODY_PANEL_DB"""
+    path = os.environ.get('ANTIBODY_PANEL_DB')
+    if path:
+        return path
+    return os.path.join(os.path.expanduser('~'), '.antibody_panel', 'panels.db')
+
+
+class PanelStore:
+    """Row-level access to the three persisted collections.
+
+    Pass ``check_same_thread=False`` to open the store on a worker thread
+    and hand it to another; it must still be used by one thread at a time.
+    """
+
+    def __init__(self, path=None, seed=DEFAULT_INVENTORY, shared=None, check_same_thread=True):
+        self.path = path or default_db_path()
+        self.shared = shared_mode() if shared is None else shared
+        self.station = uuid.uuid4().hex
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # Autocommit mode: transactions are opened explicitly in _transaction().
+        # Writers hold the lock for a few statements, so a short wait is enough.
+        self.conn = sqlite3.connect(self.path, isolation_level=None, timeout=10.0,
+                                    check_same_thread=check_same_thread)
+        self.conn.row_factory = sqlite3.Row
+        if self.shared:
+            self.conn.execute('PRAGMA journal_mode=DELETE')
+            self.conn.execute('PRAGMA synchronous=FULL')
+        else:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+
+        with self._transaction() as cur:
+            is_new = not cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'antibodies'").fetchone()
+            has_lots = cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'lots'").fetchone()
+            legacy = [] if is_new else self._rename_legacy_tables(cur)
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    cur.execute(statement)
+            for table in legacy:
+                self._copy_legacy_table(cur, table)
+            columns = {row['name'] for row in cur.execute('PRAGMA table_info(antibodies)')}
+            if 'version' not in columns:
+                cur.execute('ALTER TABLE antibodies ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+            columns = {row['name'] for row in cur.execute('PRAGMA table_info(panel_history)')}
+            if 'batchId' not in columns:
+                cur.execute('ALTER TABLE panel_history ADD COLUMN batchId INTEGER')
+            if is_new and seed:
+                for ab in seed:
+                    self._insert_antibody(cur, ab)
+            if not has_lots:
+                cur.execute(LEGACY_LOT_SQL)
+            cur.execute('DELETE FROM changes WHERE seq <= '
+                        '(SELECT MAX(seq) FROM changes) - ?', (CHANGE_RETENTION,))
+            self._last_seq = cur.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+        self._data_version = self._read_data_version()
+
+    @staticmethod
+    def _rename_legacy_tables(cur):
+        """Move ID_TABLES created without AUTOINCREMENT aside; returns their names"""
+        legacy = []
+        for table in ID_TABLES:
+            row = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (table,)).fetchone()
+            if row is not None and 'AUTOINCREMENT' not in row[0].upper():
+                cur.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+                legacy.append(table)
+        # The index moved with its table; the schema recreates it on the new one
+        if 'panel_history' in legacy:
+            cur.execute('DROP INDEX IF EXISTS panel_history_timestamp')
+        return legacy
+
+    @staticmethod
+    def _copy_legacy_table(cur, table):
+        new = {row['name'] for row in cur.execute(f'PRAGMA table_info({table})')}
+        columns = ', '.join(row['name'] for row in cur.execute(
+            f'PRAGMA table_info({table}_legacy)') if row['name'] in new)
+        cur.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_legacy')
+        cur.execute(f'DROP TABLE {table}_legacy')
+
+    @contextmanager
+    def _transaction(self):
+        cur = self.conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            yield cur
+        except BaseException:
+            cur.execute('ROLLBACK')
+            raise
+        else:
+            cur.execute('COMMIT')
+
+    def close(self):
+        self.conn.close()
+
+    # ---------------- Change feed ----------------
+
+    def _changed(self, cur, entity, entity_ids):
+        cur.executemany('INSERT INTO changes (entity, entityId, station) VALUES (?, ?, ?)',
+                        [(entity, i, self.station) for i in entity_ids])
+
+    def _read_data_version(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def poll_changes(self):
+        """(entity, id) pairs committed by other stations since the last poll.
+
+        Returns [] without touching the tables when nothing was committed,
+        and None when this station fell further behind than the retained
+        change rows, in which case everything should be reloaded.
+        """
+        data_version = self._read_data_version()
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+
+        rows = self.conn.execute(
+            'SELECT seq, entity, entityId, station FROM changes WHERE seq > ? ORDER BY seq',
+            (self._last_seq,)).fetchall()
+        if rows and rows[0]['seq'] > self._last_seq + 1:
+            # Sequence numbers are contiguous, so a gap means rows were pruned
+            self._last_seq = rows[-1]['seq']
+            return None
+        if rows:
+            self._last_seq = rows[-1]['seq']
+        return list(dict.fromkeys((row['entity'], row['entityId']) for row in rows
+                                  if row['station'] != self.station))
+
+    # ---------------- Loading ----------------
+
+    def load_inventory(self):
+        rows = self.conn.execute('SELECT * FROM antibodies ORDER BY rowid')
+        return [dict(row) for row in rows]
+
+    def load_saved_panels(self):
+        panels = []
+        for row in self.conn.execute('SELECT * FROM saved_panels ORDER BY rowid'):
+            panel = dict(row)
+            panel['antibodyIds'] = json.loads(panel['antibodyIds'])
+            panels.append(panel)
+        return panels
+
+    def load_antibody(self, antibody_id):
+        row = self.conn.execute('SELECT * FROM antibodies WHERE id = ?', (antibody_id,)).fetchone()
+        return dict(row) if row else None
+
+    def load_saved_panel(self, panel_id):
+        row = self.conn.execute('SELECT * FROM saved_panels WHERE id = ?', (panel_id,)).fetchone()
+        if row is None:
+            return None
+        panel = dict(row)
+        panel['antibodyIds'] = json.loads(panel['antibodyIds'])
+        return panel
+
+    def load_history_entry(self, entry_id):
+        row = self.conn.execute('SELECT * FROM panel_history WHERE id = ?', (entry_id,)).fetchone()
+        return None if row is None else _history_entry(row)
+
+    def load_history(self):
+        """Execution history, newest first (same order as panel_history)"""
+        return [_history_entry(row) for row in self.conn.execute(
+            'SELECT * FROM panel_history ORDER BY timestamp DESC, id DESC')]
+
+    def load_lots(self, antibody_ids=None):
+        """Lots of the given antibodies (every lot by default), oldest first"""
+        if antibody_ids is None:
+            return [dict(row) for row in self.conn.execute('SELECT * FROM lots ORDER BY id')]
+        ids = list(antibody_ids)
+        rows = self.conn.execute(
+            f"SELECT * FROM lots WHERE antibodyId IN ({', '.join('?' * len(ids))}) ORDER BY id",
+            ids) if ids else ()
+        return [dict(row) for row in rows]
+
+    def load_daily_usage(self):
+        """(day, antibody id, antigen, metal, µL) consumption summed per day.
+
+        Aggregated in SQL over the stored history, so forecasting can start
+        without loading the history entries themselves.
+        """
+        return self.conn.execute("""
+            SELECT date(h.timestamp),
+                   json_extract(u.value, '$.id'),
+                   json_extract(u.value, '$.antigen'),
+                   json_extract(u.value, '$.metal'),
+                   SUM(json_extract(u.value, '$.volumeUsed'))
+            FROM panel_history AS h, json_each(h.antibodies) AS u
+            GROUP BY 1, 2, 3, 4
+        """).fetchall()
+
+    # ---------------- Antibodies ----------------
+
+    def _insert_antibody(self, cur, antibody):
+        """Insert one record; without an ``id`` SQLite assigns one and it is set on the record"""
+        fields = [f for f in ('id',) + ANTIBODY_FIELDS if antibody.get(f) is not None]
+        antibody['id'] = cur.execute(
+            f"INSERT INTO antibodies ({', '.join(fields)}) "
+            f"VALUES ({', '.join('?' * len(fields))})",
+            [antibody[f] for f in fields]).lastrowid
+        return antibody['id']
+
+    def insert_antibody(self, antibody):
+        """Insert a new record; returns the id assigned to it (also set on the record)"""
+        antibody.setdefault('version', 0)
+        with self._transaction() as cur:
+            ab_id = self._insert_antibody(cur, antibody)
+            cur.execute(INITIAL_LOT_SQL + 'WHERE id = ?', (ab_id,))
+            self._changed(cur, ANTIBODY, [ab_id])
+        return ab_id
+
+    def update_antibody(self, antibody_id, expected_version=None, **fields):
+        """Write only the given columns of one antibody row; returns its new version.
+
+        With ``expected_version`` the write only happens if no other station
+        changed the row since it was read, otherwise VersionConflict is raised.
+        """
+        unknown = set(fields) - set(ANTIBODY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown antibody field(s): {', '.join(sorted(unknown))}")
+        assignments = ''.join(f'{name} = ?, ' for name in fields)
+        sql = f'UPDATE antibodies SET {assignments}version = version + 1 WHERE id = ?'
+        params = list(fields.values()) + [antibody_id]
+        if expected_version is not None:
+            sql += ' AND version = ?'
+            params.append(expected_version)
+        with self._transaction() as cur:
+            if not cur.execute(sql, params).rowcount:
+                raise VersionConflict(antibody_id)
+            self._changed(cur, ANTIBODY, [antibody_id])
+            return cur.execute('SELECT version FROM antibodies WHERE id = ?',
+                               (antibody_id,)).fetchone()[0]
+
+    def import_antibodies(self, inserts, updates, lot_changes=(), versions=None):
+        """Insert new antibodies and merge (id, fields) updates in one transaction.
+
+        New antibodies get their ids from SQLite, set on each record, and
+        one lot holding their stock; a changed ``stockVolume`` must come
+        with the (lot id, delta) ``lot_changes`` that make it up. With
+        ``versions`` ({id: version read}) nothing is written if another
+        station changed an updated row since it was read (VersionConflict),
+        so a stock total and its lot changes never come from a stale read.
+        Returns {id: new version} for the updated rows.
+        """
+        versions = versions or {}
+        for ab in inserts:
+            ab.setdefault('version', 0)
+        for _, fields in updates:
+            unknown = set(fields) - set(ANTIBODY_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown antibody field(s): {', '.join(sorted(unknown))}")
+        with self._transaction() as cur:
+            for ab in inserts:
+                self._insert_antibody(cur, ab)
+            for ab_id, changes in updates:
+                assignments = ''.join(f'{name} = ?, ' for name in changes)
+                sql = f'UPDATE antibodies SET {assignments}version = version + 1 WHERE id = ?'
+                params = list(changes.values()) + [ab_id]
+                if versions.get(ab_id) is not None:
+                    sql += ' AND version = ?'
+                    params.append(versions[ab_id])
+                if not cur.execute(sql, params).rowcount:
+                    raise VersionConflict(ab_id)
+            cur.executemany(INITIAL_LOT_SQL + 'WHERE id = ?', [(ab['id'],) for ab in inserts])
+            self._apply_lots(cur, lot_changes)
+            self._changed(cur, ANTIBODY, [ab['id'] for ab in inserts] +
+                          [ab_id for ab_id, _ in updates])
+            return {ab_id: cur.execute('SELECT version FROM antibodies WHERE id = ?',
+                                       (ab_id,)).fetchone()[0]
+                    for ab_id, _ in updates}
+
+    def delete_antibody(self, antibody_id):
+        """Delete an antibody and its lots; KeyError if another station already deleted it"""
+        with self._transaction() as cur:
+            if cur.execute('DELETE FROM antibodies WHERE id = ?', (antibody_id,)).rowcount != 1:
+                raise KeyError(antibody_id)
+            cur.execute('DELETE FROM lots WHERE antibodyId = ?', (antibody_id,))
+            self._changed(cur, ANTIBODY, [antibody_id])
+
+    # ---------------- Lots ----------------
+
+    def insert_lot(self, lot):
+        """Add a vial to an antibody's stock; returns (lot id, {id: (stock, version)})"""
+        fields = [f for f in LOT_FIELDS if f in lot]
+        with self._transaction() as cur:
+            if not cur.execute('SELECT 1 FROM antibodies WHERE id = ?',
+                               (lot['antibodyId'],)).fetchone():
+                raise KeyError(lot['antibodyId'])
+            lot_id = cur.execute(
+                f"INSERT INTO lots ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                [lot[f] for f in fields]).lastrowid
+            return lot_id, self._apply_stock(cur, [(lot['antibodyId'], lot['volume'])])
+
+    def adjust_stock(self, antibody_id, lot_changes, expected_version=None):
+        """Change one antibody's stock by (lot id, delta) changes to its lots.
+
+        With ``expected_version`` nothing is written if another station
+        changed the antibody since it was read (VersionConflict). Returns
+        ({id: (stock, version)}, {lot id: volume}).
+        """
+        delta = sum(change for _, change in lot_changes)
+        with self._transaction() as cur:
+            if expected_version is not None:
+                row = cur.execute('SELECT version FROM antibodies WHERE id = ?',
+                                  (antibody_id,)).fetchone()
+                if row is None or row[0] != expected_version:
+                    raise VersionConflict(antibody_id)
+            stock = self._apply_stock(cur, [(antibody_id, delta)])
+            return stock, self._apply_lots(cur, lot_changes)
+
+    # ---------------- Saved panels ----------------
+
+    def insert_saved_panel(self, panel):
+        """Insert a saved panel; returns the id assigned to it (also set on the panel)"""
+        with self._transaction() as cur:
+            panel['id'] = cur.execute(
+                'INSERT INTO saved_panels (name, antibodyIds, createdBy, createdAt) '
+                'VALUES (?, ?, ?, ?)',
+                (panel['name'], json.dumps(panel['antibodyIds']),
+                 panel['createdBy'], panel['createdAt'])).lastrowid
+            self._changed(cur, SAVED_PANEL, [panel['id']])
+        return panel['id']
+
+    def delete_saved_panel(self, panel_id):
+        """Delete a saved panel; KeyError if another station already deleted it"""
+        with self._transaction() as cur:
+            if cur.execute('DELETE FROM saved_panels WHERE id = ?', (panel_id,)).rowcount != 1:
+                raise KeyError(panel_id)
+            self._changed(cur, SAVED_PANEL, [panel_id])
+
+    # ---------------- History ----------------
+
+    def _apply_stock(self, cur, stock_changes):
+        """Apply (antibody_id, delta) pairs; decrements only where stock covers them.
+
+        Each decrement is one conditional UPDATE, so the check and the write
+        cannot be split by another station. Stock returned to an antibody
+        another station has deleted is dropped. Returns {id: (stock, version)}.
+        """
+        shortfalls = []
+        for ab_id, delta in stock_changes:
+            updated = cur.execute(
+                'UPDATE antibodies SET stockVolume = stockVolume + ?, version = version + 1 '
+                'WHERE id = ? AND stockVolume + ? >= 0',
+                (delta, ab_id, delta)).rowcount
+            if not updated and delta < 0:
+                row = cur.execute('SELECT stockVolume FROM antibodies WHERE id = ?',
+                                  (ab_id,)).fetchone()
+                shortfalls.append((ab_id, row[0] if row else 0.0, -delta))
+        if shortfalls:
+            raise InsufficientStock(shortfalls)
+
+        ids = list(dict.fromkeys(ab_id for ab_id, _ in stock_changes))
+        self._changed(cur, ANTIBODY, ids)
+        rows = cur.execute(
+            f"SELECT id, stockVolume, version FROM antibodies WHERE id IN ({', '.join('?' * len(ids))})",
+            ids) if ids else ()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def _apply_lots(self, cur, lot_changes):
+        """Apply (lot id, delta) pairs, each a conditional UPDATE as in _apply_stock.
+
+        A draw the lot no longer covers raises InsufficientStock for the
+        lot's antibody; volume returned to a deleted lot is dropped. Returns
+        {lot id: volume}.
+        """
+        failed = [lot_id for lot_id, delta in lot_changes if not cur.execute(
+            'UPDATE lots SET volume = volume + ? WHERE id = ? AND volume + ? >= 0',
+            (delta, lot_id, delta)).rowcount and delta < 0]
+        ids = list(dict.fromkeys(lot_id for lot_id, _ in lot_changes))
+        rows = cur.execute(
+            f"SELECT id, antibodyId, volume FROM lots WHERE id IN ({', '.join('?' * len(ids))})",
+            ids).fetchall() if ids else ()
+        if failed:
+            # Report each short antibody with what its lots hold and what was asked of them
+            owner = {row[0]: row[1] for row in rows}
+            required = dict.fromkeys((owner[i] for i in failed if i in owner), 0.0)
+            for lot_id, delta in lot_changes:
+                if owner.get(lot_id) in required:
+                    required[owner[lot_id]] -= delta
+            raise InsufficientStock([
+                (ab_id, cur.execute('SELECT COALESCE(SUM(volume), 0) FROM lots '
+                                    'WHERE antibodyId = ?', (ab_id,)).fetchone()[0], volume)
+                for ab_id, volume in required.items()])
+        return {row[0]: row[2] for row in rows}
+
+    def record_execution(self, entry, stock_changes, lot_changes=()):
+        """Insert a history entry and apply (antibody_id, delta) stock changes atomically.
+
+        The entry's ``id`` is assigned by SQLite and set on it.
+        ``lot_changes`` are the (lot id, delta) draws that make up the stock
+        changes. Raises InsufficientStock, writing nothing, if another
+        station has drawn the stock or the lots down since they were
+        checked. Returns ({id: (stock, version)}, {lot id: volume}).
+        """
+        with self._transaction() as cur:
+            stock = self._apply_stock(cur, stock_changes)
+            lots = self._apply_lots(cur, lot_changes)
+            self._insert_history(cur, [entry])
+            return stock, lots
+
+    def record_batch(self, entries, stock_changes, lot_changes=()):
+        """Insert linked history entries and apply their combined changes atomically.
+
+        ``stock_changes`` and ``lot_changes`` cover every entry, so stock is
+        checked and drawn once: either all entries are recorded or, with
+        InsufficientStock, none. Each entry gets its ``id`` and, as
+        ``batchId``, the id of the first entry. Returns ({id: (stock,
+        version)}, {lot id: volume}).
+        """
+        with self._transaction() as cur:
+            stock = self._apply_stock(cur, stock_changes)
+            lots = self._apply_lots(cur, lot_changes)
+            self._insert_history(cur, entries)
+            batch_id = entries[0]['id']
+            for entry in entries:
+                entry['batchId'] = batch_id
+            cur.executemany('UPDATE panel_history SET batchId = ? WHERE id = ?',
+                            [(batch_id, entry['id']) for entry in entries])
+            return stock, lots
+
+    def _insert_history(self, cur, entries):
+        for entry in entries:
+            entry['id'] = cur.execute(
+                'INSERT INTO panel_history '
+                '(timestamp, user, panelName, cellCount, antibodies, batchId) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (entry['timestamp'], entry['user'], entry['panelName'], entry['cellCount'],
+                 json.dumps(entry['antibodies']), entry.get('batchId'))).lastrowid
+        self._changed(cur, HISTORY, [entry['id'] for entry in entries])
+
+    def undo_execution(self, entry_id, stock_changes, lot_changes=()):
+        """Remove a history entry and apply its restoring stock and lot changes atomically.
+
+        The entry is deleted first: if another station already undid or
+        deleted it, KeyError is raised and no stock is returned twice.
+        Returns ({id: (stock, version)}, {lot id: volume}).
+        """
+        with self._transaction() as cur:
+            if cur.execute('DELETE FROM panel_history WHERE id = ?', (entry_id,)).rowcount != 1:
+                raise KeyError(entry_id)
+            self._changed(cur, HISTORY, [entry_id])
+            stock = self._apply_stock(cur, stock_changes)
+            lots = self._apply_lots(cur, lot_changes)
+            return stock, lots
+
+    def delete_history(self, entry_id):
+        """Delete a history entry; KeyError if another station already undid or deleted it"""
+        with self._transaction() as cur:
+            if cur.execute('DELETE FROM panel_history WHERE id = ?', (entry_id,)).rowcount != 1:
+                raise KeyError(entry_id)
+            self._changed(cur, HISTORY, [entry_id])
+
+
+def _history_entry(row):
+    entry = dict(row)
+    entry['antibodies'] = json.loads(entry['antibodies'])
+    return entry
+
+
+def history_pages(conn, since=None, until=None, user=None, page_size=500):
+    """Yield lists of history entries, newest first, read ``page_size`` rows at a time.
+
+    ``since``/``until`` are ISO timestamps (inclusive / exclusive). Works
+    on any connection to the database, such as one from a ReaderPool.
+    """
+    clauses, params = [], []
+    for clause, value in (('timestamp >= ?', since), ('timestamp < ?', until),
+                          ('user = ?', user)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+    cursor = conn.execute(
+        f'SELECT * FROM panel_history {where}ORDER BY timestamp DESC, id DESC', params)
+    try:
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                return
+            yield [_history_entry(row) for row in rows]
+    finally:
+        cursor.close()
+
+
+class ReaderPool:
+    """Read-only connections to one database, for readers on worker threads.
+
+    A WAL reader never blocks the writer, so long queries (streaming the
+    whole history, say) can run on these while a PanelStore keeps writing.
+    Each connection is used by one caller at a time but may move between
+    threads.
+    """
+
+    def __init__(self, path=None, size=4):
+        self.path = path or default_db_path()
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            conn = sqlite3.connect(Path(self.path).absolute().as_uri() + '?mode=ro', uri=True,
+                                   timeout=10.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._idle.put(conn)
+        self.size = size
+
+    def acquire(self):
+        """A connection, waiting for one to be released if all are in use"""
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
@@ -0,0 +1,17 @@
+"""Staining volume rules shared by the engine, the designer and the core.
+
+Kept free of NumPy so that scripts which only need the per-antibody rule
+do not pay for importing it.
+"""
+
+STANDARD_CELL_COUNT = 4.0       # millions of cells stained by 1x volume
+STAIN_FACTORS = {'Extracellular': 1.0, 'Intracellular': 0.2}
+
+
+def stain_factor(antibody):
+    return STAIN_FACTORS.get(antibody.get('stainType', 'Extracellular'), 1.0)
+
+
+def calculate_volume(antibody, cell_count):
+    """Volume scales with cell count — intracellular uses 0.2x volume"""
+    return antibody['volumePerTest'] * stain_factor(antibody) * cell_count / STANDARD_CELL_COUNT
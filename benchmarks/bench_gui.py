@@ -0,0 +1,521 @@
+"""Headless timings for the GUI's refresh and panel-execution hot paths.
+
+    python benchmarks/bench_gui.py [--sizes 100 1000 10000 100000] [--repeats 5]
+                                   [--out results.json] [--baseline OLD.json]
+
+For every size a synthetic database (that many antibodies and history
+entries, a tenth as many saved panels) is written to a temporary directory
+and AntibodyPanelManager is started against it on a virtual X display. An
+Xvfb server is started when DISPLAY is unset (or always, with --xvfb).
+Message boxes and file dialogs are replaced by stubs that answer "yes" and
+name a file in the temporary directory, so nothing waits for a click.
+
+Each path is timed through the same calls the buttons make, followed by
+``update()`` so deferred redraws (invalidate/flush_views) are included.
+Reported per path: wall time over the repeats, Tk widgets created and
+destroyed by one call, and the peak Python allocation during one call
+(tracemalloc, measured on a separate untimed call since tracing slows
+everything down).
+
+Results are written as JSON. With --baseline the run is compared with an
+earlier results file and the exit status is 1 if any path got slower than
+--tolerance allows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from antibody_panel.store import PanelStore
+from FinalUpdated import AntibodyPanelManager       # imported here so startup times exclude it
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_REPEATS = 5
+XVFB_SCREEN = '1280x1024x24'
+
+# Paths in run order; the open_* entries time a tab's first (lazy) build
+PATHS = (
+    'startup',
+    'refresh_antibody_list',
+    'toggle_antibody',
+    'open_saved_panels',
+    'refresh_saved_panels_tab',
+    'open_inventory',
+    'refresh_inventory_tab',
+    'open_history',
+    'refresh_history_tab',
+    'execute_panel',
+    'export_history',
+)
+
+# (mass, element) pairs used for synthetic metal labels
+METALS = (
+    (89, 'Y'), (141, 'Pr'), (142, 'Nd'), (143, 'Nd'), (144, 'Nd'), (145, 'Nd'),
+    (146, 'Nd'), (147, 'Sm'), (148, 'Nd'), (149, 'Sm'), (150, 'Nd'), (151, 'Eu'),
+    (152, 'Sm'), (153, 'Eu'), (154, 'Sm'), (155, 'Gd'), (156, 'Gd'), (158, 'Gd'),
+    (159, 'Tb'), (160, 'Gd'), (161, 'Dy'), (162, 'Dy'), (163, 'Dy'), (164, 'Dy'),
+    (165, 'Ho'), (166, 'Er'), (167, 'Er'), (168, 'Er'), (169, 'Tm'), (170, 'Er'),
+    (171, 'Yb'), (172, 'Yb'), (173, 'Yb'), (174, 'Yb'), (175, 'Lu'), (176, 'Yb'),
+    (209, 'Bi'),
+)
+USERS = ('alice', 'bo', 'chen', 'dana', 'eli')
+PANEL_SIZE = (5, 12)            # antibodies per synthetic history entry / saved panel
+EXECUTE_ANTIBODIES = 10
+TOGGLE_SELECTION = 40           # antibodies already selected when one card is toggled
+
+
+# ---------------- Synthetic data ----------------
+
+def synthetic_antibody(i, rng):
+    mass, element = METALS[i % len(METALS)]
+    return {
+        'id': i,
+        'antigen': f"CD{i}",
+        'clone': f"C{rng.randrange(10000):04d}",
+        'metal': f"{mass}{element}",
+        'concentration': 0.5,
+        'antibodyPerTest': 1.0,
+        'volumePerTest': round(rng.uniform(0.5, 3.0), 2),
+        # Every 20th antibody is low so the alert paths have work to do
+        'stockVolume': 10.0 if i % 20 == 0 else 1e6,
+        'notes': '',
+        'dateConjugated': (datetime(2024, 1, 1) + timedelta(days=i % 365)).date().isoformat(),
+        'alertThreshold': 50.0,
+        'stainType': 'Intracellular' if i % 7 == 0 else 'Extracellular',
+    }
+
+
+def write_dataset(db_path, size, seed=0):
+    """Create a database with ``size`` antibodies and history entries"""
+    rng = random.Random(seed)
+    antibodies = [synthetic_antibody(i, rng) for i in range(1, size + 1)]
+    PanelStore(str(db_path), seed=antibodies, shared=False).close()
+
+    start = datetime.now() - timedelta(days=730)
+    step = timedelta(days=730) / size
+    history = []
+    for i in range(1, size + 1):
+        used = rng.sample(antibodies, min(rng.randint(*PANEL_SIZE), size))
+        history.append((
+            i, (start + step * i).isoformat(), rng.choice(USERS), f"Run {i:06d}",
+            4.0, json.dumps([{'id': ab['id'], 'antigen': ab['antigen'], 'metal': ab['metal'],
+                              'volumeUsed': ab['volumePerTest']} for ab in used])))
+    panels = []
+    for i in range(1, max(size // 10, 1) + 1):
+        ids = [ab['id'] for ab in rng.sample(antibodies, min(rng.randint(*PANEL_SIZE), size))]
+        panels.append((i, f"Panel {i:05d}", json.dumps(ids), rng.choice(USERS),
+                       (start + step * i).isoformat()))
+
+    conn = sqlite3.connect(str(db_path))
+    with conn:
+        conn.executemany('INSERT INTO panel_history (id, timestamp, user, panelName, cellCount, '
+                         'antibodies) VALUES (?, ?, ?, ?, ?, ?)', history)
+        conn.executemany('INSERT INTO saved_panels (id, name, antibodyIds, createdBy, createdAt) '
+                         'VALUES (?, ?, ?, ?, ?)', panels)
+    conn.close()
+
+
+# ---------------- Display and dialogs ----------------
+
+def start_xvfb():
+    """Start Xvfb on a free display and point DISPLAY at it; returns the process"""
+    read_fd, write_fd = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            ['Xvfb', '-displayfd', str(write_fd), '-screen', '0', XVFB_SCREEN, '-nolisten', 'tcp'],
+            pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        sys.exit("error: Xvfb is not installed (set DISPLAY to use an existing X server)")
+    finally:
+        os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        display = pipe.readline().strip()
+    if not display:
+        proc.kill()
+        sys.exit("error: Xvfb did not start")
+    os.environ['DISPLAY'] = f":{display}"
+    return proc
+
+
+class DialogStub:
+    """Stands in for messagebox/filedialog: records calls, never blocks"""
+
+    def __init__(self):
+        self.calls = []
+        self.save_path = ''
+
+    def install(self):
+        for name in ('showinfo', 'showwarning', 'showerror'):
+            setattr(messagebox, name, self._recorder(name, 'ok'))
+        for name in ('askyesno', 'askokcancel'):
+            setattr(messagebox, name, self._recorder(name, True))
+        filedialog.asksaveasfilename = lambda **kw: self._record('asksaveasfilename',
+                                                                 self.save_path)
+        filedialog.askopenfilename = self._recorder('askopenfilename', '')
+
+    def _recorder(self, name, answer):
+        return lambda *args, **kw: self._record(name, answer, *args)
+
+    def _record(self, name, answer, *args):
+        self.calls.append((name,) + args)
+        return answer
+
+
+class WidgetCounter:
+    """Counts Tk widgets as they are created and destroyed"""
+
+    def __init__(self):
+        self.created = 0
+        self.destroyed = 0
+
+    def install(self):
+        counter = self
+        init, destroy = tk.BaseWidget.__init__, tk.BaseWidget.destroy
+
+        def counted_init(self, *args, **kw):
+            counter.created += 1
+            init(self, *args, **kw)
+
+        def counted_destroy(self):
+            counter.destroyed += 1
+            destroy(self)
+
+        tk.BaseWidget.__init__ = counted_init
+        tk.BaseWidget.destroy = counted_destroy
+
+    def snapshot(self):
+        return self.created, self.destroyed
+
+
+def live_widgets(widget):
+    return sum(1 + live_widgets(child) for child in widget.winfo_children())
+
+
+# ---------------- Measurement ----------------
+
+class Session:
+    """One AntibodyPanelManager over one synthetic dataset"""
+
+    def __init__(self, workdir, dialogs, widgets):
+        self.workdir = workdir
+        self.dialogs = dialogs
+        self.widgets = widgets
+        self.root = None
+        self.app = None
+        self.runs = 0
+
+    def settle(self):
+        self.root.update()
+
+    def wait_for(self, condition, timeout=600.0):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("benchmark step did not finish")
+            self.root.update()
+            time.sleep(0.001)
+
+    def close(self):
+        if self.app is not None:
+            self.app.on_close()
+        elif self.root is not None:
+            self.root.destroy()
+        self.root = self.app = None
+
+    def select_tab(self, text):
+        notebook = self.app.notebook
+        for tab in notebook.tabs():
+            if notebook.tab(tab, 'text') == text:
+                notebook.select(tab)
+                self.settle()
+                return
+        raise LookupError(text)
+
+    # Each step runs once per call; setup that should not be timed goes in prepare_*
+
+    def prepare_startup(self):
+        self.close()
+
+    def step_startup(self):
+        self.close()
+        self.root = tk.Tk()
+        self.app = AntibodyPanelManager(self.root)
+        self.settle()
+        button = find_widget(self.root, tk.Button, 'Continue')
+        for child in button.master.winfo_children():
+            if isinstance(child, tk.Entry):
+                child.insert(0, 'bench')
+        button.invoke()
+        self.wait_for(lambda: hasattr(self.app, 'notebook'))
+        self.settle()
+
+    # Refresh paths first show their tab, building it if this session has not yet,
+    # so each can be run on its own with --paths
+
+    def prepare_refresh_antibody_list(self):
+        self.select_tab('Build Panel')
+
+    def step_refresh_antibody_list(self):
+        self.app.refresh_antibody_list()
+        self.settle()
+
+    def prepare_toggle_antibody(self):
+        self.select_tab('Build Panel')
+        ids = [ab['id'] for ab in self.app.inventory][:TOGGLE_SELECTION]
+        self.app.selection.replace(ids)
+        self.app.invalidate('antibodies', 'summary')
+        self.settle()
+
+    def step_toggle_antibody(self):
+        # Click the first visible card's checkbox: off when selected, on otherwise
+        card = next(card for card in self.app.antibody_grid.visible_cards()
+                    if card.item is not None)
+        card.check.invoke()
+        self.settle()
+
+    def prepare_open(self, text):
+        # Rebuild the session so the tab is unbuilt again
+        if self.app is None or text in self.built_tabs():
+            self.step_startup()
+
+    def built_tabs(self):
+        notebook = self.app.notebook
+        return {notebook.tab(tab, 'text') for tab in notebook.tabs()
+                if tab not in self.app._unbuilt_tabs}
+
+    def prepare_open_saved_panels(self):
+        self.prepare_open('Saved Panels')
+
+    def step_open_saved_panels(self):
+        self.select_tab('Saved Panels')
+
+    def prepare_refresh_saved_panels_tab(self):
+        self.select_tab('Saved Panels')
+
+    def step_refresh_saved_panels_tab(self):
+        self.app.refresh_saved_panels_tab()
+        self.settle()
+
+    def prepare_open_inventory(self):
+        self.prepare_open('Manage Inventory')
+
+    def step_open_inventory(self):
+        self.select_tab('Manage Inventory')
+
+    def prepare_refresh_inventory_tab(self):
+        self.select_tab('Manage Inventory')
+
+    def step_refresh_inventory_tab(self):
+        self.app.refresh_inventory_tab()
+        self.settle()
+
+    def prepare_open_history(self):
+        self.prepare_open('History')
+
+    def step_open_history(self):
+        self.select_tab('History')
+
+    def prepare_refresh_history_tab(self):
+        self.select_tab('History')
+
+    def step_refresh_history_tab(self):
+        self.app.refresh_history_tab()
+        self.settle()
+
+    def prepare_execute_panel(self):
+        self.select_tab('Build Panel')
+        ids = [ab['id'] for ab in self.app.inventory][:EXECUTE_ANTIBODIES]
+        self.app.selection.replace(ids)
+        self.runs += 1
+        self.app.panel_name_var.set(f"Benchmark {self.runs}")
+        self.settle()
+        del self.dialogs.calls[:]
+
+    def step_execute_panel(self):
+        self.app.execute_panel()
+        self.settle()
+        if ('showinfo', 'Success') not in [call[:2] for call in self.dialogs.calls]:
+            raise RuntimeError(f"execute_panel did not succeed: {self.dialogs.calls}")
+
+    def prepare_export_history(self):
+        self.runs += 1
+        self.dialogs.save_path = str(self.workdir / f"history-{self.runs}.csv")
+        del self.dialogs.calls[:]
+
+    def step_export_history(self):
+        self.app.export_history()
+        self.wait_for(lambda: any(call[0].startswith('show') for call in self.dialogs.calls))
+        if self.dialogs.calls[-1][:2] != ('showinfo', 'Success'):
+            raise RuntimeError(f"export_history did not succeed: {self.dialogs.calls}")
+
+    def measure(self, path, repeats):
+        prepare = getattr(self, f"prepare_{path}", None)
+        step = getattr(self, f"step_{path}")
+        times = []
+        for _ in range(repeats):
+            if prepare:
+                prepare()
+            start = time.perf_counter()
+            step()
+            times.append((time.perf_counter() - start) * 1000)
+
+        # One more call, untimed, for widget counts and memory
+        if prepare:
+            prepare()
+        created, destroyed = self.widgets.snapshot()
+        tracemalloc.start()
+        try:
+            step()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        after_created, after_destroyed = self.widgets.snapshot()
+        return {
+            'ms': {'min': round(min(times), 3), 'median': round(statistics.median(times), 3),
+                   'max': round(max(times), 3)},
+            'widgets': {'created': after_created - created,
+                        'destroyed': after_destroyed - destroyed,
+                        'live': live_widgets(self.root)},
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+
+def find_widget(parent, kind, text):
+    for child in parent.winfo_children():
+        if isinstance(child, kind) and child.cget('text') == text:
+            return child
+        found = find_widget(child, kind, text)
+        if found is not None:
+            return found
+    return None
+
+
+def run_size(size, repeats, paths, dialogs, widgets, log):
+    with tempfile.TemporaryDirectory(prefix=f'bench-{size}-') as tmp:
+        workdir = Path(tmp)
+        db_path = workdir / 'panels.db'
+        start = time.perf_counter()
+        write_dataset(db_path, size)
+        log(f"{size:>7} entries: dataset written in {time.perf_counter() - start:.1f}s")
+        os.environ['ANTIBODY_PANEL_DB'] = str(db_path)
+
+        session = Session(workdir, dialogs, widgets)
+        results = {}
+        try:
+            for path in paths:
+                if path != 'startup' and session.app is None:
+                    session.step_startup()
+                results[path] = result = session.measure(path, repeats)
+                log(f"{size:>7} {path:<26} {result['ms']['median']:>10.1f} ms   "
+                    f"+{result['widgets']['created']}/-{result['widgets']['destroyed']} widgets   "
+                    f"{result['peak_kib']:>9.0f} KiB peak")
+        finally:
+            session.close()
+        return results
+
+
+# ---------------- Reports ----------------
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance, log):
+    """Log median-time ratios against ``baseline``; returns the regressed (size, path)s"""
+    regressed = []
+    for size, paths in results['results'].items():
+        for path, result in paths.items():
+            old = baseline.get('results', {}).get(size, {}).get(path)
+            if not old:
+                continue
+            ratio = result['ms']['median'] / max(old['ms']['median'], 1e-6)
+            flag = ''
+            if ratio > tolerance:
+                regressed.append((size, path))
+                flag = '  REGRESSED'
+            log(f"{size:>7} {path:<26} {old['ms']['median']:>10.1f} -> "
+                f"{result['ms']['median']:>10.1f} ms  x{ratio:.2f}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="inventory/history sizes to generate (default: %(default)s)")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+                        help="timed calls per path (default: %(default)s)")
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS, metavar='PATH',
+                        help=f"paths to run (default: all of {', '.join(PATHS)})")
+    parser.add_argument('--out', default='bench_results.json',
+                        help="results file (default: %(default)s)")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="slowdown ratio counted as a regression (default: %(default)s)")
+    parser.add_argument('--xvfb', action='store_true',
+                        help="start Xvfb even when DISPLAY is set")
+    args = parser.parse_args(argv)
+
+    def log(line):
+        print(line, flush=True)
+
+    xvfb = start_xvfb() if args.xvfb or not os.environ.get('DISPLAY') else None
+    dialogs, widgets = DialogStub(), WidgetCounter()
+    dialogs.install()
+    widgets.install()
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'tk': tk.TkVersion,
+        'platform': platform.platform(),
+        'repeats': args.repeats,
+        'results': {},
+    }
+    try:
+        # 'startup' always runs first: the later paths need a session
+        paths = [path for path in PATHS if path in args.paths]
+        for size in args.sizes:
+            results['results'][str(size)] = run_size(size, args.repeats, paths,
+                                                     dialogs, widgets, log)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    log(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance, log):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from antibody_panel.core import PanelService
+from antibody_panel.store import PanelStore
+
+
+def antibody(antigen, metal, stock=100.0, clone='X1', **fields):
+    """A complete antibody record as the Add Antibody form would build it"""
+    return {'antigen': antigen, 'clone': clone, 'metal': metal, 'concentration': 0.5,
+            'antibodyPerTest': 1.0, 'volumePerTest': 2.0, 'stockVolume': stock,
+            'notes': '', 'dateConjugated': date.today().isoformat(), 'alertThreshold': 5.0,
+            'stainType': 'Extracellular', **fields}
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.delenv('ANTIBODY_PANEL_JOURNAL', raising=False)
+    monkeypatch.delenv('ANTIBODY_PANEL_SHARED', raising=False)
+    return str(tmp_path / 'panels.db')
+
+
+@pytest.fixture
+def station(db_path):
+    """Factory for services over the same database, one per station"""
+    opened = []
+
+    def open_station(user='tester'):
+        service = PanelService(PanelStore(db_path), user=user)
+        opened.append(service)
+        return service
+
+    yield open_station
+    for service in opened:
+        service.close()
+
+
+@pytest.fixture
+def service(station):
+    return station()
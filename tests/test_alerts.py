@@ -0,0 +1,53 @@
+"""Low-stock tracking in AlertEngine"""
+
+import pytest
+
+from antibody_panel.alerts import AlertEngine, severity
+from antibody_panel.model import InventoryModel
+
+
+def record(ab_id, stock, threshold=50.0):
+    return {'id': ab_id, 'antigen': f'CD{ab_id}', 'metal': f'{140 + ab_id}Nd',
+            'stockVolume': stock, 'alertThreshold': threshold}
+
+
+@pytest.fixture
+def model():
+    return InventoryModel([record(1, 500.0), record(2, 40.0), record(3, 10.0),
+                           record(4, 0.0, threshold=0.0)])
+
+
+def test_severity_is_stock_over_threshold():
+    assert severity(record(1, 25.0)) == 0.5
+    assert severity(record(1, 0.0, threshold=0.0)) == 0.0
+    assert severity(record(1, 1.0, threshold=0.0)) == float('inf')
+
+
+def test_low_stock_set_follows_the_model(model):
+    alerts = AlertEngine(model)
+    assert alerts.low_ids() == {2, 3, 4}
+
+    model.update(2, stockVolume=60.0)
+    model.update(1, alertThreshold=600.0)
+    model.remove(4)
+    model.add_many([record(5, 1.0), record(6, 100.0)])
+    assert alerts.low_ids() == {1, 3, 5}
+    assert alerts.count() == 3
+    assert alerts.is_low(5) and not alerts.is_low(6)
+
+
+def test_most_severe_skips_stale_entries(model):
+    alerts = AlertEngine(model)
+    model.update(3, stockVolume=30.0)
+    model.update(2, stockVolume=5.0)
+    assert alerts.most_severe(2) == [(4, 0.0), (2, 0.1)]
+    # Asking again returns the same answer; the heap keeps its live entries
+    assert alerts.most_severe(5) == [(4, 0.0), (2, 0.1), (3, 0.6)]
+
+
+def test_heap_is_rebuilt_when_stale_entries_pile_up(model):
+    alerts = AlertEngine(model)
+    for n in range(300):
+        model.update(3, stockVolume=float(n % 40))
+    assert len(alerts._heap) <= 4 * alerts.count() + 64
+    assert alerts.most_severe(1) == [(4, 0.0)]
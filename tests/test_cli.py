@@ -0,0 +1,116 @@
+"""The python -m antibody_panel command line"""
+
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from antibody_panel.cli import main
+from antibody_panel.core import PanelService
+from antibody_panel.journal import Journal
+from antibody_panel.store import PanelStore
+
+
+def run(db_path, *argv):
+    out, err = io.StringIO(), io.StringIO()
+    code = main(['--db', db_path, '--user', 'cron', *argv], out=out, err=err)
+    return code, out.getvalue(), err.getvalue()
+
+
+@pytest.fixture
+def saved(db_path):
+    service = PanelService(PanelStore(db_path))
+    service.save_panel('T cells', [1, 3])
+    service.close()
+    return db_path
+
+
+def test_inventory_table_flags_low_stock(db_path):
+    code, out, _ = run(db_path, 'inventory', 'list')
+    lines = out.splitlines()
+    assert code == 0
+    assert lines[0].split()[:2] == ['Antigen', 'Metal']
+    assert [line.split()[0] for line in lines[1:]] == ['CD3', 'CD4', 'CD8']
+    assert lines[3].endswith('⚠ low')
+
+
+def test_inventory_formats(db_path):
+    _, out, _ = run(db_path, 'inventory', 'list', '--low', '--format', 'ndjson')
+    assert [json.loads(line)['antigen'] for line in out.splitlines()] == ['CD8']
+    _, out, _ = run(db_path, 'inventory', 'list', '--format', 'csv')
+    assert list(csv.reader(io.StringIO(out)))[1][:3] == ['CD3', 'UCHT1', '170Er']
+
+
+def test_panel_list(saved):
+    assert run(saved, 'panel', 'list')[1] == 'T cells  [2 antibodies]  CD3 - 170Er, CD8 - 146Nd\n'
+
+
+def test_dry_run_draws_nothing(saved):
+    code, out, _ = run(saved, 'panel', 'execute', 't cells', '--cells', '8', '--dry-run')
+    assert code == 0
+    assert out.startswith("Would execute 'T cells' at 8M cells:")
+    assert 'Total                        8.00 µL' in out
+    assert run(saved, 'history', 'export', saved + '.csv')[1].startswith('Exported 0 ')
+
+
+def test_execute_and_export_history(saved, tmp_path):
+    code, out, _ = run(saved, 'panel', 'execute', 'T cells', '--as', 'plate 1')
+    assert code == 0 and out.startswith("Executed 'plate 1'")
+    path = str(tmp_path / 'history.ndjson')
+    code, out, _ = run(saved, 'history', 'export', path, '--for-user', 'cron')
+    assert out == f"Exported 1 history entries to {path}\n"
+    with open(path, encoding='utf-8') as f:
+        assert json.loads(f.readline())['panelName'] == 'plate 1'
+
+
+def test_refusals_exit_with_status_1(saved):
+    code, _, err = run(saved, 'panel', 'execute', 'T cells', '--cells', '100')
+    assert code == 1
+    assert err.startswith("Not enough antibody for panel execution:\n  CD8 (146Nd) needs")
+    code, _, err = run(saved, 'panel', 'execute', 'B cells')
+    assert (code, err) == (1, "error: No saved panel named 'B cells'.\n")
+
+
+@pytest.mark.parametrize('cells', ['0', '-8', 'many'])
+def test_cell_count_must_be_positive(saved, cells, capsys):
+    with pytest.raises(SystemExit) as info:
+        run(saved, 'panel', 'execute', 'T cells', '--cells', cells)
+    assert info.value.code == 2
+    assert 'expected a positive cell count' in capsys.readouterr().err
+    assert PanelStore(saved).load_history() == []
+
+
+def test_inventory_list_imports_neither_tkinter_nor_numpy(db_path):
+    script = ("import sys; from antibody_panel.cli import main; "
+              f"main(['--db', {db_path!r}, 'inventory', 'list', '--format', 'csv']); "
+              "sys.stderr.write(repr(sorted({'tkinter', 'numpy'} & set(sys.modules))))")
+    done = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          check=True)
+    assert done.stderr == '[]'
+
+
+def test_batch_from_a_samples_file(saved, tmp_path):
+    samples = tmp_path / 'plate.csv'
+    samples.write_text('Sample,Cells\nA1,4\nA2,8\n', encoding='utf-8')
+    code, out, _ = run(saved, 'panel', 'batch', 'T cells', str(samples), '--dry-run')
+    assert code == 0
+    assert out.startswith("Would execute 'T cells' on 2 samples:")
+    assert 'Total                       12.00 µL' in out
+
+    code, out, _ = run(saved, 'panel', 'batch', 'T cells', str(samples))
+    assert code == 0
+    assert [e['panelName'] for e in PanelStore(saved).load_history()] == ['A2', 'A1']
+
+
+def test_journal_failure_is_a_warning(saved, monkeypatch):
+    def append(self, *args, **kwargs):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(Journal, 'append', append)
+    code, out, err = run(saved, 'panel', 'execute', 'T cells')
+    assert code == 0 and out.startswith("Executed 'T cells'")
+    assert err.startswith("warning: 'stock.execute' was saved but could not be journalled")
@@ -0,0 +1,83 @@
+"""Channel assignment in the panel designer"""
+
+import random
+from itertools import permutations
+
+import pytest
+
+from antibody_panel.channels import sensitivity_tier, spillover
+from antibody_panel.designer import design_panel, hungarian
+
+
+def conjugate(ab_id, antigen, metal, stock=500.0):
+    return {'id': ab_id, 'antigen': antigen, 'metal': metal, 'volumePerTest': 2.0,
+            'stockVolume': stock, 'stainType': 'Extracellular'}
+
+
+def channel_of(design):
+    return {antigen: ab['metal'] for antigen, ab in design.assignments}
+
+
+def test_spillover_rules():
+    assert spillover(145, 146) == (0.02, 'M+1 impurity')
+    assert spillover(146, 145) == (0.01, 'M-1 impurity')
+    assert spillover(143, 159) == (0.03, 'M+16 oxide')
+    assert spillover(145, 150) == (0.0, '')
+    assert spillover(0, 145) == (0.0, '')
+    assert [sensitivity_tier(m) for m in (89, 145, 165)] == ['low', 'medium', 'high']
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_hungarian_matches_brute_force(seed):
+    rng = random.Random(seed)
+    cost = [[rng.uniform(0, 10) for _ in range(5)] for _ in range(4)]
+    columns = hungarian(cost)
+    assert len(set(columns)) == 4
+    best = min(sum(cost[r][c] for r, c in enumerate(p)) for p in permutations(range(5), 4))
+    assert sum(cost[r][c] for r, c in enumerate(columns)) == pytest.approx(best)
+
+
+def test_hungarian_needs_enough_columns():
+    with pytest.raises(ValueError):
+        hungarian([[1.0], [2.0]])
+
+
+def test_each_antigen_gets_its_own_channel():
+    antibodies = [conjugate(1, 'CD3', '170Er'), conjugate(2, 'CD4', '170Er'),
+                  conjugate(3, 'CD4', '145Nd'), conjugate(4, 'CD8', '89Y')]
+    design = design_panel(['cd3', 'CD4', 'CD8', 'CD4'], antibodies)
+    assert channel_of(design) == {'cd3': '170Er', 'CD4': '145Nd', 'CD8': '89Y'}
+    assert design.unassigned == []
+
+
+def test_antigens_differing_only_in_case_are_one_target():
+    antibodies = [conjugate(1, 'CD3', '170Er'), conjugate(2, 'CD3', '145Nd')]
+    design = design_panel(['CD3', 'cd3 ', ' Cd3'], antibodies)
+    assert [(antigen, ab['id']) for antigen, ab in design.assignments] == [('CD3', 1)]
+    assert design.unassigned == []
+
+
+def test_neighbouring_channels_are_avoided():
+    antibodies = [conjugate(1, 'CD3', '145Nd'), conjugate(2, 'CD4', '146Nd'),
+                  conjugate(3, 'CD4', '148Nd')]
+    design = design_panel(['CD3', 'CD4'], antibodies)
+    assert channel_of(design) == {'CD3': '145Nd', 'CD4': '148Nd'}
+    assert design.spillover == []
+
+
+def test_conjugates_short_of_one_test_are_left_out():
+    antibodies = [conjugate(1, 'CD3', '170Er', stock=1.0), conjugate(2, 'CD4', '145Nd')]
+    design = design_panel(['CD3', 'CD4', 'CD19'], antibodies, cell_count=4.0)
+    assert channel_of(design) == {'CD4': '145Nd'}
+    assert design.unassigned == ['CD3', 'CD19']
+
+
+def test_no_antigens_is_an_empty_design():
+    assert design_panel([' '], [conjugate(1, 'CD3', '170Er')]).assignments == []
+
+
+def test_unavoidable_spillover_is_reported():
+    antibodies = [conjugate(1, 'CD3', '145Nd'), conjugate(2, 'CD4', '146Nd')]
+    design = design_panel(['CD3', 'CD4'], antibodies)
+    assert [(a['id'], b['id'], reason) for a, b, _, reason in design.spillover] == [
+        (1, 2, 'M+1 impurity'), (2, 1, 'M-1 impurity')]
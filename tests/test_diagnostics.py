@@ -0,0 +1,72 @@
+"""Timing spans, counters and traces from Diagnostics"""
+
+import json
+
+import pytest
+
+from antibody_panel.diagnostics import Diagnostics, enabled_from_env
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class View:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def refresh(self, seconds):
+        self.clock.now += seconds
+        return seconds
+
+
+@pytest.mark.parametrize('value, enabled', [('', False), ('0', False), ('off', False),
+                                            ('1', True), ('yes', True)])
+def test_enabled_from_env(monkeypatch, value, enabled):
+    monkeypatch.setenv('ANTIBODY_PANEL_DIAGNOSTICS', value)
+    assert enabled_from_env() is enabled
+
+
+def test_instrumented_methods_are_timed():
+    clock = FakeClock()
+    diagnostics = Diagnostics(clock=clock)
+    view, other = View(clock), View(clock)
+    diagnostics.instrument(view, ['refresh'])
+    assert view.refresh(0.5) == 0.5
+    view.refresh(0.25)
+    other.refresh(1.0)
+    assert diagnostics.rows() == [('refresh', 2, 0.75, 0.375, 0.5, 0.25)]
+    assert 'refresh' not in vars(other)
+
+
+def test_trace_is_chrome_trace_format(tmp_path):
+    clock = FakeClock()
+    diagnostics = Diagnostics(clock=clock)
+    diagnostics.record_span('refresh', 100.0, 0.002)
+    diagnostics.record_counter('widgets', {'cards': 40})
+    diagnostics.record_lag(0.004)
+    diagnostics.record_lag(0.010)
+    assert diagnostics.lag() == (0.010, 0.007, 0.010, 2)
+
+    path = tmp_path / 'trace.json'
+    diagnostics.dump(str(path))
+    trace = json.loads(path.read_text(encoding='utf-8'))
+    assert [(e['ph'], e['name']) for e in trace['traceEvents']] == [
+        ('X', 'refresh'), ('C', 'widgets'), ('C', 'loop lag (ms)'), ('C', 'loop lag (ms)')]
+    assert trace['traceEvents'][0]['dur'] == 2000.0
+    assert trace['otherData']['stats']['refresh']['calls'] == 1
+
+    diagnostics.reset()
+    assert diagnostics.rows() == [] and diagnostics.lag() is None
+
+
+def test_event_buffer_is_bounded():
+    diagnostics = Diagnostics(clock=FakeClock(), max_events=3)
+    for n in range(5):
+        diagnostics.record_span('refresh', 100.0, 0.001)
+    assert len(diagnostics.trace()['traceEvents']) == 3
+    assert diagnostics.stats['refresh'][0] == 5
@@ -0,0 +1,68 @@
+"""Column maintenance and panel checks in VolumeEngine"""
+
+import numpy as np
+import pytest
+
+from antibody_panel.engine import VolumeEngine
+from antibody_panel.model import InventoryModel
+from antibody_panel.volumes import calculate_volume
+
+
+def record(ab_id, stock, per_test=2.0, stain='Extracellular', threshold=50.0):
+    return {'id': ab_id, 'antigen': f'CD{ab_id}', 'metal': f'{140 + ab_id}Nd',
+            'volumePerTest': per_test, 'stockVolume': stock, 'alertThreshold': threshold,
+            'stainType': stain}
+
+
+@pytest.fixture
+def model():
+    return InventoryModel([record(1, 500.0), record(2, 10.0, stain='Intracellular'),
+                           record(3, 30.0)])
+
+
+def test_check_scales_with_cell_count_and_stain_type(model):
+    check = VolumeEngine(model).check([1, 2], 8.0)
+    assert check.required.tolist() == pytest.approx([4.0, 0.8])
+    assert check.remaining.tolist() == pytest.approx([496.0, 9.2])
+    assert check.ok
+
+
+def test_check_reports_shortfalls(model):
+    check = VolumeEngine(model).check([3, 1], 80.0)
+    assert check.shortfall.tolist() == pytest.approx([10.0, 0.0])
+    assert not check.ok
+
+
+def test_columns_follow_the_model(model):
+    engine = VolumeEngine(model, capacity=1)
+    model.update(3, stockVolume=5.0)
+    model.remove(1)
+    for ab_id in range(4, 80):
+        model.add(record(ab_id, 100.0))
+    assert len(engine) == 78
+    assert engine.check([3], 4.0).available.tolist() == [5.0]
+    assert engine.check([79], 4.0).available.tolist() == [100.0]
+    assert engine.low_stock([2, 3, 4]).tolist() == [True, True, False]
+
+
+def test_scenarios_find_the_scarcest_antibody(model):
+    result = VolumeEngine(model).scenarios([[1, 3], [1], []], [4.0, 80.0])
+    assert result.max_cells.tolist() == [60.0, 1000.0, np.inf]
+    assert result.feasible.tolist() == [[True, False], [True, True], [True, True]]
+    assert result.total_volume[0].tolist() == pytest.approx([4.0, 80.0])
+
+
+def test_batch_is_checked_on_its_totals(model):
+    check = VolumeEngine(model).check_batch([1, 3], [8.0, 40.0])
+    assert check.required.ravel().tolist() == pytest.approx([4.0, 4.0, 20.0, 20.0])
+    assert check.total.tolist() == pytest.approx([24.0, 24.0])
+    assert check.ok
+    check = VolumeEngine(model).check_batch([1, 3], [40.0, 40.0])
+    assert check.shortfall.tolist() == pytest.approx([0.0, 10.0])
+    assert not check.ok
+
+
+def test_engine_agrees_with_calculate_volume(model):
+    check = VolumeEngine(model).check([1, 2], 6.0)
+    assert check.required.tolist() == pytest.approx(
+        [calculate_volume(model.get(1), 6.0), calculate_volume(model.get(2), 6.0)])
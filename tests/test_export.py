@@ -0,0 +1,70 @@
+"""CSV and NDJSON exports written by ExportJob"""
+
+import csv
+import os
+
+from antibody_panel.export import ExportJob, export_format, read_ndjson
+from conftest import antibody
+
+
+def history_entry(name):
+    return {'id': 1, 'timestamp': '2026-01-01T09:00:00.123456', 'user': 'tester',
+            'panelName': name, 'cellCount': 4.0,
+            'antibodies': [{'id': 1, 'antigen': 'CD3', 'metal': '170Er', 'volumeUsed': 2.0},
+                           {'id': 2, 'antigen': 'CD4', 'metal': '145Nd', 'volumeUsed': 0.5}]}
+
+
+def run(job):
+    job.start().join(5)
+    assert job.done and job.error is None
+    return job
+
+
+def test_format_follows_the_file_name():
+    assert export_format('inventory.JSONL') == 'ndjson'
+    assert export_format('inventory.csv') == 'csv'
+
+
+def test_inventory_csv_is_written_in_chunks(tmp_path):
+    path = str(tmp_path / 'inventory.csv')
+    records = [antibody(f'CD{n}', '170Er', stock=n) for n in range(25)]
+    job = run(ExportJob(path, records, 'inventory', chunk_size=10))
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == 'Antigen'
+    assert len(rows) == 26
+    assert rows[3][:3] == ['CD2', 'X1', '170Er'] and rows[3][6] == '2.00'
+    assert job.progress == 1.0
+    assert not os.path.exists(path + '.part')
+
+
+def test_history_csv_summarises_each_entry(tmp_path):
+    path = str(tmp_path / 'history.csv')
+    run(ExportJob(path, [history_entry('run')], 'history'))
+    with open(path, newline='', encoding='utf-8') as f:
+        row = list(csv.reader(f))[1]
+    assert row == ['2026-01-01 09:00:00', 'tester', 'run', '4.0', 'CD3(170Er); CD4(145Nd)',
+                   '2.50']
+
+
+def test_ndjson_round_trips_records(tmp_path):
+    path = str(tmp_path / 'history.ndjson')
+    entries = [history_entry('run µ1'), history_entry('run 2')]
+    run(ExportJob(path, entries, 'history'))
+    assert read_ndjson(path) == entries
+
+
+def test_cancelled_export_leaves_no_file(tmp_path):
+    path = str(tmp_path / 'inventory.csv')
+    job = ExportJob(path, [antibody('CD3', '170Er')] * 100, 'inventory', chunk_size=1)
+    job.cancel()
+    run(job)
+    assert job.cancelled
+    assert not os.path.exists(path) and not os.path.exists(path + '.part')
+
+
+def test_failed_export_reports_the_error(tmp_path):
+    path = str(tmp_path / 'missing' / 'inventory.csv')
+    job = ExportJob(path, [antibody('CD3', '170Er')], 'inventory')
+    job.start().join(5)
+    assert isinstance(job.error, OSError)
@@ -0,0 +1,67 @@
+"""Burn rates and depletion dates from ConsumptionForecast"""
+
+from datetime import date
+
+import pytest
+
+from antibody_panel.forecast import ConsumptionForecast, runs_out_text
+from antibody_panel.model import InventoryModel
+
+DAY = date(2026, 3, 10)
+
+
+def record(ab_id, antigen, metal, stock):
+    return {'id': ab_id, 'antigen': antigen, 'metal': metal, 'stockVolume': stock}
+
+
+@pytest.fixture
+def model():
+    return InventoryModel([record(1, 'CD3', '170Er', 100.0), record(2, 'CD4', '145Nd', 50.0)])
+
+
+def test_one_day_of_usage_is_the_burn_rate(model):
+    forecast = ConsumptionForecast(model)
+    forecast.record('2026-03-10T09:00:00', [(1, -8.0)])
+    assert forecast.burn_rate(1, DAY) == pytest.approx(8.0)
+    assert forecast.days_left(1, DAY) == pytest.approx(12.5)
+    assert forecast.depletion_date(1, DAY) == date(2026, 3, 22)
+    assert forecast.burn_rate(2, DAY) == 0.0
+    assert forecast.days_left(2, DAY) is None
+
+
+def test_steady_usage_converges_on_the_daily_amount(model):
+    forecast = ConsumptionForecast(model, span=7)
+    for day in range(1, 29):
+        forecast.consume(1, date(2026, 2, day), 4.0)
+    assert forecast.burn_rate(1, date(2026, 2, 28)) == pytest.approx(4.0)
+    assert forecast.used_since(1, 7, date(2026, 2, 28)) == pytest.approx(28.0)
+    # Idle days decay the rate
+    assert forecast.burn_rate(1, DAY) < 4.0
+
+
+def test_undo_takes_back_exactly_what_was_added(model):
+    forecast = ConsumptionForecast(model)
+    forecast.consume(1, date(2026, 3, 1), 6.0)
+    before = forecast.burn_rate(1, DAY)
+    forecast.record('2026-03-05T12:00:00', [(1, -8.0)])
+    forecast.record('2026-03-05T12:00:00', [(1, 8.0)])
+    assert forecast.burn_rate(1, DAY) == pytest.approx(before)
+
+    forecast.consume(1, date(2026, 3, 1), -6.0)
+    assert forecast.burn_rate(1, DAY) == 0.0
+    assert forecast.used_since(1, 30, DAY) == 0.0
+
+
+def test_seed_rows_without_ids_resolve_by_label(model):
+    forecast = ConsumptionForecast(model, [('2026-03-10', None, 'CD4', '145Nd', 5.0),
+                                           ('2026-03-10', 1, 'CD3', '170Er', 2.0)])
+    assert forecast.burn_rate(2, DAY) == pytest.approx(5.0)
+    assert forecast.burn_rate(1, DAY) == pytest.approx(2.0)
+    model.remove(2)
+    assert forecast.burn_rate(2, DAY) == 0.0
+
+
+def test_runs_out_text():
+    assert runs_out_text(None) == ''
+    assert runs_out_text(0.4) == 'today'
+    assert runs_out_text(12.2) == '~12 days'
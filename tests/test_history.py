@@ -0,0 +1,54 @@
+"""Paging and filtering executed panels through HistoryIndex"""
+
+import pytest
+
+from antibody_panel.history import HistoryIndex
+
+
+def entry(entry_id, name, day, user='alice'):
+    return {'id': entry_id, 'panelName': name, 'user': user,
+            'timestamp': f'2026-01-{day:02d}T09:00:00', 'antibodies': []}
+
+
+@pytest.fixture
+def history():
+    return HistoryIndex([entry(1, 'Zeta', 1), entry(2, 'alpha', 2, 'bob'),
+                         entry(3, 'Mid', 3), entry(4, 'beta', 4, 'bob')])
+
+
+def names(page):
+    return [e['panelName'] for e in page[1]]
+
+
+def test_iterates_newest_first(history):
+    assert [e['id'] for e in history] == [4, 3, 2, 1]
+
+
+def test_default_page_is_by_name(history):
+    assert history.page(offset=1, limit=2) == (4, [history.get(4), history.get(3)])
+
+
+def test_date_range_and_user_filters(history):
+    assert names(history.page(since='2026-01-02', until='2026-01-04')) == ['alpha', 'Mid']
+    assert names(history.page(user='bob', order='newest')) == ['beta', 'alpha']
+    total, page = history.page(since='2026-01-02', order='newest', offset=1, limit=1)
+    assert (total, [e['id'] for e in page]) == (3, [3])
+    assert history.page(user='carol') == (0, [])
+    assert history.users() == ['alice', 'bob']
+
+
+def test_names_are_tracked_case_insensitively(history):
+    assert history.has_name('ZETA')
+    history.add(entry(5, 'zeta', 5))
+    history.remove(1)
+    assert history.has_name('Zeta')
+    history.remove(5)
+    assert not history.has_name('zeta')
+    assert history.remove(5) is None
+
+
+def test_removing_a_users_last_entry_drops_the_user(history):
+    history.remove(2)
+    history.remove(4)
+    assert history.users() == ['alice']
+    assert len(history) == 2 and 4 not in history
@@ -0,0 +1,105 @@
+"""Planning CSV inventory imports"""
+
+import io
+
+import pytest
+
+from antibody_panel.importer import ImportFormatError, plan_import
+from antibody_panel.model import InventoryModel
+from antibody_panel.store import DEFAULT_INVENTORY, VersionConflict
+
+HEADER = 'Antigen,Clone,Metal,Stock Volume (µL),Notes'
+
+
+@pytest.fixture
+def model():
+    return InventoryModel([dict(ab, stainType='Extracellular') for ab in DEFAULT_INVENTORY])
+
+
+def plan(model, *rows):
+    return plan_import([HEADER, *rows], model)
+
+
+def lot_total(service, ab_id):
+    return sum(lot['volume'] for lot in service.lots.for_antibody(ab_id))
+
+
+def test_matching_rows_merge_and_new_rows_insert(model):
+    result = plan(model, 'CD3,UCHT1,170Er,600,Restocked', 'CD19,HIB19,142Nd,80,')
+    assert result.updates == [(1, {'stockVolume': 600.0, 'notes': 'Restocked'})]
+    assert [ab['antigen'] for ab in result.inserts] == ['CD19']
+    assert result.inserts[0]['stainType'] == 'Extracellular'
+    assert result.rows_read == 2
+
+
+def test_unchanged_rows_are_not_updates(model):
+    assert plan(model, 'CD3,UCHT1,170Er,500,Core marker').updates == []
+
+
+def test_a_different_clone_is_a_new_antibody(model):
+    result = plan(model, 'CD3,SK7,170Er,100,')
+    assert result.updates == []
+    assert [ab['clone'] for ab in result.inserts] == ['SK7']
+
+
+def test_bad_rows_are_reported_not_imported(model):
+    result = plan(model, 'CD19,HIB19,142Nd,lots,', 'CD20,2H7,147Sm,-1,',
+                  'CD19,HIB19,142Nd,10,', ',,,,', 'CD19,HIB19,142Nd,20,')
+    assert [ab['antigen'] for ab in result.inserts] == ['CD19']
+    assert [line for line, _ in result.errors] == [2, 3, 6]
+    assert 'Duplicate of line 4' in result.errors[2][1]
+
+
+def test_errors_point_at_file_lines_past_multi_line_notes(model):
+    text = '\n'.join([HEADER, 'CD19,HIB19,142Nd,80,"first line', 'second line"',
+                      'CD20,2H7,147Sm,lots,', 'CD19,HIB19,142Nd,10,'])
+    result = plan_import(io.StringIO(text, newline=''), model)
+    assert result.inserts[0]['notes'] == 'first line\nsecond line'
+    assert result.errors == [(4, "Stock Volume (µL): 'lots' is not a number"),
+                             (5, 'Duplicate of line 2 (CD19 / HIB19 / 142Nd)')]
+
+
+def test_non_finite_numbers_are_rejected(model):
+    result = plan(model, 'CD20,2H7,147Sm,nan,', 'CD21,B-ly4,148Nd,inf,')
+    assert result.inserts == []
+    assert [line for line, _ in result.errors] == [2, 3]
+    assert 'not a finite number' in result.errors[0][1]
+
+
+def test_file_without_required_columns_is_rejected(model):
+    with pytest.raises(ImportFormatError):
+        plan_import(['Antigen,Clone', 'CD3,UCHT1'], model)
+    with pytest.raises(ImportFormatError):
+        plan_import([], model)
+
+
+def test_plan_is_applied_in_one_journal_action(service):
+    service.apply_import(plan(service.inventory, 'CD3,UCHT1,170Er,600,Restocked',
+                              'CD19,HIB19,142Nd,80,'))
+    assert service.inventory.get(1)['stockVolume'] == 600.0
+    assert service.store.load_antibody(1)['notes'] == 'Restocked'
+    new = service.inventory.find('CD19', '142Nd')[0]
+    assert service.store.load_antibody(new['id'])['stockVolume'] == 80.0
+    assert [event['action'] for event in service.journal.query()] == ['antibody.import'] * 3
+
+
+def test_stock_decrease_draws_from_lots(service):
+    service.apply_import(plan(service.inventory, 'CD4,RPA-T4,145Nd,100,'))
+    assert service.store.load_antibody(2)['stockVolume'] == 100.0
+    assert lot_total(service, 2) == 100.0
+
+
+def test_merge_over_a_row_changed_elsewhere_conflicts(station):
+    a, b = station('a'), station('b')
+    result = plan(a.inventory, 'CD3,UCHT1,170Er,600,')
+    b.execute_panel('run', [1], 4.0)
+
+    with pytest.raises(VersionConflict):
+        a.apply_import(result)
+    assert a.store.load_antibody(1)['stockVolume'] < 500.0
+    assert a.store.load_antibody(1)['notes'] == 'Core marker'
+
+    # The conflict reloaded the row, so planning again succeeds
+    a.apply_import(plan(a.inventory, 'CD3,UCHT1,170Er,600,'))
+    assert a.store.load_antibody(1)['stockVolume'] == 600.0
+    assert lot_total(a, 1) == 600.0
@@ -0,0 +1,90 @@
+"""Appending, rolling and querying the segmented Journal"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from antibody_panel.journal import Journal
+
+
+def ab(ab_id, antigen='CD3', metal='170Er'):
+    return {'id': ab_id, 'antigen': antigen, 'metal': metal}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'journal')
+
+
+def actions(events):
+    return [event['action'] for event in events]
+
+
+def test_each_change_is_one_event(directory):
+    journal = Journal(directory)
+    events = journal.append('alice', 'stock.execute',
+                            [(ab(1), 'stockVolume', 500.0, 496.0), (ab(2), 'stockVolume', 40.0, 38.0)],
+                            ref=7)
+    journal.append('bob', 'panel.save')
+    assert [(e['antibodyId'], e['ref']) for e in events] == [(1, 7), (2, 7)]
+    assert [e['label'] for e in journal.query(antibody_id=2)] == ['CD3-170Er']
+    assert actions(journal.query(user='bob')) == ['panel.save']
+    journal.close()
+
+
+def test_segments_roll_by_size_and_by_month(directory):
+    journal = Journal(directory, max_bytes=600, block_events=2)
+    for day in range(1, 11):
+        journal.append('alice', 'antibody.update', [(ab(day % 3), 'notes', '', str(day))],
+                       when=datetime(2026, 1, day))
+    journal.append('alice', 'antibody.update', [(ab(1), 'notes', '', 'feb')],
+                   when=datetime(2026, 2, 1))
+    assert len(journal.segments()) > 2
+
+    january = list(journal.query(since=datetime(2026, 1, 4), until=datetime(2026, 1, 7)))
+    assert [e['new'] for e in january] == ['4', '5', '6']
+    assert [e['new'] for e in journal.query(antibody_id=1)] == ['1', '4', '7', '10', 'feb']
+    assert [e['new'] for e in journal.query(field='notes', since=datetime(2026, 2, 1))] == ['feb']
+    journal.close()
+
+
+def test_label_queries_follow_every_id_a_label_had(directory):
+    journal = Journal(directory)
+    journal.append('alice', 'antibody.add', [(ab(1, 'CD8', '146Nd'), None, None, {})])
+    journal.append('alice', 'antibody.add', [(ab(4, 'CD8', '146Nd'), None, None, {})])
+    journal.append('alice', 'antibody.add', [(ab(5, 'CD4', '145Nd'), None, None, {})])
+    assert [e['antibodyId'] for e in journal.query(label='CD8-146Nd')] == [1, 4]
+    assert list(journal.query(label='CD19-142Nd')) == []
+    journal.close()
+
+
+def test_reopening_reindexes_and_drops_a_torn_tail(directory):
+    journal = Journal(directory, max_bytes=300)
+    for n in range(6):
+        journal.append('alice', 'antibody.update', [(ab(1), 'notes', '', str(n))])
+    active = os.path.join(directory, journal.segments()[-1])
+    journal.close()
+    with open(active, 'ab') as f:
+        f.write(b'{"ts": "2026')
+
+    journal = Journal(directory, max_bytes=300)
+    journal.append('alice', 'antibody.update', [(ab(1), 'notes', '', 'after')])
+    assert [e['new'] for e in journal.query(antibody_id=1)] == ['0', '1', '2', '3', '4', '5',
+                                                                  'after']
+    journal.close()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="concurrent writers need fcntl")
+def test_writers_sharing_a_directory_index_each_others_events(directory):
+    first = Journal(directory, max_bytes=400)
+    second = Journal(directory, max_bytes=400)
+    for n in range(6):
+        writer = first if n % 2 else second
+        writer.append(f'writer{n % 2}', 'antibody.update', [(ab(1), 'notes', '', str(n))])
+    expected = [str(n) for n in range(6)]
+    assert [e['new'] for e in first.query(antibody_id=1)] == expected
+    assert [e['new'] for e in second.query(antibody_id=1)] == expected
+    assert first.segments() == second.segments()
+    first.close()
+    second.close()
@@ -0,0 +1,136 @@
+"""Draw order and expiry handling in LotIndex"""
+
+from datetime import date
+
+import pytest
+
+from antibody_panel.core import InvalidValue, MissingInput, UnknownPanel
+from antibody_panel.lots import LotIndex
+from antibody_panel.store import InsufficientStock
+
+TODAY = date(2026, 6, 1)
+
+
+def lot(lot_id, volume, expiry, conjugated='2026-01-01', ab_id=1):
+    return {'id': lot_id, 'antibodyId': ab_id, 'lotNumber': '', 'volume': volume,
+            'dateConjugated': conjugated, 'expiry': expiry}
+
+
+def test_draws_oldest_expiring_first():
+    index = LotIndex([lot(1, 10.0, '2026-12-01'), lot(2, 10.0, '2026-07-01'),
+                      lot(3, 10.0, ''), lot(4, 10.0, '2026-09-01')])
+    draws, uncovered = index.allocate(1, 25.0, today=TODAY)
+    assert draws == [(2, 10.0), (4, 10.0), (1, 5.0)]
+    assert uncovered == 0.0
+
+
+def test_same_expiry_draws_oldest_conjugation_then_oldest_lot():
+    index = LotIndex([lot(1, 5.0, '2026-09-01', '2026-03-01'),
+                      lot(2, 5.0, '2026-09-01', '2026-02-01'),
+                      lot(3, 5.0, '2026-09-01', '2026-02-01')])
+    draws, _ = index.allocate(1, 15.0, today=TODAY)
+    assert [lot_id for lot_id, _ in draws] == [2, 3, 1]
+
+
+def test_lots_without_expiry_are_drawn_last():
+    index = LotIndex([lot(1, 10.0, ''), lot(2, 10.0, '2030-01-01')])
+    draws, uncovered = index.allocate(1, 25.0, today=TODAY)
+    assert draws == [(2, 10.0), (1, 10.0)]
+    assert uncovered == 5.0
+    assert index.deposit_lot(1) == 1
+
+
+def test_expired_lots_are_skipped():
+    index = LotIndex([lot(1, 10.0, '2026-05-31'), lot(2, 10.0, '2026-06-01')])
+    draws, uncovered = index.allocate(1, 15.0, today=TODAY)
+    assert draws == [(2, 10.0)]
+    assert uncovered == 5.0
+    assert index.available(1, on=TODAY) == 10.0
+
+
+def test_write_down_takes_expired_lots_first():
+    index = LotIndex([lot(1, 10.0, '2026-05-31'), lot(2, 10.0, '2026-06-01')])
+    draws, uncovered = index.allocate(1, 15.0, today=TODAY, include_expired=True)
+    assert draws == [(1, 10.0), (2, 5.0)]
+    assert uncovered == 0.0
+
+
+def test_allocation_changes_nothing_until_volumes_are_set():
+    index = LotIndex([lot(1, 10.0, '2026-07-01'), lot(2, 10.0, '2026-08-01')])
+    assert index.allocate(1, 15.0, today=TODAY) == index.allocate(1, 15.0, today=TODAY)
+
+    index.set_volumes({1: 0.0, 2: 5.0})
+    assert index.allocate(1, 15.0, today=TODAY) == ([(2, 5.0)], 10.0)
+    index.set_volumes({1: 4.0})
+    assert index.allocate(1, 6.0, today=TODAY) == ([(1, 4.0), (2, 2.0)], 0.0)
+
+
+def test_expiry_queries():
+    index = LotIndex([lot(1, 10.0, '2026-05-31'), lot(2, 10.0, '2026-06-20'),
+                      lot(3, 10.0, '2026-09-01'), lot(4, 0.0, '2026-06-10')])
+    assert [l['id'] for l in index.expired(today=TODAY)] == [1]
+    assert [l['id'] for l in index.expiring_within(30, today=TODAY)] == [1, 2]
+    assert index.next_expiry(1) == '2026-05-31'
+    assert index.available(1, on=TODAY) == 20.0
+
+    index.remove_antibody(1)
+    assert index.expired(today=TODAY) == []
+    assert index.next_expiry(1) is None
+
+
+def test_added_lot_counts_towards_stock(service):
+    new = service.add_lot(2, 50.0, '2026-01-01', expiry='2099-01-01', lot_number='L-7')
+    assert service.inventory.get(2)['stockVolume'] == 500.0
+    assert service.lots.get(new['id'])['lotNumber'] == 'L-7'
+    assert service.lots.for_antibody(2)[0]['id'] == new['id']
+
+
+def test_added_lot_is_drawn_before_undated_stock(service):
+    new = service.add_lot(1, 50.0, '2026-01-01', expiry='2099-01-01')
+    entry = service.execute_panel('run', [1], 4.0)
+    drawn = entry['antibodies'][0]['lots']
+    assert [d['id'] for d in drawn] == [new['id']]
+    assert service.inventory.get(1)['stockVolume'] == pytest.approx(550.0 - drawn[0]['volume'])
+
+
+def test_execution_never_draws_on_expired_lots(station):
+    station().store.conn.execute("UPDATE lots SET expiry = '2000-01-01' WHERE antibodyId = 3")
+    with pytest.raises(InsufficientStock) as info:
+        station().execute_panel('run', [3], 4.0)
+    assert info.value.shortfalls[0][:2] == (3, 0.0)
+
+
+def test_added_lot_without_expiry_keeps_the_default_shelf_life(service):
+    new = service.add_lot(2, 50.0, '2026-01-01')
+    assert new['expiry'] > '2026-01-01'
+
+
+def test_add_lot_validates_its_input(service):
+    with pytest.raises(InvalidValue):
+        service.add_lot(2, 0.0, '2026-01-01')
+    with pytest.raises(MissingInput):
+        service.add_lot(2, 50.0, '')
+    with pytest.raises(UnknownPanel):
+        service.add_lot(99, 50.0, '2026-01-01')
+
+
+def test_discarded_lot_leaves_the_stock(service):
+    lot_id = service.lots.for_antibody(1)[0]['id']
+    assert service.discard_lot(lot_id) == 500.0
+    assert service.inventory.get(1)['stockVolume'] == 0.0
+    assert service.discard_lot(lot_id) == 0.0
+    with pytest.raises(InsufficientStock):
+        service.execute_panel('run', [1], 4.0)
+
+
+def test_write_down_takes_expired_stock(service):
+    service.store.conn.execute("UPDATE lots SET expiry = '2000-01-01' WHERE antibodyId = 3")
+    service.update_antibody(3, 'stockVolume', 5.0)
+    assert service.store.load_lots([3])[0]['volume'] == 5.0
+
+
+def test_write_down_the_lots_cannot_cover_is_refused(service):
+    service.store.conn.execute('UPDATE lots SET volume = 10 WHERE antibodyId = 2')
+    with pytest.raises(InsufficientStock):
+        service.update_antibody(2, 'stockVolume', 100.0)
+    assert service.store.load_antibody(2)['stockVolume'] == 450.0
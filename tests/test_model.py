@@ -0,0 +1,68 @@
+"""Indexes, change events and selection in InventoryModel"""
+
+import pytest
+
+from antibody_panel.model import InventoryModel, PanelSelection
+
+
+def record(ab_id, antigen, metal, stock=100.0):
+    return {'id': ab_id, 'antigen': antigen, 'metal': metal, 'stockVolume': stock}
+
+
+@pytest.fixture
+def model():
+    return InventoryModel([record(1, 'CD3', '170Er'), record(2, 'CD4', '145Nd'),
+                           record(3, 'CD3', '170Er')])
+
+
+def test_lookups(model):
+    assert [ab['id'] for ab in model.find('CD3', '170Er')] == [1, 3]
+    assert model.find('CD3', '89Y') == []
+    assert [ab['id'] for ab in model.resolve([2, 9, 1])] == [2, 1]
+    assert 2 in model and 9 not in model
+
+
+def test_label_change_moves_the_record_between_indexes(model):
+    assert model.update(3, metal='89Y') == {'metal': '170Er'}
+    assert [ab['id'] for ab in model.find('CD3', '170Er')] == [1]
+    assert [ab['id'] for ab in model.find('CD3', '89Y')] == [3]
+
+
+def test_listeners_see_only_real_changes(model):
+    events = []
+    model.subscribe(lambda event, ab, changes: events.append((event, ab['id'], changes)))
+    model.update(1, stockVolume=100.0)
+    model.adjust_stock(1, -10.0)
+    model.remove(2)
+    model.add(record(4, 'CD8', '146Nd'))
+    assert events == [('update', 1, {'stockVolume': 100.0}), ('remove', 2, {}), ('add', 4, {})]
+    assert model.get(1)['stockVolume'] == 90.0
+
+
+def test_selection_keeps_click_order_and_drops_removed_records(model):
+    selection = PanelSelection(model)
+    for ab_id in (3, 1, 9):
+        selection.set(ab_id, True)
+    selection.set(3, True)
+    assert selection.ids() == [3, 1]
+
+    model.remove(3)
+    assert [ab['id'] for ab in selection] == [1]
+    selection.set(1, False)
+    assert not selection
+
+
+def test_selection_replace_skips_unknown_ids(model):
+    selection = PanelSelection(model)
+    selection.replace([2, 7, 1, 2])
+    assert selection.ids() == [2, 1]
+
+
+def test_add_many_sends_one_event(model):
+    events = []
+    model.subscribe(lambda event, ab, changes: events.append((event, ab)))
+    batch = [record(4, 'CD8', '146Nd'), record(5, 'CD19', '142Nd')]
+    model.add_many(batch)
+    assert events == [('add_many', batch)]
+    assert [ab['id'] for ab in model.find('CD19', '142Nd')] == [5]
+
@@ -0,0 +1,59 @@
+"""Name search and cached summaries in SavedPanelIndex"""
+
+import pytest
+
+from antibody_panel.model import InventoryModel
+from antibody_panel.panels import SavedPanelIndex
+
+
+def panel(panel_id, name, antibody_ids):
+    return {'id': panel_id, 'name': name, 'antibodyIds': antibody_ids}
+
+
+@pytest.fixture
+def model():
+    return InventoryModel([{'id': 1, 'antigen': 'CD3', 'metal': '170Er'},
+                           {'id': 2, 'antigen': 'CD4', 'metal': '145Nd'}])
+
+
+@pytest.fixture
+def panels(model):
+    return SavedPanelIndex(model, [panel(1, 'T cell core', [1, 2]), panel(2, 'B cells', [2]),
+                                   panel(3, 'Activated T-cells', [1])])
+
+
+def names(found):
+    return [p['name'] for p in found]
+
+
+def test_listed_a_to_z(panels):
+    assert names(panels) == ['Activated T-cells', 'B cells', 'T cell core']
+
+
+def test_search_matches_word_prefixes(panels):
+    assert names(panels.search('cell')) == ['Activated T-cells', 'B cells', 'T cell core']
+    assert names(panels.search('t ce')) == ['Activated T-cells', 'T cell core']
+    assert names(panels.search('act t')) == ['Activated T-cells']
+    assert panels.search('ore') == []
+    assert names(panels.search('  ')) == names(panels)
+
+
+def test_summaries_are_cached_until_invalidated(model, panels):
+    assert panels.labels(panels.get(1)) == (2, 'CD3 - 170Er, CD4 - 145Nd')
+    model.update(2, metal='89Y')
+    assert panels.labels(panels.get(1))[1].endswith('145Nd')
+    assert panels.invalidate_antibody(2) == {1, 2}
+    assert panels.labels(panels.get(1)) == (2, 'CD3 - 170Er, CD4 - 89Y')
+    model.remove(1)
+    panels.invalidate_antibody(1)
+    assert panels.labels(panels.get(3)) == (0, '')
+
+
+def test_removal_clears_the_name_and_prefixes(panels):
+    assert panels.has_name('b CELLS')
+    panels.remove(2)
+    assert not panels.has_name('B cells')
+    assert panels.search('b') == []
+    panels.add(panel(4, 'B cells', [1]))
+    assert names(panels.search('b')) == ['B cells']
+    assert panels.remove(9) is None
@@ -0,0 +1,81 @@
+"""Substring queries, ordering and re-indexing in SearchIndex"""
+
+from antibody_panel.search import SearchIndex, metal_mass
+
+
+def record(ab_id, antigen, metal, clone=''):
+    return {'id': ab_id, 'antigen': antigen, 'metal': metal, 'clone': clone}
+
+
+def ids(records):
+    return [ab['id'] for ab in records]
+
+
+def sample_index():
+    return SearchIndex([record(1, 'CD8', '146Nd', 'SK1'), record(2, 'CD45RA', '153Eu', 'HI100'),
+                        record(3, 'CD4', '145Nd', 'RPA-T4'), record(4, 'CD45', '89Y', 'HI30')])
+
+
+def test_metal_mass():
+    assert metal_mass('146Nd') == 146
+    assert metal_mass('Nd') == 0
+    assert metal_mass(None) == 0
+
+
+def test_empty_query_lists_everything_by_antigen_then_mass():
+    assert ids(sample_index().search('')) == [3, 4, 2, 1]
+
+
+def test_short_and_long_queries_match_substrings():
+    index = sample_index()
+    assert ids(index.search('cd4')) == [3, 4, 2]
+    assert ids(index.search('45RA')) == [2]
+    assert ids(index.search('hi1')) == [2]
+    assert ids(index.search('cd45rx')) == []
+
+
+def test_search_is_limited_to_the_given_fields():
+    index = sample_index()
+    assert ids(index.search('nd', fields=('metal',))) == [3, 1]
+    assert ids(index.search('nd', fields=('antigen',))) == []
+
+
+def test_edits_and_removals_are_reindexed():
+    antibodies = [record(1, 'CD8', '146Nd'), record(2, 'CD3', '170Er')]
+    index = SearchIndex(antibodies)
+    antibodies[0]['antigen'] = 'CD19'
+    index.update(antibodies[0])
+    assert ids(index.search('cd8')) == []
+    assert ids(index.search('')) == [1, 2]
+
+    index.remove(2)
+    index.add(record(5, 'CD20', '147Sm'))
+    assert ids(index.search('cd')) == [1, 5]
+    assert len(index) == 2
+
+
+def test_add_many_replaces_known_records():
+    index = sample_index()
+    index.add_many([record(1, 'CD19', '142Nd'), record(5, 'CD20', '147Sm')])
+    assert ids(index.search('cd8')) == []
+    assert ids(index.search('')) == [1, 5, 3, 4, 2]
+    assert len(index) == 5
+
+
+def test_search_within_a_set_of_ids():
+    index = sample_index()
+    assert ids(index.search('', within={1, 4, 9})) == [4, 1]
+    assert ids(index.search('cd4', within={1, 4})) == [4]
+
+
+def test_one_record_agrees_with_a_full_search():
+    index = sample_index()
+    for query, fields in [('cd4', None), ('hi', ('clone',)), ('nd', ('antigen',)), ('', None)]:
+        found = set(ids(index.search(query, fields=fields)))
+        assert {i for i in range(1, 5) if index.matches(i, query, fields)} == found
+    assert not index.matches(99, '')
+
+
+def test_sort_keys_order_like_search_results():
+    index = sample_index()
+    assert sorted(range(1, 5), key=index.sort_key) == ids(index.search(''))
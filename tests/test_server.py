@@ -0,0 +1,147 @@
+"""The JSON API served by PanelServer"""
+
+import http.client
+import json
+import socket
+
+import pytest
+
+from antibody_panel.core import PanelService
+from antibody_panel.server import ServerThread, start_from_env
+from antibody_panel.store import PanelStore
+
+
+@pytest.fixture
+def api(db_path):
+    service = PanelService(PanelStore(db_path))
+    service.save_panel('T cells', [1, 3])
+    service.close()
+    thread = ServerThread(db_path=db_path, port=0).start()
+    yield thread.server
+    thread.stop()
+
+
+def request(api, method, path, body=None):
+    conn = http.client.HTTPConnection(api.host, api.port, timeout=5)
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body))
+        response = conn.getresponse()
+        data = response.read()
+        if response.getheader('Content-Type') == 'application/x-ndjson':
+            return response.status, [json.loads(line) for line in data.splitlines()]
+        return response.status, json.loads(data)
+    finally:
+        conn.close()
+
+
+def raw(api, data):
+    with socket.create_connection((api.host, api.port), timeout=5) as sock:
+        sock.sendall(data)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+
+def test_inventory_search_and_lookup(api):
+    status, found = request(api, 'GET', '/inventory?q=cd')
+    assert status == 200
+    assert [ab['antigen'] for ab in found] == ['CD3', 'CD4', 'CD8']
+    assert [ab['antigen'] for ab in request(api, 'GET', '/inventory?low=1')[1]] == ['CD8']
+    status, ab = request(api, 'GET', '/inventory/2')
+    assert (status, ab['antigen'], ab['low']) == (200, 'CD4', False)
+    assert request(api, 'GET', '/inventory/99')[0] == 404
+    assert request(api, 'GET', '/inventory/abc')[0] == 404
+
+
+def test_panels_are_listed_with_summaries(api):
+    status, panels = request(api, 'GET', '/panels')
+    assert status == 200
+    assert [(p['name'], p['antibodyCount'], p['summary']) for p in panels] == [
+        ('T cells', 2, 'CD3 - 170Er, CD8 - 146Nd')]
+
+
+def test_check_reports_feasibility_per_cell_count(api):
+    status, result = request(api, 'POST', '/panels/check', {'panel': 't cells', 'cells': [4, 80]})
+    assert status == 200
+    assert result['maxCells'] == 70.0
+    assert [c['feasible'] for c in result['checks']] == [True, False]
+    assert [s['id'] for s in result['checks'][1]['shortfalls']] == [3]
+    status, result = request(api, 'POST', '/panels/check', {'antibodyIds': [1, 99]})
+    assert (result['antibodyIds'], result['unknownIds']) == ([1], [99])
+
+
+def test_execute_and_stream_history(api):
+    status, entry = request(api, 'POST', '/panels/execute',
+                            {'panel': 'T cells', 'cells': 8, 'name': 'plate 1', 'user': 'lims'})
+    assert status == 201
+    assert [ab['volumeUsed'] for ab in entry['antibodies']] == [4.0, 4.0]
+    status, error = request(api, 'POST', '/panels/execute', {'panel': 'T cells', 'name': 'plate 1'})
+    assert status == 409 and 'already been executed' in error['error']
+
+    status, entries = request(api, 'GET', '/history?user=lims')
+    assert status == 200
+    assert [e['panelName'] for e in entries] == ['plate 1']
+    assert request(api, 'GET', '/history?user=nobody') == (200, [])
+    assert api.service.user != 'lims'
+
+
+def test_insufficient_stock_lists_shortfalls(api):
+    status, error = request(api, 'POST', '/panels/execute',
+                            {'antibodyIds': [3], 'cells': 100, 'name': 'big'})
+    assert status == 409
+    assert [s['id'] for s in error['shortfalls']] == [3]
+
+
+def test_repeated_antibody_ids_are_drawn_once(api):
+    status, entry = request(api, 'POST', '/panels/execute',
+                            {'antibodyIds': [1, 1], 'cells': 4, 'name': 'twice'})
+    assert status == 201
+    assert [ab['id'] for ab in entry['antibodies']] == [1]
+    assert request(api, 'GET', '/inventory/1')[1]['stockVolume'] == 498.0
+
+
+def test_bad_requests(api):
+    assert request(api, 'POST', '/inventory')[0] == 405
+    assert request(api, 'GET', '/nowhere')[0] == 404
+    assert request(api, 'POST', '/panels/check', {'cells': 4})[0] == 400
+    assert request(api, 'POST', '/panels/check', {'antibodyIds': [1], 'cells': -1})[0] == 400
+    assert request(api, 'POST', '/panels/execute', {'antibodyIds': [1]})[0] == 400
+    assert request(api, 'POST', '/panels/execute', {'panel': 'B cells'})[0] == 404
+
+
+def test_malformed_http_is_answered_and_closed(api):
+    assert raw(api, b'GARBAGE\r\n\r\n').startswith(b'HTTP/1.1 400 ')
+    assert raw(api, b'POST /panels/check HTTP/1.1\r\nConnection: close\r\n'
+                    b'Content-Length: 2\r\n\r\n{]').startswith(b'HTTP/1.1 400 ')
+    assert raw(api, b'POST /panels/check HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+                    b'0\r\n\r\n').startswith(b'HTTP/1.1 411 ')
+    assert raw(api, b'POST /panels/check HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n'
+               ).startswith(b'HTTP/1.1 413 ')
+    for length in (b'abc', b'-5'):
+        assert raw(api, b'POST /panels/check HTTP/1.1\r\nContent-Length: ' + length +
+                   b'\r\n\r\n').startswith(b'HTTP/1.1 400 ')
+
+
+def test_keep_alive_and_http_1_0_history(api):
+    reply = raw(api, b'GET /panels HTTP/1.1\r\n\r\n'
+                     b'GET /panels HTTP/1.1\r\nConnection: close\r\n\r\n')
+    assert reply.count(b'HTTP/1.1 200 OK') == 2
+    reply = raw(api, b'GET /history HTTP/1.0\r\n\r\n')
+    head, _, body = reply.partition(b'\r\n\r\n')
+    assert b'Transfer-Encoding' not in head and b'Connection: close' in head
+    assert body == b''
+
+
+def test_api_is_off_unless_configured(monkeypatch, db_path):
+    monkeypatch.delenv('ANTIBODY_PANEL_API', raising=False)
+    assert start_from_env(db_path) is None
+
+
+@pytest.mark.parametrize('value', ['host:abc', 'host:', '0', '70000'])
+def test_malformed_api_setting_is_rejected_before_starting(monkeypatch, db_path, value):
+    monkeypatch.setenv('ANTIBODY_PANEL_API', value)
+    with pytest.raises(ValueError, match='ANTIBODY_PANEL_API'):
+        start_from_env(db_path)
@@ -0,0 +1,320 @@
+"""Executing and undoing panels through PanelService, on one or two stations"""
+
+import pytest
+
+from antibody_panel.core import DuplicateName, InvalidValue, MissingInput, UnknownPanel, parse_samples
+from antibody_panel.store import InsufficientStock, VersionConflict
+from conftest import antibody
+
+
+def stock(service, ab_id):
+    return service.inventory.get(ab_id)['stockVolume']
+
+
+def test_execute_draws_stock(service):
+    entry = service.execute_panel('run 1', [1, 2], 4.0)
+    used = {ab['id']: ab['volumeUsed'] for ab in entry['antibodies']}
+    assert used == {1: 2.0, 2: 2.0}
+    assert stock(service, 1) == pytest.approx(498.0)
+    assert service.store.load_antibody(1)['stockVolume'] == stock(service, 1)
+    assert service.panel_history.get(entry['id']) is entry
+
+
+def test_execute_records_the_given_user(service):
+    assert service.execute_panel('run 1', [1], 4.0, user='alice')['user'] == 'alice'
+    assert service.execute_panel('run 2', [1], 4.0)['user'] == 'tester'
+    assert [event['user'] for event in service.journal.query()] == ['alice', 'tester']
+
+
+def test_duplicate_ids_are_drawn_once(service):
+    entry = service.execute_panel('run', [1, 1, 3], 4.0)
+    assert [ab['id'] for ab in entry['antibodies']] == [1, 3]
+    assert stock(service, 1) == pytest.approx(498.0)
+    assert service.store.load_antibody(1)['stockVolume'] == pytest.approx(498.0)
+
+
+@pytest.mark.parametrize('cells', [0.0, -8.0])
+def test_cell_count_must_be_positive(service, cells):
+    with pytest.raises(InvalidValue):
+        service.execute_panel('neg', [1, 2], cells)
+    assert stock(service, 1) == 500.0
+    assert service.store.load_antibody(2)['stockVolume'] == 450.0
+    assert service.store.load_history() == []
+
+
+def test_execute_validates_before_writing(service):
+    with pytest.raises(MissingInput):
+        service.execute_panel('run', [], 4.0)
+    with pytest.raises(MissingInput):
+        service.execute_panel('  ', [1], 4.0)
+    service.execute_panel('run', [1], 4.0)
+    with pytest.raises(DuplicateName):
+        service.execute_panel('RUN', [1], 4.0)
+    with pytest.raises(InsufficientStock) as info:
+        service.execute_panel('big run', [1, 3], 100.0)
+    assert [ab_id for ab_id, _, _ in info.value.shortfalls] == [3]
+    assert len(service.store.load_history()) == 1
+
+
+def test_prepared_execution_writes_nothing(service):
+    entry = service.prepare_execution('dry', [1], 8.0)
+    assert entry['antibodies'][0]['volumeUsed'] == 4.0
+    assert stock(service, 1) == 500.0
+    assert service.store.load_history() == []
+
+
+def test_undo_restores_stock(service):
+    entry = service.execute_panel('run', [1, 3], 4.0)
+    service.undo_execution(entry['id'])
+    assert stock(service, 1) == 500.0
+    assert stock(service, 3) == 35.0
+    assert entry['id'] not in service.panel_history
+    assert service.store.load_history() == []
+    with pytest.raises(UnknownPanel):
+        service.undo_execution(entry['id'])
+
+
+def test_double_undo_across_stations_returns_stock_once(station):
+    a, b = station('a'), station('b')
+    entry = a.execute_panel('run', [1], 40.0)
+    b.sync()
+    assert len(b.panel_history) == 1
+
+    a.undo_execution(entry['id'])
+    with pytest.raises(UnknownPanel):
+        b.undo_execution(entry['id'])
+    assert b.store.load_antibody(1)['stockVolume'] == 500.0
+    assert stock(b, 1) == 500.0
+    assert entry['id'] not in b.panel_history
+
+
+def test_undo_after_antibody_deleted_elsewhere(station):
+    a, b = station('a'), station('b')
+    entry = a.execute_panel('run', [1, 2], 4.0)
+    b.delete_antibody(2)
+
+    a.undo_execution(entry['id'])
+    assert a.store.load_antibody(1)['stockVolume'] == 500.0
+    assert a.store.load_antibody(2) is None
+    assert a.store.load_history() == []
+
+
+def test_undo_skips_a_deleted_antibody_despite_a_new_one_with_its_label(service):
+    entry = service.execute_panel('run', [1, 3], 4.0)
+    service.delete_antibody(3)
+    new = service.add_antibody(antibody('CD8', '146Nd', stock=20.0, clone='SK1'))
+
+    service.undo_execution(entry['id'])
+    assert stock(service, 1) == 500.0
+    assert stock(service, new['id']) == 20.0
+    assert service.store.load_antibody(new['id'])['stockVolume'] == 20.0
+
+
+def test_legacy_history_entries_match_by_label(service):
+    entry = service.execute_panel('run', [1], 4.0)
+    del entry['antibodies'][0]['id']
+    assert service.history_stock_changes(entry) == [(1, 2.0)]
+
+
+def test_undo_after_history_deleted_elsewhere(station):
+    a, b = station('a'), station('b')
+    entry = a.execute_panel('run', [1], 4.0)
+    b.sync()
+    b.delete_history(entry['id'])
+
+    with pytest.raises(UnknownPanel):
+        a.undo_execution(entry['id'])
+    assert a.store.load_antibody(1)['stockVolume'] == stock(a, 1) < 500.0
+
+
+def test_delete_of_an_antibody_deleted_elsewhere(station):
+    a, b = station('a'), station('b')
+    a.delete_antibody(2)
+    with pytest.raises(UnknownPanel):
+        b.delete_antibody(2)
+    assert 2 not in b.inventory
+    with pytest.raises(UnknownPanel):
+        b.delete_antibody(2)
+
+
+@pytest.mark.parametrize('field, value', [('notes', 'edited'), ('stockVolume', 100.0)])
+def test_edit_of_an_antibody_deleted_elsewhere(station, field, value):
+    a, b = station('a'), station('b')
+    b.lots                                  # built, so a stock edit plans its lot draws
+    a.delete_antibody(2)
+    with pytest.raises(UnknownPanel):
+        b.update_antibody(2, field, value)
+    assert 2 not in b.inventory
+    assert b.store.load_antibody(2) is None
+    with pytest.raises(UnknownPanel):
+        b.update_antibody(2, field, value)
+
+
+def test_delete_of_history_deleted_elsewhere(station):
+    a, b = station('a'), station('b')
+    entry = a.execute_panel('run', [1], 4.0)
+    b.sync()
+    assert entry['id'] in b.panel_history
+    a.undo_execution(entry['id'])
+    with pytest.raises(UnknownPanel):
+        b.delete_history(entry['id'])
+    assert entry['id'] not in b.panel_history
+    assert [event['action'] for event in b.journal.query()] == ['stock.execute', 'stock.undo']
+
+
+def test_delete_of_a_saved_panel_deleted_elsewhere(station):
+    a, b = station('a'), station('b')
+    panel = a.save_panel('T cells', [1, 2])
+    b.sync()
+    assert b.saved_panels.get(panel['id']) is not None
+    a.delete_saved_panel(panel['id'])
+    with pytest.raises(UnknownPanel):
+        b.delete_saved_panel(panel['id'])
+    assert b.saved_panels.get(panel['id']) is None
+
+
+def test_delete_history_keeps_stock(service):
+    entry = service.execute_panel('run', [1], 4.0)
+    service.delete_history(entry['id'])
+    assert stock(service, 1) == 498.0
+    assert service.store.load_history() == []
+
+
+def test_saved_panels(service):
+    with pytest.raises(MissingInput):
+        service.save_panel('T cells', [])
+    panel = service.save_panel('T cells', [1, 2])
+    with pytest.raises(DuplicateName):
+        service.save_panel('t cells', [1])
+    assert service.find_saved_panel(' T CELLS ') is panel
+    assert service.store.load_saved_panels()[0]['antibodyIds'] == [1, 2]
+
+    service.delete_saved_panel(panel['id'])
+    with pytest.raises(UnknownPanel):
+        service.find_saved_panel('T cells')
+    assert service.store.load_saved_panels() == []
+
+
+def test_inventory_edits_are_written_and_journalled(service):
+    new = service.add_antibody(antibody('CD19', '142Nd'))
+    service.update_antibody(new['id'], 'notes', 'B cells')
+    service.delete_antibody(2)
+    assert service.store.load_antibody(new['id'])['notes'] == 'B cells'
+    assert service.store.load_antibody(2) is None
+    actions = [event['action'] for event in service.journal.query()]
+    assert actions == ['antibody.add', 'antibody.update', 'antibody.delete']
+
+
+def test_stock_edit_with_stale_row_conflicts(station):
+    a, b = station('a'), station('b')
+    a.update_antibody(1, 'stockVolume', 300.0)
+    with pytest.raises(VersionConflict):
+        b.update_antibody(1, 'stockVolume', 200.0)
+    # The conflict reloaded the row, so the edit can be made again
+    assert stock(b, 1) == 300.0
+    b.update_antibody(1, 'stockVolume', 200.0)
+    assert b.store.load_antibody(1)['stockVolume'] == 200.0
+
+
+def test_execution_after_another_station_drew_stock(station):
+    a, b = station('a'), station('b')
+    entry = b.prepare_execution('second', [3], 40.0)      # checked against b's stale stock
+    a.update_antibody(3, 'stockVolume', 10.0)
+    with pytest.raises(InsufficientStock):
+        b.record_execution(entry)
+    assert b.store.load_antibody(3)['stockVolume'] == 10.0
+    assert b.store.load_history() == []
+
+
+def test_batch_is_recorded_under_one_id(service):
+    batch = service.execute_batch([1, 2], [('s1', 4.0), ('s2', 2.0)])
+    ids = [entry['id'] for entry in batch]
+    assert len(set(ids)) == 2
+    assert {entry['batchId'] for entry in service.store.load_history()} == {ids[0]}
+    assert stock(service, 1) == pytest.approx(497.0)
+    assert [service.panel_history.get(i)['panelName'] for i in ids] == ['s1', 's2']
+
+
+def test_batch_records_the_given_user(service):
+    batch = service.execute_batch([1], [('s1', 4.0), ('s2', 2.0)], user='alice')
+    assert [entry['user'] for entry in batch] == ['alice', 'alice']
+    assert {entry['user'] for entry in service.store.load_history()} == {'alice'}
+    assert [event['user'] for event in service.journal.query()] == ['alice']
+    assert service.execute_batch([1], [('s3', 4.0)])[0]['user'] == 'tester'
+
+
+def test_batch_runs_whole_or_not_at_all(service):
+    # 35 µL of CD8 covers 60M cells in total, not 80M
+    with pytest.raises(InsufficientStock) as info:
+        service.execute_batch([1, 3], [('s1', 40.0), ('s2', 40.0)])
+    assert info.value.shortfalls == [(3, 35.0, pytest.approx(40.0))]
+    assert stock(service, 1) == 500.0
+    assert service.store.load_history() == []
+
+
+def test_batch_validates_its_samples(service):
+    with pytest.raises(MissingInput):
+        service.prepare_batch([1], [])
+    with pytest.raises(DuplicateName):
+        service.prepare_batch([1], [('s1', 4.0), ('S1', 2.0)])
+    with pytest.raises(InvalidValue):
+        service.prepare_batch([1], [('s1', 0.0)])
+    service.execute_panel('s2', [1], 4.0)
+    with pytest.raises(DuplicateName):
+        service.prepare_batch([1], [('s2', 4.0)])
+
+
+def test_undoing_one_sample_returns_its_share(service):
+    first, second = service.execute_batch([1], [('s1', 4.0), ('s2', 8.0)])
+    service.undo_execution(second['id'])
+    assert stock(service, 1) == pytest.approx(498.0)
+    assert service.store.load_antibody(1)['stockVolume'] == pytest.approx(498.0)
+    assert [entry['id'] for entry in service.store.load_history()] == [first['id']]
+
+
+def test_concurrent_stations_get_distinct_ids(station):
+    a, b = station('a'), station('b')
+    first = a.add_antibody(antibody('CD19', '142Nd'))
+    second = b.add_antibody(antibody('CD20', '147Sm'))
+    assert first['id'] != second['id']
+    panels = [a.save_panel('T cells', [1, 2]), b.save_panel('B cells', [1])]
+    assert panels[0]['id'] != panels[1]['id']
+    runs = [a.execute_panel('run a', [1], 4.0), b.execute_panel('run b', [1], 4.0)]
+    assert runs[0]['id'] != runs[1]['id']
+
+
+def test_parse_samples_skips_the_header_and_blank_lines():
+    lines = ['Sample,Cells\n', 's1, 4\n', '\n', 's2\t2.5\n']
+    assert parse_samples(lines) == [('s1', 4.0), ('s2', 2.5)]
+    with pytest.raises(InvalidValue):
+        parse_samples(['s1, 4', 's2, many'])
+    with pytest.raises(InvalidValue):
+        parse_samples(['s1'])
+
+
+@pytest.fixture
+def broken_journal(service, monkeypatch):
+    """Journal appends fail after the store commits; returns the reported failures"""
+    def append(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(service.journal, 'append', append)
+    failures = []
+    service.on_journal_error = lambda action, exc: failures.append(action)
+    return failures
+
+
+def test_failed_journal_append_still_updates_the_model(service, broken_journal):
+    entry = service.execute_panel('run', [1], 4.0)
+    assert stock(service, 1) == service.store.load_antibody(1)['stockVolume'] == 498.0
+    assert service.panel_history.get(entry['id']) is entry
+    with pytest.raises(DuplicateName):
+        service.execute_panel('run', [1], 4.0)
+
+    service.undo_execution(entry['id'])
+    assert stock(service, 1) == 500.0
+    service.update_antibody(2, 'notes', 'edited')
+    assert service.inventory.get(2)['notes'] == 'edited'
+    service.delete_antibody(3)
+    assert 3 not in service.inventory
+    assert broken_journal == ['stock.execute', 'stock.undo', 'antibody.update',
+                              'antibody.delete']
@@ -0,0 +1,53 @@
+"""Conflict and spillover warnings from SpilloverChecker"""
+
+import numpy as np
+
+from antibody_panel.spillover import CROSSTALK, SpilloverChecker
+
+MASSES = {1: 145, 2: 146, 3: 146, 4: 162, 5: 170}
+
+
+def checker(*ids):
+    checker = SpilloverChecker(MASSES.get)
+    checker.sync(ids)
+    return checker
+
+
+def kinds(warnings):
+    return [(w.kind, w.mass) for w in warnings]
+
+
+def test_crosstalk_matrix_follows_the_rules():
+    assert CROSSTALK[145, 146] == 0.02
+    assert CROSSTALK[146, 145] == 0.01
+    assert CROSSTALK[146, 162] == 0.03
+    assert CROSSTALK[145, 150] == 0.0
+
+
+def test_separate_channels_have_no_warnings():
+    assert checker(1, 5).warnings() == []
+
+
+def test_conflicts_come_before_spillover():
+    warnings = checker(1, 2, 3, 4).warnings(label=lambda i: f'ab{i}')
+    assert kinds(warnings) == [('conflict', 146), ('spillover', 162), ('spillover', 145),
+                               ('spillover', 146)]
+    assert warnings[0].message == 'ab2 & ab3 share mass 146'
+    assert warnings[1].fraction == 0.06
+    assert warnings[2].message == 'ab1 receives 2% from ab2 & ab3 (M-1 impurity)'
+    assert 'ab1 (M+1 impurity)' in warnings[3].message
+
+
+def test_sync_applies_only_the_difference():
+    c = checker(1, 2)
+    c.sync([2, 4])
+    assert c.counts[145] == 0 and c.counts[162] == 1
+    assert kinds(c.warnings()) == [('spillover', 162)]
+    MASSES[4] = 163                 # the antibody was re-conjugated
+    try:
+        c.sync([2, 4])
+        assert c.counts[162] == 0 and c.counts[163] == 1
+    finally:
+        MASSES[4] = 162
+    c.sync([])
+    assert not c.received.any() and not np.count_nonzero(c.counts)
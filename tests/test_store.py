@@ -0,0 +1,227 @@
+"""Reading, writing and conditional updates through PanelStore"""
+
+import sqlite3
+
+import pytest
+
+from antibody_panel.store import InsufficientStock, PanelStore, VersionConflict, history_pages
+from conftest import antibody
+
+
+def history_entry(name, ab_id, volume, timestamp='2026-01-01T09:00:00'):
+    return {'id': None, 'timestamp': timestamp, 'user': 'tester',
+            'panelName': name, 'cellCount': 4.0,
+            'antibodies': [{'id': ab_id, 'antigen': 'CD3', 'metal': '170Er',
+                            'volumeUsed': volume}]}
+
+
+@pytest.fixture
+def store(db_path):
+    store = PanelStore(db_path)
+    yield store
+    store.close()
+
+
+def stock_of(store, ab_id):
+    return {ab['id']: ab['stockVolume'] for ab in store.load_inventory()}[ab_id]
+
+
+def test_new_database_is_seeded(store):
+    assert [ab['antigen'] for ab in store.load_inventory()] == ['CD3', 'CD4', 'CD8']
+    assert store.load_saved_panels() == []
+    assert store.load_history() == []
+
+
+def test_rows_survive_reopening(db_path):
+    store = PanelStore(db_path)
+    assert store.insert_antibody(antibody('CD19', '142Nd')) == 4
+    store.close()
+
+    store = PanelStore(db_path)
+    try:
+        assert [ab['id'] for ab in store.load_inventory()] == [1, 2, 3, 4]
+    finally:
+        store.close()
+
+
+def test_update_writes_only_the_given_columns(store):
+    store.update_antibody(2, notes='edited')
+    row = {ab['id']: ab for ab in store.load_inventory()}[2]
+    assert row['notes'] == 'edited'
+    assert row['stockVolume'] == 450.0
+
+
+def test_unknown_field_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.update_antibody(1, colour='red')
+
+
+def test_execution_and_undo_move_stock(store):
+    entry = history_entry('run', 1, 20.0)
+    store.record_execution(entry, [(1, -20.0)])
+    assert stock_of(store, 1) == 480.0
+    assert [entry['panelName'] for entry in store.load_history()] == ['run']
+
+    store.undo_execution(entry['id'], [(1, 20.0)])
+    assert stock_of(store, 1) == 500.0
+    assert store.load_history() == []
+
+
+def test_undo_twice_returns_stock_once(store):
+    entry = history_entry('run', 1, 20.0)
+    store.record_execution(entry, [(1, -20.0)])
+    store.undo_execution(entry['id'], [(1, 20.0)])
+    with pytest.raises(KeyError):
+        store.undo_execution(entry['id'], [(1, 20.0)])
+    assert stock_of(store, 1) == 500.0
+
+
+def test_ids_are_assigned_and_never_reused(store):
+    ab_id = store.insert_antibody(antibody('CD19', '142Nd'))
+    assert ab_id == 4
+    store.delete_antibody(ab_id)
+    assert store.insert_antibody(antibody('CD20', '147Sm')) == 5
+
+
+def test_batch_entries_share_the_first_id(store):
+    entries = [history_entry('a', 1, 2.0), history_entry('b', 1, 2.0)]
+    store.record_batch(entries, [(1, -4.0)])
+    assert entries[0]['id'] != entries[1]['id']
+    assert {entry['batchId'] for entry in store.load_history()} == {entries[0]['id']}
+
+
+def test_history_is_newest_first(store):
+    store.record_execution(history_entry('early', 1, 2.0, '2026-01-01T09:00:00'), [])
+    store.record_execution(history_entry('late', 1, 2.0, '2026-01-02T09:00:00'), [])
+    assert [entry['panelName'] for entry in store.load_history()] == ['late', 'early']
+    assert store.load_history()[0]['antibodies'][0]['volumeUsed'] == 2.0
+
+
+def test_saved_panels_keep_their_antibody_ids(store):
+    panel_id = store.insert_saved_panel({'name': 'T cells', 'antibodyIds': [1, 2],
+                                         'createdBy': 'tester',
+                                         'createdAt': '2026-01-01T09:00:00'})
+    assert store.load_saved_panels()[0]['antibodyIds'] == [1, 2]
+    store.delete_saved_panel(panel_id)
+    assert store.load_saved_panels() == []
+    with pytest.raises(KeyError):
+        store.delete_saved_panel(panel_id)
+
+
+def test_import_inserts_and_merges_in_one_transaction(store):
+    new = antibody('CD19', '142Nd')
+    lot_id = store.load_lots([1])[0]['id']
+    store.import_antibodies([new], [(1, {'stockVolume': 600.0})], [(lot_id, 100.0)])
+    assert stock_of(store, 1) == 600.0
+    assert stock_of(store, new['id']) == 100.0
+
+    with pytest.raises(ValueError):
+        store.import_antibodies([antibody('CD20', '147Sm')], [(1, {'colour': 'red'})])
+    assert [ab['antigen'] for ab in store.load_inventory()] == ['CD3', 'CD4', 'CD8', 'CD19']
+
+
+def test_daily_usage_is_summed_per_day_and_antibody(store):
+    store.record_execution(history_entry('a', 1, 2.0, '2026-01-01T09:00:00'), [])
+    store.record_execution(history_entry('b', 1, 3.0, '2026-01-01T15:00:00'), [])
+    store.record_execution(history_entry('c', 1, 4.0, '2026-01-02T09:00:00'), [])
+    assert sorted(tuple(row) for row in store.load_daily_usage()) == [
+        ('2026-01-01', 1, 'CD3', '170Er', 5.0), ('2026-01-02', 1, 'CD3', '170Er', 4.0)]
+
+
+def test_execution_short_of_stock_writes_nothing(store):
+    with pytest.raises(InsufficientStock) as info:
+        store.record_execution(history_entry('run', 3, 40.0), [(1, -10.0), (3, -40.0)])
+    assert info.value.shortfalls == [(3, 35.0, 40.0)]
+    assert stock_of(store, 1) == 500.0
+    assert store.load_history() == []
+
+
+def test_execution_returns_the_stock_it_wrote(store):
+    lot_id = store.load_lots([1])[0]['id']
+    stock, lots = store.record_execution(history_entry('run', 1, 20.0), [(1, -20.0)],
+                                         [(lot_id, -20.0)])
+    assert stock == {1: (480.0, 1)}
+    assert lots == {lot_id: 480.0}
+
+
+def test_update_with_stale_version_conflicts(store):
+    version = store.load_antibody(2)['version']
+    assert store.update_antibody(2, expected_version=version, notes='first') == version + 1
+    with pytest.raises(VersionConflict):
+        store.update_antibody(2, expected_version=version, notes='second')
+    assert store.load_antibody(2)['notes'] == 'first'
+
+
+def test_import_bumps_the_versions_of_merged_rows(store):
+    versions = store.import_antibodies([], [(1, {'notes': 'merged'})])
+    assert versions == {1: 1}
+    assert store.load_antibody(1)['version'] == 1
+
+
+def test_history_pages_filter_and_stream_newest_first(store):
+    for n in range(5):
+        entry = history_entry(f'run {n}', 1, 1.0, f'2026-01-0{n + 1}T09:00:00')
+        entry['user'] = 'bob' if n % 2 else 'alice'
+        store.record_execution(entry, [])
+    pages = list(history_pages(store.conn, since='2026-01-02', page_size=2))
+    assert [[e['panelName'] for e in page] for page in pages] == [['run 4', 'run 3'],
+                                                                  ['run 2', 'run 1']]
+    assert [e['id'] for page in history_pages(store.conn, user='bob') for e in page] == [4, 2]
+
+
+def test_every_antibody_starts_with_one_undated_lot_of_its_stock(store):
+    lots = store.load_lots()
+    assert [(lot['antibodyId'], lot['volume'], lot['expiry']) for lot in lots] == [
+        (1, 500.0, ''), (2, 450.0, ''), (3, 35.0, '')]
+
+
+def test_lot_draw_not_covered_writes_nothing(store):
+    lot_id = store.load_lots([3])[0]['id']
+    with pytest.raises(InsufficientStock) as info:
+        store.record_execution(history_entry('run', 3, 30.0), [(3, -30.0)],
+                               [(lot_id, -36.0)])
+    assert info.value.shortfalls == [(3, 35.0, 36.0)]
+    assert stock_of(store, 3) == 35.0
+    assert store.load_lots([3])[0]['volume'] == 35.0
+
+
+def test_inserted_lot_adds_to_stock(store):
+    lot_id, stock = store.insert_lot({'antibodyId': 2, 'volume': 50.0, 'expiry': '2027-01-01'})
+    assert stock == {2: (500.0, 1)}
+    assert [lot['id'] for lot in store.load_lots([2])][-1] == lot_id
+    with pytest.raises(KeyError):
+        store.insert_lot({'antibodyId': 99, 'volume': 50.0})
+
+
+def test_adjust_stock_with_stale_version_conflicts(store):
+    version = store.load_antibody(1)['version']
+    lot_id = store.load_lots([1])[0]['id']
+    store.update_antibody(1, notes='edited elsewhere')
+    with pytest.raises(VersionConflict):
+        store.adjust_stock(1, [(lot_id, -100.0)], expected_version=version)
+    assert stock_of(store, 1) == 500.0
+
+
+def test_deleting_an_antibody_deletes_its_lots(store):
+    store.delete_antibody(1)
+    assert store.load_lots([1]) == []
+    with pytest.raises(KeyError):
+        store.delete_antibody(1)
+
+
+def test_legacy_table_is_rebuilt_keeping_ids(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE antibodies (id INTEGER PRIMARY KEY, antigen TEXT NOT NULL, '
+                 "stockVolume REAL NOT NULL DEFAULT 0, dateConjugated TEXT NOT NULL DEFAULT '')")
+    conn.execute("INSERT INTO antibodies (id, antigen, stockVolume) VALUES (7, 'CD45', 80)")
+    conn.commit()
+    conn.close()
+
+    store = PanelStore(db_path)
+    try:
+        assert [(ab['id'], ab['antigen']) for ab in store.load_inventory()] == [(7, 'CD45')]
+        assert store.load_lots([7])[0]['volume'] == 80.0
+        store.delete_antibody(7)
+        assert store.insert_antibody(antibody('CD19', '142Nd')) == 8
+    finally:
+        store.close()
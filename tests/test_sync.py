@@ -0,0 +1,119 @@
+"""Following other stations through the changes feed and PRAGMA data_version"""
+
+import pytest
+
+from antibody_panel.store import ANTIBODY, HISTORY, SAVED_PANEL, PanelStore
+from conftest import antibody
+
+
+@pytest.fixture
+def stores(db_path):
+    """Factory for bare stores over the same database, one per station"""
+    opened = []
+
+    def open_store():
+        store = PanelStore(db_path)
+        opened.append(store)
+        return store
+
+    yield open_store
+    for store in opened:
+        store.close()
+
+
+def test_poll_is_empty_until_another_station_commits(stores):
+    a, b = stores(), stores()
+    assert b.poll_changes() == []
+    a.update_antibody(1, notes='edited')
+    assert b.poll_changes() == [(ANTIBODY, 1)]
+    assert b.poll_changes() == []
+
+
+def test_own_changes_are_not_reported(stores):
+    store = stores()
+    store.update_antibody(1, notes='edited')
+    store.delete_antibody(2)
+    assert store.poll_changes() == []
+
+
+def test_each_kind_of_write_is_announced(stores):
+    a, b = stores(), stores()
+    a.insert_saved_panel({'id': 1, 'name': 'T cells', 'antibodyIds': [1],
+                          'createdBy': '', 'createdAt': '2026-01-01T09:00:00'})
+    a.record_execution({'id': 1, 'timestamp': '2026-01-01T09:00:00', 'user': '',
+                        'panelName': 'run', 'cellCount': 4.0, 'antibodies': []}, [(1, -2.0)])
+    a.update_antibody(1, notes='edited')
+    assert b.poll_changes() == [(SAVED_PANEL, 1), (ANTIBODY, 1), (HISTORY, 1)]
+
+
+def test_falling_behind_the_feed_returns_none(stores):
+    a, b = stores(), stores()
+    a.update_antibody(1, notes='first')
+    a.update_antibody(2, notes='second')
+    # Prune the feed past where b last read, as CHANGE_RETENTION would
+    a.conn.execute('DELETE FROM changes WHERE seq = (SELECT MIN(seq) FROM changes)')
+    assert b.poll_changes() is None
+    assert b.poll_changes() == []
+
+
+def test_shared_mode_uses_the_rollback_journal(db_path):
+    store = PanelStore(db_path, shared=True)
+    try:
+        assert store.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    finally:
+        store.close()
+
+
+def test_sync_applies_other_stations_changes(station):
+    a, b = station('a'), station('b')
+    # Build b's history and panel library so sync keeps them current
+    b.panel_history
+    b.saved_panels
+    new = a.add_antibody(antibody('CD19', '142Nd'))
+    a.update_antibody(2, 'notes', 'edited')
+    a.delete_antibody(3)
+    entry = a.execute_panel('run', [1], 4.0)
+    panel = a.save_panel('T cells', [1, 2])
+
+    assert b.sync() == {ANTIBODY, HISTORY, SAVED_PANEL}
+    assert b.inventory.get(new['id'])['antigen'] == 'CD19'
+    assert b.inventory.get(2)['notes'] == 'edited'
+    assert 3 not in b.inventory
+    assert b.inventory.get(1)['stockVolume'] == a.inventory.get(1)['stockVolume']
+    assert b.panel_history.get(entry['id'])['panelName'] == 'run'
+    assert b.saved_panels.get(panel['id'])['name'] == 'T cells'
+    assert b.sync() == set()
+
+
+def test_sync_keeps_lots_in_step(station):
+    a, b = station('a'), station('b')
+    b.lots                                  # built, so sync reloads the drawn lots
+    a.execute_panel('run', [1], 4.0)
+    b.sync()
+    total = sum(lot['volume'] for lot in b.lots.for_antibody(1))
+    assert total == b.inventory.get(1)['stockVolume'] < 500.0
+
+
+def test_falling_behind_the_feed_reloads_everything(station):
+    a, b = station('a'), station('b')
+    a.update_antibody(1, 'notes', 'first')
+    a.update_antibody(2, 'notes', 'second')
+    a.store.conn.execute('DELETE FROM changes WHERE seq = (SELECT MIN(seq) FROM changes)')
+
+    a.update_antibody(1, 'notes', 'third')
+    assert b.sync() == {ANTIBODY, HISTORY, SAVED_PANEL}
+    assert b.inventory.get(1)['notes'] == 'third'
+    assert b.inventory.get(2)['notes'] == 'second'
+
+
+def test_falling_behind_the_feed_rebuilds_the_forecast(station):
+    a, b = station('a'), station('b')
+    a.execute_panel('run 1', [1], 40.0)
+    b.forecast                              # built, so the reload has to rebuild it
+    a.execute_panel('run 2', [1], 40.0)
+    a.store.conn.execute('DELETE FROM changes WHERE seq = (SELECT MIN(seq) FROM changes)')
+
+    b.sync()
+    fresh = station('c').forecast
+    assert b.forecast.burn_rate(1) == pytest.approx(fresh.burn_rate(1))
+    assert b.forecast.used_since(1, 1) == pytest.approx(40.0)